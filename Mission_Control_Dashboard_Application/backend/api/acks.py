@@ -0,0 +1,207 @@
+"""Notification acknowledgements with write-behind persistence.
+
+``acknowledge`` flips the flag in the notification store at once, hands the
+change to the registered sinks (the notifications stream broadcasts it to
+every operator) and queues it for ``writer``. The writer keeps only the
+latest pending state per notification and upserts the queue in batches from
+a background thread every ``FLUSH_INTERVAL`` seconds, or as soon as
+``BATCH_SIZE`` changes are waiting, so a burst of acks costs a few bulk
+statements instead of a write per row. A failed batch is re-queued unless a
+newer change for the same notification arrived meanwhile, and the writer
+backs off exponentially (up to ``MAX_BACKOFF``) until a write succeeds,
+logging the failure once per streak. Past ``MAX_PENDING`` queued changes the
+oldest are dropped from the queue; the store keeps their state regardless.
+With ``flush_interval=None`` no thread is started and the caller flushes.
+
+``restore`` applies the persisted state to the store once per process.
+"""
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, transaction
+
+logger = logging.getLogger(__name__)
+
+_config = getattr(settings, 'NOTIFICATION_ACKS', {})
+FLUSH_INTERVAL = _config.get('FLUSH_INTERVAL', 1.0)
+BATCH_SIZE = _config.get('BATCH_SIZE', 500)
+MAX_IDS_PER_REQUEST = _config.get('MAX_IDS_PER_REQUEST', 10_000)
+MAX_PENDING = _config.get('MAX_PENDING', 100_000)
+MAX_BACKOFF = _config.get('MAX_BACKOFF', 60.0)
+
+
+class AckWriter:
+    def __init__(self, flush_interval=FLUSH_INTERVAL, batch_size=BATCH_SIZE, max_pending=MAX_PENDING,
+                 max_backoff=MAX_BACKOFF, clock=time.monotonic):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self.max_backoff = max_backoff
+        self._pending = {}  # notification id -> (acknowledged, by, updated_at), oldest first
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._clock = clock
+        self.retry_at = 0.0  # clock time before which the thread does not retry
+        self.failing = 0  # consecutive failed flushes
+        self.written = 0
+        self.batches = 0
+        self.failed = 0
+        self.dropped = 0
+
+    def metrics(self):
+        return {"pending": len(self._pending), "written": self.written, "batches": self.batches,
+                "failed": self.failed, "failing": self.failing, "dropped": self.dropped}
+
+    def enqueue(self, changes):
+        """Queues ``{id: (acknowledged, by, updated_at)}``; a later change to an id replaces an earlier one."""
+        with self._lock:
+            for notification_id in changes:
+                # re-inserted at the end, so the queue stays oldest first
+                self._pending.pop(notification_id, None)
+            self._pending.update(changes)
+            self._trim()
+            full = len(self._pending) >= self.batch_size
+            if self._thread is None and self.flush_interval is not None:
+                self._thread = threading.Thread(target=self._run, name="notification-acks", daemon=True)
+                self._thread.start()
+        if full:
+            self._wake.set()
+
+    def flush(self):
+        """Writes everything pending now; returns the number of rows written."""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return 0
+            items = list(pending.items())
+            written = 0
+            close_old_connections()
+            for i in range(0, len(items), self.batch_size):
+                batch = items[i:i + self.batch_size]
+                try:
+                    self._write(batch)
+                except DatabaseError:
+                    self._failed(len(batch))
+                    with self._lock:
+                        # ahead of anything queued meanwhile, which is newer
+                        newer, self._pending = self._pending, dict(items[i:])
+                        for notification_id in newer:
+                            self._pending.pop(notification_id, None)
+                        self._pending.update(newer)
+                        self._trim()
+                    break
+                written += len(batch)
+                self.batches += 1
+            else:
+                if self.failing:
+                    logger.info("persisting notification acks recovered after %d failed attempts", self.failing)
+                self.failing = 0
+                self.retry_at = 0.0
+            self.written += written
+            return written
+
+    def _failed(self, count):
+        self.failed += 1
+        self.failing += 1
+        backoff = min((self.flush_interval or FLUSH_INTERVAL) * 2 ** (self.failing - 1), self.max_backoff)
+        self.retry_at = self._clock() + backoff
+        if self.failing == 1:
+            logger.exception("persisting %d notification acks failed; retrying with backoff", count)
+
+    def due(self):
+        """False while backing off after a failed flush."""
+        return self._clock() >= self.retry_at
+
+    def _trim(self):
+        """Drops the oldest queued changes past ``max_pending``; call with ``_lock`` held."""
+        excess = len(self._pending) - self.max_pending
+        if excess <= 0:
+            return
+        for notification_id in list(self._pending)[:excess]:
+            del self._pending[notification_id]
+        if not self.dropped:
+            logger.warning("notification ack queue is full; dropping the oldest unpersisted changes")
+        self.dropped += excess
+
+    @staticmethod
+    def _write(batch):
+        from .models import NotificationAck
+        rows = [NotificationAck(notification_id=notification_id, acknowledged=acknowledged,
+                                acknowledged_by=by or '', updated_at=updated_at)
+                for notification_id, (acknowledged, by, updated_at) in batch]
+        with transaction.atomic():
+            NotificationAck.objects.bulk_create(
+                rows, update_conflicts=True, unique_fields=['notification_id'],
+                update_fields=['acknowledged', 'acknowledged_by', 'updated_at'],
+            )
+
+    def _run(self):
+        while True:
+            self._wake.wait(max(self.retry_at - self._clock(), self.flush_interval))
+            self._wake.clear()
+            if not self.due():
+                continue  # backing off; a full queue does not cut it short
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("notification ack writer failed")
+
+
+writer = AckWriter()
+atexit.register(writer.flush)
+
+_sinks = []
+_restored = False
+_restore_lock = threading.Lock()
+
+
+def add_sink(sink):
+    """Registers ``sink(ids, acknowledged, by, timestamp)`` to receive every ack change."""
+    if sink not in _sinks:
+        _sinks.append(sink)
+
+
+def acknowledge(store, ids, acknowledged=True, by=None):
+    """Applies an ack change to ``store``, broadcasts and queues it; returns the ids that changed."""
+    changed = store.set_acknowledged(ids, acknowledged)
+    if not changed:
+        return changed
+    timestamp = int(time.time() * 1000)
+    writer.enqueue({notification_id: (acknowledged, by, timestamp) for notification_id in changed})
+    for sink in _sinks:
+        try:
+            sink(changed, acknowledged, by, timestamp)
+        except Exception:
+            logger.exception("ack sink failed for %d notifications", len(changed))
+    return changed
+
+
+def restore(store):
+    """Applies the persisted ack state to ``store`` the first time it is called."""
+    global _restored
+    if _restored:
+        return
+    with _restore_lock:
+        if _restored:
+            return
+        from .models import NotificationAck
+        try:
+            rows = list(NotificationAck.objects.values_list('notification_id', 'acknowledged', 'updated_at'))
+        except DatabaseError:
+            logger.warning("notification acks not restored; has the database been migrated?")
+        else:
+            states = {True: [], False: []}
+            for notification_id, acknowledged, updated_at in rows:
+                record = store.get(notification_id)
+                # an ack older than the notification was for an earlier one with the same id
+                if record is not None and record.get('timestamp', 0) <= updated_at:
+                    states[acknowledged].append(notification_id)
+            for acknowledged, ids in states.items():
+                store.set_acknowledged(ids, acknowledged)
+        _restored = True
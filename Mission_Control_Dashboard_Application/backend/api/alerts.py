@@ -0,0 +1,251 @@
+"""Streaming alert rules evaluated on every ingested fire/drone sample.
+
+Rules are compiled once into per-(entity, field) predicate tables:
+
+- numeric thresholds sit in sorted arrays per direction, so the rules a
+  sample crosses are found by bisecting between the previous and the new
+  value;
+- equality rules (e.g. ``status == "Critical"``) sit in a value -> rules map;
+- rate-of-change rules use the same sorted tables over the per-minute rate.
+
+A sample whose field did not change touches no rules at all, so the cost per
+sample is O(fields + rules affected) however many rules are loaded. Rules
+only fire on the edge into their condition; hysteresis rules additionally
+stay silent until the value has crossed back past their reset level.
+"""
+import logging
+import time
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+
+logger = logging.getLogger(__name__)
+
+THRESHOLD = 'threshold'
+RATE = 'rate'
+HYSTERESIS = 'hysteresis'
+
+ABOVE = 'above'
+BELOW = 'below'
+EQUALS = 'equals'
+
+
+@dataclass(frozen=True)
+class Rule:
+    name: str
+    entity: str  # 'fire' or 'drone'
+    field: str
+    kind: str = THRESHOLD
+    op: str = ABOVE
+    value: object = None  # threshold, rate per minute, or value to match
+    reset: float = None  # hysteresis re-arm level
+    severity: str = 'medium'
+    title: str = ''
+    message: str = ''
+    source: str = 'Fire Detection System'
+    labels: tuple = ()
+
+
+DEFAULT_RULES = [
+    Rule('fire-critical', 'fire', 'status', op=EQUALS, value='Critical', severity='critical',
+         title='Fire {id} is now critical',
+         message='Intensity {intensity}%, size {size} acres.',
+         labels=('Fire Update', 'Safety')),
+    Rule('fire-contained', 'fire', 'status', op=EQUALS, value='Contained', severity='low',
+         title='Fire {id} contained',
+         message='Intensity down to {intensity}%.',
+         labels=('Fire Update',)),
+    Rule('fire-large', 'fire', 'size', kind=HYSTERESIS, op=ABOVE, value=100, reset=90, severity='high',
+         title='Fire {id} exceeds 100 acres',
+         message='Current size {size} acres at intensity {intensity}%.',
+         labels=('Fire Update',)),
+    Rule('fire-intensifying', 'fire', 'intensity', kind=RATE, op=ABOVE, value=10, severity='high',
+         title='Fire {id} intensity rising fast',
+         message='Intensity climbing {rate:.0f} points per minute, now {intensity}%.',
+         labels=('Fire Update', 'Safety')),
+    Rule('drone-low-battery', 'drone', 'status', op=EQUALS, value='Low Battery', severity='high',
+         title='Drone {id} battery low',
+         message='Battery at {battery}%. Return to base for recharge.',
+         source='Drone Management System', labels=('Drone Status',)),
+    Rule('drone-low-water', 'drone', 'status', op=EQUALS, value='Low Water', severity='medium',
+         title='Drone {id} water low',
+         message='Water at {water}%. Return to base for refill.',
+         source='Drone Management System', labels=('Drone Status',)),
+    Rule('drone-critical', 'drone', 'status', op=EQUALS, value='Critical', severity='critical',
+         title='Drone {id} in critical condition',
+         message='Battery {battery}%, water {water}%. Immediate recall required.',
+         source='Drone Management System', labels=('Drone Status', 'Safety')),
+    Rule('drone-battery-reserve', 'drone', 'battery', kind=HYSTERESIS, op=BELOW, value=20, reset=30,
+         severity='high',
+         title='Drone {id} battery at {battery}%',
+         message='Below the 20% reserve.',
+         source='Drone Management System', labels=('Drone Status', 'Maintenance')),
+]
+
+
+class _SortedEdges:
+    """Thresholds for one direction, sorted so crossings are a bisection."""
+
+    def __init__(self):
+        self.keys = []
+        self.entries = []
+
+    def add(self, threshold, entry):
+        i = bisect_right(self.keys, threshold)
+        self.keys.insert(i, threshold)
+        self.entries.insert(i, entry)
+
+    def crossed_upward(self, old, new):
+        """Entries with old <= t < new (all t < new if old is None)."""
+        lo = 0 if old is None else bisect_left(self.keys, old)
+        return self.entries[lo:bisect_left(self.keys, new)]
+
+    def crossed_downward(self, old, new):
+        """Entries with new < t <= old (all t > new if old is None)."""
+        hi = len(self.keys) if old is None else bisect_right(self.keys, old)
+        return self.entries[bisect_right(self.keys, new):hi]
+
+
+class _FieldTable:
+    def __init__(self):
+        self.above = _SortedEdges()
+        self.below = _SortedEdges()
+        self.equals = {}
+
+    def matches(self, old, new):
+        if old == new:
+            return []
+        if isinstance(new, (int, float)) and not isinstance(new, bool):
+            if old is not None and not isinstance(old, (int, float)):
+                old = None
+            if old is None:
+                return self.above.crossed_upward(None, new) + self.below.crossed_downward(None, new)
+            if new > old:
+                return self.above.crossed_upward(old, new)
+            return self.below.crossed_downward(old, new)
+        return self.equals.get(new, [])
+
+
+# table entry actions
+_FIRE = 0
+_TRIGGER = 1  # hysteresis: fire if armed, then disarm
+_REARM = 2
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _check_hysteresis(rule):
+    """A hysteresis rule re-arms on the far side of its threshold; without that it would never fire again."""
+    if rule.op not in (ABOVE, BELOW):
+        raise ValueError(f"hysteresis rule {rule.name!r} needs op {ABOVE!r} or {BELOW!r}, not {rule.op!r}")
+    if not _is_number(rule.value) or not _is_number(rule.reset):
+        raise ValueError(f"hysteresis rule {rule.name!r} needs a numeric value and reset")
+    if rule.reset >= rule.value if rule.op == ABOVE else rule.reset <= rule.value:
+        side = 'below' if rule.op == ABOVE else 'above'
+        raise ValueError(f"hysteresis rule {rule.name!r} must reset {side} its value {rule.value}, "
+                         f"not at {rule.reset}")
+
+
+class AlertEngine:
+    def __init__(self, rules=()):
+        self.rules = []
+        self._tables = {}  # (entity, field, is_rate) -> _FieldTable
+        self._fields = {}  # entity -> [(field, is_rate, table)]
+        self._disarmed = set()  # (rule index, entity id)
+        self._rates = {}  # (entity, entity id, field) -> last rate per minute
+        for rule in rules:
+            self.add_rule(rule)
+
+    def add_rule(self, rule):
+        if rule.kind == HYSTERESIS:
+            _check_hysteresis(rule)
+        index = len(self.rules)
+        self.rules.append(rule)
+        is_rate = rule.kind == RATE
+        table = self._tables.get((rule.entity, rule.field, is_rate))
+        if table is None:
+            table = self._tables[(rule.entity, rule.field, is_rate)] = _FieldTable()
+            self._fields.setdefault(rule.entity, []).append((rule.field, is_rate, table))
+
+        if rule.op == EQUALS:
+            table.equals.setdefault(rule.value, []).append((_FIRE, index))
+        elif rule.kind == HYSTERESIS:
+            trigger, rearm = (table.above, table.below) if rule.op == ABOVE else (table.below, table.above)
+            trigger.add(rule.value, (_TRIGGER, index))
+            rearm.add(rule.reset, (_REARM, index))
+        else:
+            (table.above if rule.op == ABOVE else table.below).add(rule.value, (_FIRE, index))
+
+    def evaluate(self, entity, record, previous=None):
+        """Returns notifications (without ids) for the rules this sample fires."""
+        if previous is not None and record.get('timestamp', 0) < previous.get('timestamp', 0):
+            return []  # late sample; the latest state did not change
+        entity_id = record.get('id')
+        fired = []
+        rate = None
+        for field, is_rate, table in self._fields.get(entity, ()):
+            new = record.get(field)
+            if new is None:
+                continue
+            old = previous.get(field) if previous is not None else None
+            if is_rate:
+                if old is None:
+                    continue
+                elapsed_min = (record.get('timestamp', 0) - previous.get('timestamp', 0)) / 60000.0
+                if elapsed_min <= 0:
+                    continue
+                rate = (new - old) / elapsed_min
+                key = (entity, entity_id, field)
+                old, new = self._rates.get(key, 0.0), rate
+                self._rates[key] = rate
+            for action, index in table.matches(old, new):
+                if action == _REARM:
+                    self._disarmed.discard((index, entity_id))
+                    continue
+                if action == _TRIGGER:
+                    if (index, entity_id) in self._disarmed:
+                        continue
+                    self._disarmed.add((index, entity_id))
+                fired.append(self._notification(self.rules[index], record, rate))
+        return fired
+
+    @staticmethod
+    def _notification(rule, record, rate):
+        values = dict(record, rate=rate if rate is not None else 0.0)
+        try:
+            title = rule.title.format_map(values)
+            message = rule.message.format_map(values)
+        except (KeyError, ValueError):
+            title, message = rule.title, rule.message
+        return {
+            "severity": rule.severity,
+            "title": title,
+            "message": message,
+            "timestamp": record.get('timestamp') or int(time.time() * 1000),
+            "source": rule.source,
+            "acknowledged": False,
+            "labels": list(rule.labels),
+            "entity": record.get('id'),
+            "location": {"lat": record['lat'], "lng": record['lng']} if 'lat' in record and 'lng' in record else None,
+        }
+
+
+engine = AlertEngine(DEFAULT_RULES)
+_sinks = []
+
+
+def add_sink(sink):
+    """Registers ``sink(notification)`` to receive every fired alert."""
+    if sink not in _sinks:
+        _sinks.append(sink)
+
+
+def on_sample(kind, record, previous):
+    """Telemetry listener: evaluates the default engine and forwards alerts to sinks."""
+    for notification in engine.evaluate(kind, record, previous):
+        for sink in _sinks:
+            try:
+                sink(notification)
+            except Exception:
+                logger.exception("alert sink failed for %s", notification['title'])
@@ -4,3 +4,23 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        from . import alerts, situation, telemetry, tiles
+        # alerts fire once, in the worker that produced the sample
+        telemetry.add_listener(alerts.on_sample, relayed=False)
+        telemetry.add_listener(tiles.on_sample)
+        telemetry.add_listener(situation.situation.on_sample)
+
+        from . import acks, llm, metrics
+        from .notification_store import store
+        from .views import fire_warden
+        metrics.add_collector('notification_acks', acks.writer.metrics,
+                              counters=('written', 'batches', 'failed', 'dropped'))
+        metrics.add_collector('notifications', store.counts)
+        metrics.add_collector('fire_warden_reply_cache', fire_warden._reply_cache.metrics,
+                              counters=('hits', 'misses'))
+        if llm.client is not None:
+            metrics.add_collector('fire_warden_llm', llm.client.metrics,
+                                  counters=('completed', 'failed', 'rejected', 'expired', 'cancelled',
+                                            'connections', 'queueWait.count', 'ttft.count'))
@@ -0,0 +1,244 @@
+"""Drone-to-fire assignment.
+
+Each active fire needs a number of drones derived from its intensity and
+size; each fit drone can serve one fire. Costs are flight times scaled by
+fire priority and drone condition, and the capacity constraint is handled by
+expanding every fire into one column per drone slot. Up to ``EXACT_LIMIT``
+assignments the problem is solved exactly with the shortest augmenting path
+(Jonker-Volgenant) form of the Hungarian algorithm; larger fleets use a
+greedy fill followed by vectorized swap/replace local search.
+"""
+import math
+
+import numpy as np
+
+DRONE_SPEED_KMH = 60.0
+RANGE_KM_PER_BATTERY_PCT = 0.3  # a full battery covers 30 km
+MIN_BATTERY = 20
+MIN_WATER = 10
+UNFIT_STATUSES = {"Low Battery", "Low Water", "Critical"}
+
+ACRES_PER_DRONE = 25.0
+MAX_DRONES_PER_FIRE = 8
+CRITICAL_PRIORITY_BOOST = 2.0
+
+EXACT_LIMIT = 400
+LOCAL_SEARCH_ROUNDS = 50
+INFEASIBLE = 1e9
+
+EARTH_RADIUS_KM = 6371.0
+
+
+def is_fit(drone):
+    return (drone.get('status') not in UNFIT_STATUSES
+            and drone.get('battery', 0) >= MIN_BATTERY
+            and drone.get('water', 0) >= MIN_WATER)
+
+
+def fire_demand(fire):
+    """Drones a fire can usefully absorb."""
+    need = math.ceil(fire.get('intensity', 0) / 100.0 * fire.get('size', 0) / ACRES_PER_DRONE)
+    return min(max(need, 1), MAX_DRONES_PER_FIRE)
+
+
+def fire_priority(fire):
+    priority = max(fire.get('intensity', 0), 1) / 100.0
+    if fire.get('status') == 'Critical':
+        priority *= CRITICAL_PRIORITY_BOOST
+    return priority
+
+
+def distance_matrix_km(drones, fires):
+    """Great-circle distances (haversine), drones x fires."""
+    dlat = np.radians([d['lat'] for d in drones])[:, None]
+    dlng = np.radians([d['lng'] for d in drones])[:, None]
+    flat = np.radians([f['lat'] for f in fires])[None, :]
+    flng = np.radians([f['lng'] for f in fires])[None, :]
+    a = (np.sin((flat - dlat) / 2) ** 2
+         + np.cos(dlat) * np.cos(flat) * np.sin((flng - dlng) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def cost_matrix(drones, fires):
+    """Returns (cost, eta_minutes), both drones x fires.
+
+    Cost is the flight time divided by fire priority and inflated for drones
+    short on battery or water. Pairs outside the drone's round-trip range
+    cost ``INFEASIBLE``.
+    """
+    dist = distance_matrix_km(drones, fires)
+    eta = dist / DRONE_SPEED_KMH * 60.0
+    battery = np.array([d.get('battery', 0) for d in drones], dtype=float)[:, None]
+    water = np.array([d.get('water', 0) for d in drones], dtype=float)[:, None]
+    priority = np.array([fire_priority(f) for f in fires])[None, :]
+
+    condition = (2.0 - battery / 100.0) * (2.0 - water / 100.0)
+    cost = (eta + 1.0) * condition / priority
+    cost[2 * dist > battery * RANGE_KM_PER_BATTERY_PCT] = INFEASIBLE
+    return cost, eta
+
+
+def solve_lap(cost):
+    """Min-cost rectangular assignment; returns the column for each row.
+
+    Requires rows <= columns. Shortest augmenting path with dual
+    potentials, one augmentation per row, with the inner Dijkstra relaxation
+    vectorized across all columns.
+    """
+    n, m = cost.shape
+    u = np.zeros(n)
+    v = np.zeros(m)
+    col4row = np.full(n, -1, dtype=np.int64)
+    row4col = np.full(m, -1, dtype=np.int64)
+
+    for cur in range(n):
+        shortest = np.full(m, np.inf)
+        path = np.full(m, -1, dtype=np.int64)
+        remaining = np.ones(m, dtype=bool)
+        scanned_rows = [cur]
+        scanned_cols = []
+        i = cur
+        min_val = 0.0
+        sink = -1
+        while sink < 0:
+            reduced = min_val + cost[i] - u[i] - v
+            better = remaining & (reduced < shortest)
+            path[better] = i
+            shortest[better] = reduced[better]
+            j = int(np.argmin(np.where(remaining, shortest, np.inf)))
+            min_val = shortest[j]
+            remaining[j] = False
+            scanned_cols.append(j)
+            if row4col[j] < 0:
+                sink = j
+            else:
+                i = int(row4col[j])
+                scanned_rows.append(i)
+
+        u[cur] += min_val
+        others = np.array(scanned_rows[1:], dtype=np.int64)
+        if others.size:
+            u[others] += min_val - shortest[col4row[others]]
+        cols = np.array(scanned_cols, dtype=np.int64)
+        v[cols] -= min_val - shortest[cols]
+
+        j = sink
+        while True:
+            i = int(path[j])
+            row4col[j] = i
+            col4row[i], j = j, col4row[i]
+            if i == cur:
+                break
+    return col4row
+
+
+def _assign_exact(cost, demand):
+    """Exact assignment over slot-expanded columns; returns fire index per drone (-1 idle)."""
+    slot_fire = np.repeat(np.arange(len(demand)), demand)
+    expanded = cost[:, slot_fire]
+    n_drones, n_slots = expanded.shape
+    assigned = np.full(n_drones, -1, dtype=np.int64)
+    if n_drones <= n_slots:
+        cols = solve_lap(expanded)
+        assigned = slot_fire[cols]
+    else:
+        drone_for_slot = solve_lap(np.ascontiguousarray(expanded.T))
+        assigned[drone_for_slot] = slot_fire
+    assigned[cost[np.arange(n_drones), np.maximum(assigned, 0)] >= INFEASIBLE] = -1
+    return assigned
+
+
+def _assign_greedy(cost, demand):
+    """Greedy fill by ascending cost followed by swap/replace local search."""
+    n_drones, n_fires = cost.shape
+    assigned = np.full(n_drones, -1, dtype=np.int64)
+    spare = np.array(demand, dtype=np.int64)
+
+    order = np.argsort(cost, axis=None, kind='stable')
+    order = order[cost.ravel()[order] < INFEASIBLE]
+    for flat in order:
+        d, f = divmod(int(flat), n_fires)
+        if assigned[d] < 0 and spare[f] > 0:
+            assigned[d] = f
+            spare[f] -= 1
+            if not spare.any():
+                break
+
+    for _ in range(LOCAL_SEARCH_ROUNDS):
+        improved = False
+        busy = np.flatnonzero(assigned >= 0)
+        if busy.size < 1:
+            break
+        fires = assigned[busy]
+        current = cost[busy, fires]
+
+        # swap the fires of two busy drones
+        cross = cost[np.ix_(busy, fires)]
+        delta = cross + cross.T - current[:, None] - current[None, :]
+        np.fill_diagonal(delta, 0.0)
+        best = np.argmin(delta, axis=1)
+        gains = delta[np.arange(busy.size), best]
+        touched = np.zeros(busy.size, dtype=bool)
+        for a in np.argsort(gains):
+            if gains[a] >= -1e-9:
+                break
+            b = best[a]
+            if touched[a] or touched[b]:
+                continue
+            assigned[busy[a]], assigned[busy[b]] = fires[b], fires[a]
+            touched[a] = touched[b] = True
+            improved = True
+
+        # hand a busy drone's slot to a cheaper idle drone
+        idle = np.flatnonzero(assigned < 0)
+        busy = np.flatnonzero(assigned >= 0)
+        if idle.size and busy.size:
+            fires = assigned[busy]
+            delta = cost[np.ix_(idle, fires)] - cost[busy, fires][None, :]
+            taken = np.zeros(busy.size, dtype=bool)
+            for u in range(idle.size):
+                row = np.where(taken, np.inf, delta[u])
+                b = int(np.argmin(row))
+                if row[b] < -1e-9:
+                    assigned[idle[u]] = fires[b]
+                    assigned[busy[b]] = -1
+                    taken[b] = True
+                    improved = True
+
+        if not improved:
+            break
+    return assigned
+
+
+def assign(drones, fires):
+    """Assigns fit drones to active fires.
+
+    Returns a list of {"fire", "drones", "etaMinutes", "demand"} dicts ordered
+    by fire priority, plus the ids of fit drones left in reserve.
+    """
+    fit = [d for d in drones if is_fit(d)]
+    active = [f for f in fires if f.get('status') != 'Contained']
+    if not fit or not active:
+        return [], [d['id'] for d in fit]
+
+    cost, eta = cost_matrix(fit, active)
+    demand = np.array([fire_demand(f) for f in active], dtype=np.int64)
+    if min(len(fit), int(demand.sum())) <= EXACT_LIMIT:
+        assigned = _assign_exact(cost, demand)
+    else:
+        assigned = _assign_greedy(cost, demand)
+
+    result = []
+    for f in sorted(range(len(active)), key=lambda k: -fire_priority(active[k])):
+        members = np.flatnonzero(assigned == f)
+        if not members.size:
+            continue
+        members = members[np.argsort(eta[members, f])]
+        result.append({
+            "fire": active[f]['id'],
+            "drones": [fit[d]['id'] for d in members],
+            "etaMinutes": round(float(eta[members, f].max()), 1),
+            "demand": int(demand[f]),
+        })
+    reserve = [fit[d]['id'] for d in np.flatnonzero(assigned < 0)]
+    return result, reserve
@@ -0,0 +1,54 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    """Small thread-safe LRU mapping used for derived results.
+
+    Callers fold the telemetry data version into their keys, so stale
+    entries are never hit again and simply age out of the LRU order.
+    With a ``ttl`` (seconds) entries also expire that long after being set,
+    for results that go stale with time rather than with the data.
+    """
+
+    def __init__(self, maxsize=128, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (value, expires_at or None)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value, expires_at = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            if expires_at is not None and time.monotonic() >= expires_at:
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def metrics(self):
+        return {"size": len(self._data), "hits": self.hits, "misses": self.misses}
+
+    def __len__(self):
+        return len(self._data)
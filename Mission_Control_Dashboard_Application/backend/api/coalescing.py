@@ -0,0 +1,173 @@
+"""Deduplication, coalescing and per-source rate limiting of notifications.
+
+Notifications pass through ``NotificationCoalescer`` before they are stored
+and broadcast:
+
+- Repeats of a notification with the same fingerprint (source, entity and
+  title with its numbers blanked; ids such as ``C-2`` or ``D-4`` are kept)
+  are merged into the first one while they keep arriving within
+  ``WINDOW_SECONDS`` of each other. The merged record keeps its id and
+  carries ``count``, ``firstSeen`` and ``lastSeen``; it is re-sent at most
+  once per window with the latest title, message and highest severity.
+- New notifications take a token from their source's bucket (``BURST``
+  tokens, refilled at ``RATE_PER_MINUTE``). Without a token they wait in
+  that source's queue (at most ``MAX_QUEUED`` per source, the oldest
+  non-critical ones dropped beyond that) and still absorb repeats meanwhile.
+- Critical notifications skip both: they go out at once, and a critical
+  repeat re-sends the merged record immediately.
+
+``submit`` and ``flush`` return the notifications to publish now; the caller
+calls ``flush`` again at ``next_deadline()``.
+"""
+import re
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+
+_config = getattr(settings, 'NOTIFICATION_COALESCING', {})
+WINDOW_SECONDS = _config.get('WINDOW_SECONDS', 60)
+RATE_PER_MINUTE = _config.get('RATE_PER_MINUTE', 12)
+BURST = _config.get('BURST', 10)
+MAX_QUEUED = _config.get('MAX_QUEUED', 100)
+
+_SEVERITY_RANK = {'info': 0, 'low': 1, 'medium': 2, 'high': 3, 'critical': 4}
+# numbers that are values rather than part of an id like "C-2" or "D-12"
+_VALUE = re.compile(r'(?<![A-Za-z]-)(?<![\w.])\d+(?:\.\d+)?')
+
+
+def fingerprint(notification):
+    """Identity of an alert for merging: source, entity and its title template."""
+    title = _VALUE.sub('#', notification.get('title') or '')
+    return notification.get('source'), notification.get('entity'), title
+
+
+class NotificationCoalescer:
+    def __init__(self, window=WINDOW_SECONDS, rate_per_minute=RATE_PER_MINUTE, burst=BURST,
+                 max_queued=MAX_QUEUED, id_factory=None):
+        self.window = window
+        self.rate = rate_per_minute / 60.0
+        self.burst = burst
+        self.max_queued = max_queued
+        self.id_factory = id_factory
+        self._groups = {}  # fingerprint -> group dict
+        self._buckets = {}  # source -> [tokens, refilled_at]
+        self._queues = {}  # source -> deque of fingerprints waiting for a token
+        self._lock = threading.Lock()
+        self.merged = 0
+        self.dropped = 0
+
+    def metrics(self):
+        return {
+            "openGroups": len(self._groups),
+            "queued": sum(len(q) for q in self._queues.values()),
+            "merged": self.merged,
+            "dropped": self.dropped,
+        }
+
+    def submit(self, notification, now=None):
+        """Takes one incoming notification; returns what to publish now."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            out = self._flush(now)
+            key = fingerprint(notification)
+            critical = notification.get('severity') == 'critical'
+            group = self._groups.get(key)
+            if group is not None and (group['queued'] or now - group['seen'] <= self.window):
+                self._merge(group, notification, now)
+                if critical:
+                    if group['queued']:
+                        self._queues[group['record'].get('source')].remove(key)
+                        group['queued'] = False
+                    out.append(self._emit(group, now))
+                return out
+
+            timestamp = notification.get('timestamp') or int(time.time() * 1000)
+            record = dict(notification, count=1, firstSeen=timestamp, lastSeen=timestamp)
+            if record.get('id') is None and self.id_factory is not None:
+                record['id'] = self.id_factory()
+            group = {'record': record, 'seen': now, 'flush_at': 0.0, 'dirty': False, 'queued': False}
+            self._groups[key] = group
+            source = notification.get('source')
+            if critical or (not self._queues.get(source) and self._take(source, now)):
+                out.append(self._emit(group, now))
+            else:
+                self._enqueue(source, key, group)
+            return out
+
+    def flush(self, now=None):
+        """Publishes merged updates whose window is up and queued notifications that got a token."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            return self._flush(now)
+
+    def next_deadline(self):
+        """Monotonic time of the next ``flush`` with something to do, or None."""
+        with self._lock:
+            deadlines = [g['flush_at'] for g in self._groups.values() if g['dirty'] and not g['queued']]
+            for source, queue in self._queues.items():
+                if queue:
+                    tokens, refilled_at = self._buckets[source]
+                    deadlines.append(refilled_at + max(1.0 - tokens, 0.0) / self.rate)
+            return min(deadlines, default=None)
+
+    def _merge(self, group, notification, now):
+        record = group['record']
+        record['count'] += 1
+        record['lastSeen'] = notification.get('timestamp') or int(time.time() * 1000)
+        record['title'] = notification.get('title', record.get('title'))
+        record['message'] = notification.get('message', record.get('message'))
+        severity = notification.get('severity')
+        if _SEVERITY_RANK.get(severity, 0) > _SEVERITY_RANK.get(record.get('severity'), 0):
+            record['severity'] = severity
+        group['seen'] = now
+        group['dirty'] = True
+        self.merged += 1
+
+    def _emit(self, group, now):
+        group['dirty'] = False
+        group['flush_at'] = now + self.window
+        return dict(group['record'])
+
+    def _take(self, source, now):
+        bucket = self._buckets.get(source)
+        if bucket is None:
+            bucket = self._buckets[source] = [float(self.burst), now]
+        else:
+            bucket[0] = min(float(self.burst), bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+        if bucket[0] >= 1.0:
+            bucket[0] -= 1.0
+            return True
+        return False
+
+    def _enqueue(self, source, key, group):
+        group['queued'] = True
+        queue = self._queues.setdefault(source, deque())
+        queue.append(key)
+        if len(queue) > self.max_queued:
+            # drop the oldest waiting notification that is not critical
+            for old in queue:
+                if self._groups[old]['record'].get('severity') != 'critical':
+                    queue.remove(old)
+                    del self._groups[old]
+                    self.dropped += 1
+                    break
+
+    def _flush(self, now):
+        out = []
+        for source, queue in self._queues.items():
+            while queue and self._take(source, now):
+                group = self._groups[queue.popleft()]
+                group['queued'] = False
+                out.append(self._emit(group, now))
+        for key, group in list(self._groups.items()):
+            if group['queued']:
+                continue
+            if group['dirty']:
+                if now >= group['flush_at']:
+                    out.append(self._emit(group, now))
+            elif now - group['seen'] > self.window:
+                del self._groups[key]
+        return out
@@ -0,0 +1,107 @@
+"""Keyword intents for Fire Warden chat messages.
+
+Intents are declared as a table of ``Intent`` entries: the phrases (keywords
+and their synonyms) that signal it, a priority for messages that match
+several intents, and optionally a reply template. ``IntentRouter`` compiles
+every phrase of every intent into one regular expression, built from a trie
+of the phrases so that at each character the engine only tries the
+continuations of what it has read so far. A message is matched in a single
+``finditer`` pass, and the cost per character stays the same however many
+intents and phrases are loaded.
+
+Phrases match at the start of a word, so ``drone`` also matches "drones",
+but ``eta`` does not match "beta". Where phrases overlap the longest one
+wins, and of the intents found in a message the one with the highest
+priority (then the earliest declared) is chosen.
+"""
+import re
+import string
+from dataclasses import dataclass
+
+DEFAULT = 'default'
+
+
+@dataclass(frozen=True)
+class Intent:
+    name: str
+    phrases: tuple  # normalized keywords and synonyms
+    priority: int = 0
+    reply: str = ''  # template answered from the table; empty when a handler builds the reply
+
+    @property
+    def fields(self):
+        """Template fields the reply uses; a reply without any does not depend on live data."""
+        return {name for _, name, _, _ in string.Formatter().parse(self.reply) if name}
+
+
+DEFAULT_INTENTS = [
+    Intent('status', ('status', 'situation', 'sitrep', 'overview'), priority=40),
+    Intent('plan', ('strategy', 'plan', 'tactic'), priority=30),
+    Intent('drone', ('drone', 'fleet', 'uav'), priority=20),
+    Intent('weather', ('weather', 'wind', 'forecast', 'humidity', 'temperature'), priority=10,
+           reply='Current weather conditions: Wind speed is 12 mph from the northeast. Forecast shows winds may '
+                 'increase to 18 mph within the next 2 hours. Temperature is 85°F with 15% humidity. These '
+                 'conditions favor rapid fire spread.'),
+]
+
+
+def _trie_pattern(phrases):
+    """Regex source matching exactly ``phrases``, factored by common prefix and preferring longer phrases."""
+    trie = {}
+    for phrase in phrases:
+        node = trie
+        for ch in phrase:
+            node = node.setdefault(ch, {})
+        node[''] = {}  # end of a phrase
+
+    def emit(node):
+        branches = [re.escape(ch) + emit(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        if '' in node:
+            # a phrase ends here; greedily try the longer ones first
+            return ('(?:' + body + ')' if len(branches) == 1 and len(branches[0]) > 1 else body) + '?'
+        return body
+
+    return emit(trie)
+
+
+class IntentRouter:
+    def __init__(self, intents=()):
+        self.intents = {}
+        self._phrases = {}  # phrase -> (-priority, declaration order, intent name)
+        self._pattern = None
+        for intent in intents:
+            self.add_intent(intent)
+        self.compile()
+
+    def add_intent(self, intent):
+        """Adds ``intent``; call ``compile`` afterwards. A phrase may belong to only one intent."""
+        if intent.name in self.intents:
+            raise ValueError(f"duplicate intent {intent.name!r}")
+        order = len(self.intents)
+        for phrase in intent.phrases:
+            phrase = ' '.join(phrase.lower().split())
+            owner = self._phrases.get(phrase)
+            if owner is not None:
+                raise ValueError(f"phrase {phrase!r} is declared by both {owner[2]!r} and {intent.name!r}")
+            self._phrases[phrase] = (-intent.priority, order, intent.name)
+        self.intents[intent.name] = intent
+
+    def compile(self):
+        self._pattern = re.compile(r'\b' + _trie_pattern(self._phrases)) if self._phrases else None
+
+    def match(self, message):
+        """Name of the best intent in a normalized message, or ``DEFAULT``."""
+        if self._pattern is None:
+            return DEFAULT
+        best = None
+        for found in self._pattern.finditer(message):
+            rank = self._phrases[found.group()]
+            if best is None or rank < best:
+                best = rank
+        return best[2] if best is not None else DEFAULT
+
+
+router = IntentRouter(DEFAULT_INTENTS)
@@ -0,0 +1,344 @@
+"""Token streams for Fire Warden replies.
+
+``LLMClient`` talks to the Fire Warden LLM service (``FIRE_WARDEN_LLM``):
+``POST <URL>`` with a JSON body, answered by a chunked stream of JSON lines
+``{"token": "..."}`` ending with ``{"done": true}`` (or ``{"error": ...}``).
+``run_llm_stub`` serves the same protocol locally. The client
+
+- runs at most ``MAX_CONCURRENCY`` requests at once; the rest wait in one
+  FIFO queue per user, served round-robin across users, so a user sending
+  a burst cannot starve the others. A full queue fails fast with
+  ``QueueFull`` instead of piling up waiting callers;
+- gives every request a deadline: it is dropped with ``DeadlineExceeded``
+  if it is still queued when the deadline passes, the time left is sent to
+  the service as ``X-Deadline-Ms``, and each read is bounded by it;
+- cancels abandoned requests: a caller that is cancelled (or stops
+  reading) leaves the queue, or has its connection closed so the service
+  stops generating;
+- reuses keep-alive connections from a pool instead of connecting per
+  request.
+
+Without a ``URL``, ``stub_tokens`` stands in for the service in process: it
+waits ``FIRST_TOKEN_MS`` and then yields the reply text a word at a time at
+``TOKENS_PER_SECOND``, so streaming, cancellation and time-to-first-token
+can be exercised with realistic pacing.
+
+``LatencyStats`` keeps a window of recent latencies for percentiles.
+"""
+import asyncio
+import json
+import re
+import threading
+import time
+import weakref
+from collections import OrderedDict, deque
+from urllib.parse import urlparse
+
+from django.conf import settings
+
+_config = getattr(settings, 'FIRE_WARDEN_STREAM', {})
+FIRST_TOKEN_MS = _config.get('FIRST_TOKEN_MS', 400)
+TOKENS_PER_SECOND = _config.get('TOKENS_PER_SECOND', 40)
+
+_llm_config = getattr(settings, 'FIRE_WARDEN_LLM', {})
+LLM_URL = _llm_config.get('URL')
+MAX_CONCURRENCY = _llm_config.get('MAX_CONCURRENCY', 8)
+MAX_QUEUED = _llm_config.get('MAX_QUEUED', 256)
+MAX_QUEUED_PER_USER = _llm_config.get('MAX_QUEUED_PER_USER', 4)
+TIMEOUT_SECONDS = _llm_config.get('TIMEOUT_SECONDS', 30)
+
+_TOKEN = re.compile(r'\S+\s*')
+
+
+def tokenize(text):
+    """Words with their trailing whitespace, so the tokens join back into the text."""
+    return _TOKEN.findall(text)
+
+
+async def stub_tokens(text, first_token_ms=FIRST_TOKEN_MS, tokens_per_second=TOKENS_PER_SECOND):
+    """Yields ``text`` token by token with a model-like first-token delay and throughput."""
+    loop = asyncio.get_running_loop()
+    if first_token_ms:
+        await asyncio.sleep(first_token_ms / 1000.0)
+    interval = 1.0 / tokens_per_second if tokens_per_second else 0.0
+    start = loop.time()
+    for i, token in enumerate(tokenize(text)):
+        # paced against the start time so slow sends do not add up
+        delay = start + i * interval - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        yield token
+
+
+class LatencyStats:
+    """Recent latency samples (seconds) and their percentiles in ms."""
+
+    def __init__(self, size=1000):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+            self.count += 1
+
+    def summary(self):
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return {"count": self.count}
+
+        def pct(p):
+            return round(samples[min(int(len(samples) * p / 100), len(samples) - 1)] * 1000, 1)
+
+        return {"count": self.count, "p50Ms": pct(50), "p90Ms": pct(90), "p99Ms": pct(99)}
+
+
+class LLMError(Exception):
+    pass
+
+
+class QueueFull(LLMError):
+    pass
+
+
+class DeadlineExceeded(LLMError):
+    pass
+
+
+class _Connection:
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    def close(self):
+        self.writer.close()
+
+
+class _LoopState:
+    """Slots, queues and pooled connections; asyncio objects belong to one event loop."""
+
+    def __init__(self):
+        self.active = 0
+        self.queued = 0
+        self.waiters = OrderedDict()  # user -> deque of futures, in round-robin order
+        self.idle = []
+
+
+class LLMClient:
+    def __init__(self, url, max_concurrency=MAX_CONCURRENCY, max_queued=MAX_QUEUED,
+                 max_queued_per_user=MAX_QUEUED_PER_USER, timeout=TIMEOUT_SECONDS):
+        parsed = urlparse(url)
+        self.host = parsed.hostname
+        self.port = parsed.port or 80
+        self.path = parsed.path or '/'
+        self.max_concurrency = max_concurrency
+        self.max_queued = max_queued
+        self.max_queued_per_user = max_queued_per_user
+        self.timeout = timeout
+        self.queue_wait = LatencyStats()
+        self.ttft = LatencyStats()
+        self.counts = {"completed": 0, "failed": 0, "rejected": 0, "expired": 0, "cancelled": 0,
+                       "connections": 0}
+        # one state per event loop: under daphne that is a single, process-wide limit
+        self._states = weakref.WeakKeyDictionary()
+
+    def _state(self):
+        loop = asyncio.get_running_loop()
+        state = self._states.get(loop)
+        if state is None:
+            state = self._states[loop] = _LoopState()
+        return state
+
+    def metrics(self):
+        states = list(self._states.values())
+        return dict(self.counts, active=sum(s.active for s in states), queued=sum(s.queued for s in states),
+                    queueWait=self.queue_wait.summary(), ttft=self.ttft.summary())
+
+    def close(self):
+        """Closes the idle pooled connections of the running loop."""
+        state = self._state()
+        for conn in state.idle:
+            conn.close()
+        state.idle.clear()
+
+    async def stream(self, user, payload, deadline=None):
+        """Yields the tokens of one reply. ``deadline`` is a ``time.monotonic()`` value."""
+        state = self._state()
+        deadline = deadline if deadline is not None else time.monotonic() + self.timeout
+        start = time.monotonic()
+        await self._acquire(state, user, deadline)
+        self.queue_wait.record(time.monotonic() - start)
+        try:
+            first = True
+            async for token in self._request(state, payload, deadline):
+                if first:
+                    self.ttft.record(time.monotonic() - start)
+                    first = False
+                yield token
+            self.counts["completed"] += 1
+        except asyncio.CancelledError:
+            self.counts["cancelled"] += 1
+            raise
+        except GeneratorExit:
+            self.counts["cancelled"] += 1  # the caller stopped reading
+            raise
+        except DeadlineExceeded:
+            self.counts["expired"] += 1
+            raise
+        except LLMError:
+            self.counts["failed"] += 1
+            raise
+        finally:
+            self._release(state)
+
+    async def complete(self, user, payload, deadline=None):
+        """The whole reply text."""
+        return ''.join([token async for token in self.stream(user, payload, deadline)])
+
+    async def _acquire(self, state, user, deadline):
+        if state.active < self.max_concurrency and not state.queued:
+            state.active += 1
+            return
+        waiters = state.waiters.get(user)
+        if state.queued >= self.max_queued or (waiters and len(waiters) >= self.max_queued_per_user):
+            self.counts["rejected"] += 1
+            raise QueueFull("Fire Warden is busy; try again shortly")
+        future = asyncio.get_running_loop().create_future()
+        state.waiters.setdefault(user, deque()).append(future)
+        state.queued += 1
+        try:
+            await asyncio.wait_for(asyncio.shield(future), max(deadline - time.monotonic(), 0.0))
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if future.done() and not future.cancelled():
+                self._release(state)  # granted just as we gave up: pass the slot on
+            else:
+                future.cancel()
+                self._forget(state, user, future)
+            if isinstance(e, asyncio.TimeoutError):
+                self.counts["expired"] += 1
+                raise DeadlineExceeded("Deadline passed while queued") from None
+            self.counts["cancelled"] += 1
+            raise
+
+    @staticmethod
+    def _forget(state, user, future):
+        waiters = state.waiters.get(user)
+        if waiters is not None and future in waiters:
+            waiters.remove(future)
+            state.queued -= 1
+            if not waiters:
+                del state.waiters[user]
+
+    def _release(self, state):
+        state.active -= 1
+        while state.waiters and state.active < self.max_concurrency:
+            # next user in turn; they go to the back if they have more waiting
+            user, waiters = next(iter(state.waiters.items()))
+            future = waiters.popleft()
+            state.queued -= 1
+            del state.waiters[user]
+            if waiters:
+                state.waiters[user] = waiters
+            if not future.done():
+                state.active += 1
+                future.set_result(None)
+
+    async def _request(self, state, payload, deadline):
+        body = json.dumps(payload).encode()
+        for attempt in (0, 1):
+            conn, reused = await self._connection(state, deadline)
+            try:
+                remaining_ms = max(int((deadline - time.monotonic()) * 1000), 1)
+                conn.writer.write(
+                    f"POST {self.path} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\n"
+                    f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n"
+                    f"X-Deadline-Ms: {remaining_ms}\r\nConnection: keep-alive\r\n\r\n".encode() + body)
+                try:
+                    status = await self._read(conn.reader.readline(), deadline)
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    status = b''
+            except BaseException:
+                conn.close()  # deadline or cancellation before the reply started: the service must see it
+                raise
+            if not status and reused and attempt == 0:
+                conn.close()  # the service closed an idle connection; retry on a fresh one
+                continue
+            break
+        done = False
+        try:
+            if not status:
+                raise LLMError("LLM service closed the connection")
+            parts = status.split()
+            if len(parts) < 2 or not parts[1].isdigit():
+                raise LLMError(f"LLM service sent a malformed status line: {status[:100]!r}")
+            headers = await self._headers(conn, deadline)
+            code = int(parts[1])
+            if code != 200:
+                length = int(headers.get('content-length', 0))
+                detail = await self._read(conn.reader.readexactly(length), deadline) if length else b''
+                done = headers.get('connection') != 'close'
+                raise LLMError(f"LLM service returned {code}: {detail.decode(errors='replace')[:200]}")
+            async for line in self._lines(conn, deadline):
+                message = json.loads(line)
+                if 'token' in message:
+                    yield message['token']
+                elif message.get('error'):
+                    raise LLMError(f"LLM service error: {message['error']}")
+            done = headers.get('connection') != 'close'
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError) as e:
+            raise LLMError(f"LLM service connection failed: {e}") from None
+        finally:
+            if done:
+                state.idle.append(conn)
+            else:
+                conn.close()  # abandoned or broken mid-reply: closing stops the service generating
+
+    async def _connection(self, state, deadline):
+        while state.idle:
+            conn = state.idle.pop()
+            if not conn.reader.at_eof():
+                return conn, True
+            conn.close()
+        try:
+            reader, writer = await self._read(asyncio.open_connection(self.host, self.port), deadline)
+        except OSError as e:
+            raise LLMError(f"LLM service unreachable: {e}") from None
+        self.counts["connections"] += 1
+        return _Connection(reader, writer), False
+
+    async def _headers(self, conn, deadline):
+        headers = {}
+        while True:
+            line = await self._read(conn.reader.readline(), deadline)
+            if line in (b'\r\n', b''):
+                return headers
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip().lower()
+
+    async def _lines(self, conn, deadline):
+        """JSON lines of a chunked response body."""
+        buffer = b''
+        while True:
+            size = int((await self._read(conn.reader.readline(), deadline)).split(b';')[0], 16)
+            chunk = await self._read(conn.reader.readexactly(size + 2), deadline)
+            if not size:
+                break
+            buffer += chunk[:-2]
+            *lines, buffer = buffer.split(b'\n')
+            for line in lines:
+                if line.strip():
+                    yield line
+        if buffer.strip():
+            yield buffer
+
+    @staticmethod
+    async def _read(awaitable, deadline):
+        try:
+            return await asyncio.wait_for(awaitable, deadline - time.monotonic())
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded("Deadline passed waiting for the LLM service") from None
+
+
+client = LLMClient(LLM_URL) if LLM_URL else None
@@ -0,0 +1,224 @@
+import gc
+import json
+import platform
+import random
+import resource
+import subprocess
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+from django.test import Client
+
+from api import telemetry
+from api.notification_store import SEVERITIES, NotificationStore
+from api.views import fire_drone, notifications
+
+HOUR_MS = 60 * 60 * 1000
+DAY_MS = 24 * HOUR_MS
+
+FIRE_STATUSES = ('Active', 'Active', 'Active', 'Critical', 'Contained', 'Extinguished')
+DRONE_STATUSES = ('Active', 'Active', 'Active', 'Low Battery', 'Low Water', 'Critical')
+SOURCES = ('Fire Detection System', 'Drone Fleet Management', 'Weather Monitoring System')
+LABELS = ('Fire Update', 'Safety', 'Drone Status', 'Resource Alert', 'Weather Alert', 'Wind Condition')
+
+# name -> (path, query params as a function of now in ms)
+CASES = {
+    'fire-recent': ('/api/fire-drone/recent/', lambda now: {}),
+    'fire-query-narrow': ('/api/fire-drone/query/', lambda now: {'start': now - HOUR_MS, 'end': now}),
+    'fire-query-wide': ('/api/fire-drone/query/', lambda now: {'start': now - 7 * DAY_MS, 'end': now}),
+    'fire-query-fires': ('/api/fire-drone/query/', lambda now: {'start': now - DAY_MS, 'end': now, 'entity': 'fires'}),
+    'fire-query-drones': ('/api/fire-drone/query/', lambda now: {'start': now - HOUR_MS, 'end': now,
+                                                                   'entity': 'drones'}),
+    'notifications-recent': ('/api/notifications/recent/', lambda now: {}),
+    'notifications-page': ('/api/notifications/', lambda now: {'order': 'newest', 'limit': 100}),
+}
+
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * pct / 100), len(ordered) - 1)]
+
+
+def _rss_mb():
+    # ru_maxrss is in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def _fire_drone_records(n, now, span_ms, rng):
+    """``n`` fire and drone samples (half each) spread over ``span_ms`` before ``now``, oldest first."""
+    fires, drones = [], []
+    fire_ids = max(n // 2000, 5)
+    drone_ids = max(n // 500, 10)
+    for i in range(n):
+        timestamp = now - span_ms + span_ms * i // n
+        lat, lng = 34.0 + rng.random() * 0.2, -118.5 + rng.random() * 0.2
+        if i % 2:
+            drones.append({"id": f"D-{rng.randrange(drone_ids)}", "lat": lat, "lng": lng,
+                           "battery": rng.randrange(101), "water": rng.randrange(101),
+                           "status": rng.choice(DRONE_STATUSES), "timestamp": timestamp})
+        else:
+            fires.append({"id": f"F-{rng.randrange(fire_ids)}", "lat": lat, "lng": lng,
+                          "intensity": rng.randrange(10, 101), "status": rng.choice(FIRE_STATUSES),
+                          "size": rng.randrange(1, 200), "timestamp": timestamp})
+    return fires, drones
+
+
+def _notification_records(n, now, span_ms, rng):
+    return [{
+        "id": i + 1,
+        "severity": rng.choice(SEVERITIES),
+        "title": f"Benchmark notification {i + 1}",
+        "message": "Seeded by bench_api.",
+        "timestamp": now - span_ms + span_ms * i // n,
+        "source": rng.choice(SOURCES),
+        "acknowledged": rng.random() < 0.5,
+        "labels": rng.sample(LABELS, 2),
+    } for i in range(n)]
+
+
+class Command(BaseCommand):
+    help = ("Benchmarks the REST endpoints through Django's test client with seeded fire/drone and "
+            "notification data at several sizes. Reports latency percentiles, response size and peak "
+            "memory per request, and writes the results as JSON for comparison across commits.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1000,100000,1000000',
+                            help='Comma-separated record counts, one dataset each (default: 1000,100000,1000000). '
+                                 'Each dataset has that many fire/drone samples and that many notifications')
+        parser.add_argument('--cases', default=','.join(CASES),
+                            help=f"Comma-separated cases (default: all of {', '.join(CASES)})")
+        parser.add_argument('--requests', type=int, default=50, help='Requests per case (default: 50)')
+        parser.add_argument('--budget', type=float, default=10.0,
+                            help='Seconds per case after which fewer requests are made, at least 3 (default: 10)')
+        parser.add_argument('--span-days', type=float, default=30.0,
+                            help='Seeded records are spread evenly over this many days (default: 30)')
+        parser.add_argument('--seed', type=int, default=1, help='Random seed for the generated data')
+        parser.add_argument('--json', dest='json_path', default='bench_api.json',
+                            help='Write results to this JSON file (default: bench_api.json)')
+        parser.add_argument('--compare', help='Earlier results JSON to report p50/p99 changes against')
+
+    def handle(self, *args, **options):
+        sizes = [int(s) for s in options['sizes'].split(',') if s.strip()]
+        cases = [c.strip() for c in options['cases'].split(',') if c.strip()]
+        unknown = set(cases) - set(CASES)
+        if unknown:
+            self.stderr.write(f"Unknown case(s): {', '.join(sorted(unknown))}")
+            return
+        fire_data, drone_data = list(fire_drone.MOCK_FIRE_DATA), list(fire_drone.MOCK_DRONE_DATA)
+        store = notifications.store
+        results = []
+        try:
+            for n in sizes:
+                results.extend(self._run(n, cases, options))
+        finally:
+            fire_drone.MOCK_FIRE_DATA[:] = fire_data
+            fire_drone.MOCK_DRONE_DATA[:] = drone_data
+            telemetry.load(fire_drone.MOCK_FIRE_DATA, fire_drone.MOCK_DRONE_DATA)
+            notifications.store = store
+
+        report = {
+            "commit": _commit(),
+            "python": platform.python_version(),
+            "createdAt": int(time.time() * 1000),
+            "options": {k: options[k] for k in ('sizes', 'requests', 'budget', 'span_days', 'seed')},
+            "results": results,
+        }
+        self._report(results, self._baseline(options['compare']))
+        with open(options['json_path'], 'w') as fh:
+            json.dump(report, fh, indent=2)
+        self.stdout.write(f"Results written to {options['json_path']}")
+
+    def _run(self, n, cases, options):
+        rng = random.Random(options['seed'])
+        now = int(time.time() * 1000)
+        span_ms = int(options['span_days'] * DAY_MS)
+        start = time.perf_counter()
+        fires, drones = _fire_drone_records(n, now, span_ms, rng)
+        # the views read these lists directly; telemetry adopts the same lists
+        fire_drone.MOCK_FIRE_DATA[:] = fires
+        fire_drone.MOCK_DRONE_DATA[:] = drones
+        del fires, drones
+        telemetry.load(fire_drone.MOCK_FIRE_DATA, fire_drone.MOCK_DRONE_DATA)
+        store = NotificationStore(max_records=n)
+        store.load(_notification_records(n, now, span_ms, rng))
+        notifications.store = store
+        gc.collect()
+        seed_seconds = time.perf_counter() - start
+        self.stderr.write(f"seeded {n} records in {seed_seconds:.1f} s")
+
+        client = Client(HTTP_HOST='localhost')
+        results = []
+        for name in cases:
+            path, params = CASES[name]
+            query = params(now)
+            client.get(path, query)  # warm-up
+            latencies = []
+            size = 0
+            case_start = time.perf_counter()
+            while len(latencies) < options['requests']:
+                if len(latencies) >= 3 and time.perf_counter() - case_start > options['budget']:
+                    break
+                t0 = time.perf_counter()
+                response = client.get(path, query)
+                latencies.append(time.perf_counter() - t0)
+                size = len(response.content)
+                if response.status_code != 200:
+                    raise RuntimeError(f"{name}: {path} returned {response.status_code}")
+            # allocation peak of one more request, measured apart so tracing does not skew latency
+            gc.collect()
+            tracemalloc.start()
+            client.get(path, query)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            results.append({
+                "records": n,
+                "case": name,
+                "path": path,
+                "query": query,
+                "requests": len(latencies),
+                "p50Ms": _percentile(latencies, 50) * 1000,
+                "p90Ms": _percentile(latencies, 90) * 1000,
+                "p99Ms": _percentile(latencies, 99) * 1000,
+                "meanMs": sum(latencies) / len(latencies) * 1000,
+                "responseBytes": size,
+                "peakRequestMB": peak / 2 ** 20,
+                "processRssMB": _rss_mb(),
+                "seedSeconds": seed_seconds,
+            })
+        return results
+
+    def _baseline(self, path):
+        if not path:
+            return {}
+        with open(path) as fh:
+            data = json.load(fh)
+        return {(r['records'], r['case']): r for r in data.get('results', data if isinstance(data, list) else [])}
+
+    def _report(self, results, baseline):
+        header = (f"{'records':>9} {'case':<21} {'reqs':>4} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} "
+                  f"{'resp KB':>9} {'peak MB':>8} {'rss MB':>7}")
+        if baseline:
+            header += f" {'p50 vs base':>11} {'p99 vs base':>11}"
+        self.stdout.write(header)
+        for r in results:
+            line = (f"{r['records']:>9} {r['case']:<21} {r['requests']:>4} {r['p50Ms']:>9.2f} {r['p90Ms']:>9.2f} "
+                    f"{r['p99Ms']:>9.2f} {r['responseBytes'] / 1024:>9.1f} {r['peakRequestMB']:>8.1f} "
+                    f"{r['processRssMB']:>7.0f}")
+            base = baseline.get((r['records'], r['case']))
+            if base:
+                line += (f" {(r['p50Ms'] / base['p50Ms'] - 1) * 100 if base['p50Ms'] else 0:>+10.0f}%"
+                         f" {(r['p99Ms'] / base['p99Ms'] - 1) * 100 if base['p99Ms'] else 0:>+10.0f}%")
+            elif baseline:
+                line += f" {'-':>11} {'-':>11}"
+            self.stdout.write(line)
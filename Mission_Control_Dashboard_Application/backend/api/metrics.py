@@ -0,0 +1,285 @@
+"""Request metrics and the Prometheus text exposition served on ``/metrics``.
+
+``RequestMetricsMiddleware`` records, per URL name and method, a bucketed
+latency histogram, a response size histogram, responses per status class and
+the requests in flight. Every thread writes only to its own shard of
+counters, so recording takes no lock and cannot race; ``render`` sums the
+shards when it is scraped. Recording costs a few dictionary lookups and a
+bisect, small enough to leave on in production.
+
+Other modules add their values with ``add_collector(name, collect, counters)``,
+where ``collect()`` returns the module's ``metrics()`` dict; nested dicts are
+flattened into ``mission_control_<name>_<key>`` gauges, and a ``byX`` map
+becomes one gauge labelled by ``x``. Keys listed in ``counters`` (dotted
+for nested ones) only ever grow, and are exported as counters named
+``..._total``.
+"""
+import logging
+import re
+import threading
+import time
+from bisect import bisect_left
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+_config = getattr(settings, 'REQUEST_METRICS', {})
+# upper bounds in seconds; a last, implicit bucket catches everything slower
+LATENCY_BUCKETS = tuple(_config.get('LATENCY_BUCKETS', (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)))
+SIZE_BUCKETS = tuple(_config.get('SIZE_BUCKETS', (
+    256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)))
+
+UNMATCHED = 'unmatched'  # requests that resolved to no URL name
+# any other method is counted as 'other', so clients cannot mint label values
+METHODS = frozenset(('GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS', 'TRACE', 'CONNECT'))
+
+
+class _Series:
+    __slots__ = ('latency', 'latency_sum', 'size', 'size_sum', 'count', 'statuses')
+
+    def __init__(self):
+        self.latency = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.latency_sum = 0.0
+        self.size = [0] * (len(SIZE_BUCKETS) + 1)
+        self.size_sum = 0
+        self.count = 0
+        self.statuses = {}  # '2xx' -> count
+
+
+class _Shard:
+    """One thread's counters; only that thread writes them."""
+
+    def __init__(self, thread=None):
+        self.thread = thread
+        self.series = {}  # (view, method) -> _Series
+        self.in_flight = {}  # (view, method) -> requests started minus finished
+
+    def merge(self, other):
+        for key, value in list(other.in_flight.items()):
+            self.in_flight[key] = self.in_flight.get(key, 0) + value
+        for key, s in list(other.series.items()):
+            total = self.series.get(key)
+            if total is None:
+                total = self.series[key] = _Series()
+            total.latency = [a + b for a, b in zip(total.latency, s.latency)]
+            total.latency_sum += s.latency_sum
+            total.size = [a + b for a, b in zip(total.size, s.size)]
+            total.size_sum += s.size_sum
+            total.count += s.count
+            for status, count in list(s.statuses.items()):
+                total.statuses[status] = total.statuses.get(status, 0) + count
+
+
+_shards = []
+_retired = _Shard()  # counters of threads that have exited
+_local = threading.local()
+_shards_lock = threading.Lock()  # taken once per thread to register its shard, and by render
+_collectors = {}
+
+
+def _shard():
+    shard = getattr(_local, 'shard', None)
+    if shard is None:
+        shard = _local.shard = _Shard(threading.current_thread())
+        with _shards_lock:
+            _shards.append(shard)
+    return shard
+
+
+def add_collector(name, collect, counters=()):
+    """Registers ``collect()``, returning a dict of numbers (nested dicts allowed), under ``name``.
+
+    ``counters`` are the keys, as ``'key'`` or ``'nested.key'``, whose values only ever increase.
+    """
+    _collectors[name] = (collect, frozenset(counters))
+
+
+def started(view, method):
+    in_flight = _shard().in_flight
+    key = (view, method)
+    in_flight[key] = in_flight.get(key, 0) + 1
+
+
+def finished(view, method, seconds, size, status, was_started=True):
+    shard = _shard()
+    key = (view, method)
+    if was_started:
+        shard.in_flight[key] = shard.in_flight.get(key, 0) - 1
+    series = shard.series.get(key)
+    if series is None:
+        series = shard.series[key] = _Series()
+    series.latency[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+    series.latency_sum += seconds
+    series.size[bisect_left(SIZE_BUCKETS, size)] += 1
+    series.size_sum += size
+    series.count += 1
+    status = f"{status // 100}xx"
+    series.statuses[status] = series.statuses.get(status, 0) + 1
+
+
+class RequestMetricsMiddleware:
+    """Times every request, outermost, and files it under its URL name."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+            # an async hook, so the handler does not hop to a thread to call it
+            self.process_view = self._aprocess_view
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self._acall(request)
+        start = time.perf_counter()
+        response = self.get_response(request)
+        self._record(request, response, start)
+        return response
+
+    async def _acall(self, request):
+        start = time.perf_counter()
+        response = await self.get_response(request)
+        self._record(request, response, start)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        self._start(request)
+
+    async def _aprocess_view(self, request, view_func, view_args, view_kwargs):
+        self._start(request)
+
+    @staticmethod
+    def _start(request):
+        # the URL is resolved by now, so the request can count as in flight under its name
+        request._metrics_view = request.resolver_match.url_name or request.resolver_match.view_name
+        started(request._metrics_view, _method(request))
+
+    @staticmethod
+    def _record(request, response, start):
+        seconds = time.perf_counter() - start
+        view = getattr(request, '_metrics_view', None)
+        if getattr(response, 'streaming', False):
+            size = 0  # not known until it has been sent
+        else:
+            size = len(response.content)
+        finished(view or UNMATCHED, _method(request), seconds, size, response.status_code, view is not None)
+
+
+def _method(request):
+    return request.method if request.method in METHODS else 'other'
+
+
+def _snapshot():
+    """Request counters summed over the thread shards."""
+    total = _Shard()
+    with _shards_lock:
+        # a thread-per-request server would otherwise leave a shard behind per request
+        for shard in [shard for shard in _shards if not shard.thread.is_alive()]:
+            _shards.remove(shard)
+            _retired.merge(shard)
+        shards = list(_shards)
+        total.merge(_retired)
+    for shard in shards:
+        total.merge(shard)
+    return total.series, total.in_flight
+
+
+def _labels(**labels):
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + '}'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _number(value):
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _histogram(lines, name, buckets, counts, total, labels):
+    cumulative = 0
+    for bound, count in zip(buckets, counts):
+        cumulative += count
+        lines.append(f"{name}_bucket{_labels(**labels, le=_number(bound))} {cumulative}")
+    lines.append(f"{name}_bucket{_labels(**labels, le='+Inf')} {cumulative + counts[-1]}")
+    lines.append(f"{name}_sum{_labels(**labels)} {_number(total)}")
+    lines.append(f"{name}_count{_labels(**labels)} {cumulative + counts[-1]}")
+
+
+_CAMEL = re.compile(r'(?<=[a-z0-9])(?=[A-Z])')
+_INVALID = re.compile(r'[^a-zA-Z0-9_]')
+
+
+def _metric_name(*parts):
+    return '_'.join(_INVALID.sub('_', _CAMEL.sub('_', part)).lower() for part in parts)
+
+
+_BY = re.compile(r'^by([A-Z].*)$')
+
+
+def _flatten(prefix, values, out, counters=frozenset(), path=''):
+    """Appends ``(metric, type, labels, value)``; a ``byX`` dict becomes one ``..._by_x`` metric labelled by ``x``."""
+    for key, value in values.items():
+        key_path = f"{path}{key}"
+        kind = 'counter' if key_path in counters else 'gauge'
+        suffix = '_total' if kind == 'counter' else ''
+        by = _BY.match(str(key))
+        if by and isinstance(value, dict):
+            label = _metric_name(by.group(1))
+            for item, number in value.items():
+                if isinstance(number, (int, float)):
+                    out.append((f"{prefix}_by_{label}{suffix}", kind, {label: item}, number))
+            continue
+        name = f"{prefix}_{_metric_name(str(key))}"
+        if isinstance(value, dict):
+            _flatten(name, value, out, counters, f"{key_path}.")
+        elif isinstance(value, (int, float)):
+            out.append((f"{name}{suffix}", kind, {}, value))
+
+
+def render():
+    """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+    series, in_flight = _snapshot()
+    lines = []
+    lines.append("# HELP http_request_duration_seconds Time from request to response, per URL name.")
+    lines.append("# TYPE http_request_duration_seconds histogram")
+    for (view, method), s in sorted(series.items()):
+        _histogram(lines, 'http_request_duration_seconds', LATENCY_BUCKETS, s.latency, s.latency_sum,
+                   {'view': view, 'method': method})
+    lines.append("# HELP http_response_size_bytes Response body size, per URL name.")
+    lines.append("# TYPE http_response_size_bytes histogram")
+    for (view, method), s in sorted(series.items()):
+        _histogram(lines, 'http_response_size_bytes', SIZE_BUCKETS, s.size, s.size_sum,
+                   {'view': view, 'method': method})
+    lines.append("# HELP http_responses_total Responses per status class; 4xx and 5xx are errors.")
+    lines.append("# TYPE http_responses_total counter")
+    for (view, method), s in sorted(series.items()):
+        for status, count in sorted(s.statuses.items()):
+            lines.append(f"http_responses_total{_labels(view=view, method=method, status=status)} {count}")
+    lines.append("# HELP http_requests_in_flight Requests being handled, per URL name.")
+    lines.append("# TYPE http_requests_in_flight gauge")
+    for (view, method), count in sorted(in_flight.items()):
+        lines.append(f"http_requests_in_flight{_labels(view=view, method=method)} {count}")
+
+    for name, (collect, counters) in sorted(_collectors.items()):
+        try:
+            values = collect()
+        except Exception:
+            logger.exception("metrics collector %s failed", name)
+            continue
+        samples = []
+        _flatten(_metric_name('mission_control', name), values or {}, samples, counters)
+        typed = set()
+        for metric, kind, labels, value in sorted(samples, key=lambda g: g[0]):
+            if metric not in typed:
+                typed.add(metric)
+                lines.append(f"# TYPE {metric} {kind}")
+            lines.append(f"{metric}{_labels(**labels) if labels else ''} {_number(value)}")
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.7 on 2026-10-19 10:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationAck',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('notification_id', models.BigIntegerField(unique=True)),
+                ('acknowledged', models.BooleanField(default=True)),
+                ('acknowledged_by', models.CharField(blank=True, max_length=150)),
+                ('updated_at', models.BigIntegerField()),
+            ],
+        ),
+    ]
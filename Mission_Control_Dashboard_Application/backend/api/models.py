@@ -1,3 +1,12 @@
 from django.db import models
 
-# Create your models here.
+
+class NotificationAck(models.Model):
+    """Persisted acknowledgement state of a notification, written by ``api.acks``."""
+    notification_id = models.BigIntegerField(unique=True)
+    acknowledged = models.BooleanField(default=True)
+    acknowledged_by = models.CharField(max_length=150, blank=True)
+    updated_at = models.BigIntegerField()  # ms since epoch
+
+    def __str__(self):
+        return f"{self.notification_id}: {'acked' if self.acknowledged else 'unacked'}"
@@ -0,0 +1,293 @@
+"""Retained notifications with a time index and inverted indexes.
+
+Every notification gets an integer key, its timestamp shifted left with a
+tie-breaking counter in the low bits, that orders it in time.
+The store keeps all keys in one sorted timeline plus a sorted posting list
+per severity, per label, per source and per acknowledged state, so a time range is a bisection on
+any of them.
+
+A query narrows each filtered field to the posting lists of the values
+asked for (values of one field are OR-ed) and trims them to the time range
+by bisection. The most selective field gives the candidates; every other
+field is intersected with them as a set, or, when its lists are much
+longer than the candidates, checked on each candidate record instead. The
+cost follows the selective filters rather than the number of retained
+notifications.
+
+Keys double as keyset cursors: ``page`` returns one page in time order
+plus the key of its last record, and the next page starts strictly past
+that key, so paging stays stable while newer notifications keep arriving.
+
+Unacknowledged counts per severity and per label are kept up to date on
+every insert, replacement, ack change and eviction, so ``counts`` costs
+nothing like a query.
+"""
+import itertools
+import threading
+from collections import Counter
+from bisect import bisect_left, bisect_right, insort
+
+MAX_NOTIFICATIONS = 500_000
+SEVERITIES = ('critical', 'high', 'medium', 'low', 'info')
+
+_TIE_BITS = 20
+_TIE_MASK = (1 << _TIE_BITS) - 1
+# a field whose posting lists are this many times longer than the candidates is
+# checked on each candidate record instead of intersected
+_PROBE_RATIO = 8
+
+
+def _insert(keys, key):
+    if not keys or key > keys[-1]:
+        keys.append(key)  # notifications mostly arrive in time order
+    else:
+        insort(keys, key)
+
+
+def _remove(keys, key):
+    i = bisect_left(keys, key)
+    if i < len(keys) and keys[i] == key:
+        del keys[i]
+
+
+def _terms(record):
+    yield ('severity', record.get('severity'))
+    yield ('source', record.get('source'))
+    yield ('acknowledged', bool(record.get('acknowledged')))
+    for label in record.get('labels') or ():
+        yield ('label', label)
+
+
+class NotificationStore:
+    def __init__(self, max_records=MAX_NOTIFICATIONS):
+        self.max_records = max_records
+        self._records = {}  # key -> notification
+        self._keys = {}  # notification id -> key
+        self._timeline = []
+        self._postings = {}  # (field, value) -> sorted keys
+        self._counter = itertools.count()
+        self.version = 0  # bumps on every change, for caches of derived results
+        self._unread = 0
+        self._unread_severity = Counter()
+        self._unread_label = Counter()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._records)
+
+    def load(self, notifications):
+        for notification in notifications:
+            self.add(notification)
+
+    def add(self, notification):
+        """Files a notification; one with a known id replaces the earlier version."""
+        with self._lock:
+            old = self._keys.get(notification.get('id'))
+            if old is not None:
+                self._unindex(old)
+            key = (int(notification.get('timestamp', 0)) << _TIE_BITS) | (next(self._counter) & _TIE_MASK)
+            while key in self._records:
+                key += 1
+            self._records[key] = notification
+            self._keys[notification.get('id')] = key
+            _insert(self._timeline, key)
+            for term in _terms(notification):
+                _insert(self._postings.setdefault(term, []), key)
+            self._count_unread(notification, 1)
+            self.version += 1
+            if len(self._records) > self.max_records:
+                self._evict(len(self._records) - self.max_records + self.max_records // 10)
+
+    def get(self, notification_id):
+        with self._lock:
+            key = self._keys.get(notification_id)
+            return self._records.get(key) if key is not None else None
+
+    def set_acknowledged(self, ids, acknowledged=True):
+        """Sets the acknowledged flag of known notifications; returns the ids that changed."""
+        changed = []
+        with self._lock:
+            for notification_id in ids:
+                key = self._keys.get(notification_id)
+                if key is None:
+                    continue
+                record = self._records[key]
+                if bool(record.get('acknowledged')) == acknowledged:
+                    continue
+                old = ('acknowledged', not acknowledged)
+                _remove(self._postings[old], key)
+                if not self._postings[old]:
+                    del self._postings[old]
+                _insert(self._postings.setdefault(('acknowledged', acknowledged), []), key)
+                # replaced rather than mutated: earlier query results keep their copy
+                self._records[key] = dict(record, acknowledged=acknowledged)
+                self._count_unread(dict(record, acknowledged=False), -1 if acknowledged else 1)
+                changed.append(notification_id)
+            if changed:
+                self.version += 1
+        return changed
+
+    def counts(self):
+        """Unacknowledged notifications in total, per severity and per label."""
+        with self._lock:
+            return {
+                "total": len(self._records),
+                "unacknowledged": self._unread,
+                "bySeverity": {s: self._unread_severity[s] for s in SEVERITIES},
+                "byLabel": dict(self._unread_label),
+            }
+
+    def _count_unread(self, record, delta):
+        if record.get('acknowledged'):
+            return
+        self._unread += delta
+        self._unread_severity[record.get('severity')] += delta
+        for label in record.get('labels') or ():
+            self._unread_label[label] += delta
+            if not self._unread_label[label]:
+                del self._unread_label[label]
+
+    def query(self, start=None, end=None, severities=(), labels=(), sources=(), acknowledged=None,
+              limit=None, newest_first=False):
+        """Notifications in ``[start, end]`` (ms) matching every filter given, oldest first."""
+        with self._lock:
+            keys = self._select(self._bounds(start, end), severities, labels, sources, acknowledged,
+                                limit, newest_first)
+            return [self._records[key] for key in keys]
+
+    def page(self, cursor=None, limit=50, newest_first=True, start=None, end=None, severities=(),
+             labels=(), sources=(), acknowledged=None):
+        """One page of matching notifications and the cursor of the next, or None after the last.
+
+        ``cursor`` is the value returned with the previous page; newest first
+        by default, so the first page holds the latest notifications.
+        """
+        lo, hi = self._bounds(start, end)
+        if cursor is not None:
+            if newest_first:
+                hi = cursor - 1 if hi is None else min(hi, cursor - 1)
+            else:
+                lo = cursor + 1 if lo is None else max(lo, cursor + 1)
+        with self._lock:
+            keys = self._select((lo, hi), severities, labels, sources, acknowledged, limit + 1, newest_first)
+            more = len(keys) > limit
+            keys = keys[:limit]
+            return [self._records[key] for key in keys], keys[-1] if more else None
+
+    @staticmethod
+    def _bounds(start, end):
+        lo = int(start) << _TIE_BITS if start is not None else None
+        hi = (int(end) << _TIE_BITS) | _TIE_MASK if end is not None else None
+        return lo, hi
+
+    def _select(self, bounds, severities, labels, sources, acknowledged, limit, newest_first):
+        """Keys of the matching notifications, in the order asked for."""
+        lo, hi = bounds
+        if lo is not None and hi is not None and lo > hi:
+            return []
+        fields = []
+        acks = (acknowledged,) if acknowledged is not None else ()
+        for field, values in (('severity', severities), ('label', labels), ('source', sources),
+                              ('acknowledged', acks)):
+            if values:
+                values = set(values)
+                spans = [self._span(self._postings.get((field, v), []), lo, hi) for v in values]
+                fields.append((sum(j - i for _, i, j in spans), field, values, spans))
+        if not fields or (len(fields) == 1 and len(fields[0][3]) == 1):
+            # one sorted list: slice just the end the page comes from
+            keys, i, j = fields[0][3][0] if fields else self._span(self._timeline, lo, hi)
+            if limit is not None:
+                i, j = (max(i, j - limit), j) if newest_first else (i, min(j, i + limit))
+            keys = keys[i:j]
+            if newest_first:
+                keys.reverse()
+            return keys
+
+        # start from the most selective field
+        fields.sort(key=lambda f: f[0])
+        keys = self._keys_in(fields[0][3])
+        checks = []
+        for other_size, field, values, other_spans in fields[1:]:
+            if other_size > _PROBE_RATIO * len(keys):
+                checks.append((field, values))  # cheaper to look at each candidate
+            else:
+                keys = set(keys).intersection(itertools.chain.from_iterable(
+                    keys_[i:j] for keys_, i, j in other_spans))
+                keys = sorted(keys)
+        if newest_first:
+            keys.reverse()
+
+        if not checks:
+            return keys[:limit] if limit is not None else keys
+        records = self._records
+        results = []
+        for key in keys:
+            if self._matches(records[key], checks):
+                results.append(key)
+                if limit is not None and len(results) >= limit:
+                    break
+        return results
+
+    @staticmethod
+    def _keys_in(spans):
+        """Sorted keys of the given posting list ranges (a key under two labels once)."""
+        if len(spans) == 1:
+            keys, i, j = spans[0]
+            return keys[i:j]
+        return sorted(set(itertools.chain.from_iterable(keys[i:j] for keys, i, j in spans)))
+
+    @staticmethod
+    def _span(keys, lo, hi):
+        """``(keys, i, j)`` with ``keys[i:j]`` the part of a sorted list inside the range."""
+        i = bisect_left(keys, lo) if lo is not None else 0
+        j = bisect_right(keys, hi) if hi is not None else len(keys)
+        return keys, i, j
+
+    @staticmethod
+    def _matches(record, checks):
+        for field, values in checks:
+            if field == 'label':
+                if values.isdisjoint(record.get('labels') or ()):
+                    return False
+            elif field == 'acknowledged':
+                if bool(record.get('acknowledged')) not in values:
+                    return False
+            elif record.get(field) not in values:
+                return False
+        return True
+
+    def _unindex(self, key):
+        record = self._records.pop(key)
+        if self._keys.get(record.get('id')) == key:
+            del self._keys[record.get('id')]
+        self._count_unread(record, -1)
+        _remove(self._timeline, key)
+        for term in _terms(record):
+            keys = self._postings.get(term)
+            if keys is not None:
+                _remove(keys, key)
+                if not keys:
+                    del self._postings[term]
+
+    def _evict(self, count):
+        """Drops the ``count`` oldest notifications; they are a prefix of every list."""
+        evicted = self._timeline[:count]
+        if not evicted:
+            return
+        del self._timeline[:count]
+        last = evicted[-1]
+        touched = set()
+        for key in evicted:
+            record = self._records.pop(key)
+            if self._keys.get(record.get('id')) == key:
+                del self._keys[record.get('id')]
+            self._count_unread(record, -1)
+            touched.update(_terms(record))
+        for term in touched:
+            keys = self._postings[term]
+            del keys[:bisect_right(keys, last)]
+            if not keys:
+                del self._postings[term]
+
+
+store = NotificationStore()
@@ -0,0 +1,269 @@
+"""Raster fire-spread projection.
+
+A deterministic cellular automaton over a square grid centred on the active
+fires. Every cell carries a spread rate (stamped from the intensity of nearby
+fires) and an ignition progress; each step, burning cells push progress into
+their 8 neighbours, weighted by wind alignment and distance, and cells whose
+progress reaches 1 ignite. The step is a handful of whole-grid slice
+operations, so cost is independent of the number of burning cells.
+"""
+import math
+from math import gcd
+
+import numpy as np
+
+from . import telemetry
+from .cache import LRUCache
+
+HORIZONS_MIN = (15, 30, 60)
+
+DEFAULT_GRID = 512
+MAX_GRID = 1000
+DEFAULT_CELL_M = 25.0
+DEFAULT_WIND_MPH = 12.0
+DEFAULT_WIND_FROM_DEG = 45.0  # north-east, matching the weather briefing
+
+BASE_SPREAD_M_PER_MIN = 2.0  # head-fire rate at intensity 100 with no wind
+WIND_FACTOR_PER_MPH = 0.08
+MIN_BACKING_FACTOR = 0.2
+BACKGROUND_RATE = 0.35  # fuel away from any reported fire
+INFLUENCE_RADII = 3.0  # fire intensity is stamped out to 3x its burn radius
+PERIMETER_BINS = 72
+MAX_CELL_STEPS = 50_000_000  # grid cells x automaton steps per projection, about 0.7 s
+
+M_PER_DEG_LAT = 111_320.0
+M2_PER_ACRE = 4046.86
+
+_NEIGHBOURS = [(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)]
+
+_cache = LRUCache(maxsize=32)
+
+
+def _shift_slices(dy, dx):
+    """Slices (dst, src) such that dst cell receives from its (dy, dx) neighbour."""
+    def axis(d):
+        if d > 0:
+            return slice(0, -d), slice(d, None)
+        if d < 0:
+            return slice(-d, None), slice(0, d)
+        return slice(None), slice(None)
+
+    (dst_r, src_r), (dst_c, src_c) = axis(dy), axis(dx)
+    return (dst_r, dst_c), (src_r, src_c)
+
+
+def wind_weights(wind_mph, wind_from_deg):
+    """Per-neighbour spread factors for the given wind.
+
+    Fire travels from a burning neighbour towards the cell, i.e. in the
+    direction opposite to the neighbour offset; the factor peaks when that
+    direction matches where the wind blows to.
+    """
+    to_rad = math.radians((wind_from_deg + 180.0) % 360.0)
+    wind_east, wind_north = math.sin(to_rad), math.cos(to_rad)
+    weights = []
+    for dy, dx in _NEIGHBOURS:
+        # rows grow southwards, so travel north is -dy
+        travel_east, travel_north = -dx, dy
+        dist = math.hypot(travel_east, travel_north)
+        cos_theta = (travel_east * wind_east + travel_north * wind_north) / dist
+        factor = max(1.0 + WIND_FACTOR_PER_MPH * wind_mph * cos_theta, MIN_BACKING_FACTOR)
+        weights.append(((dy, dx), factor / dist))
+    return weights
+
+
+class Grid:
+    """Square grid centred on (lat0, lng0) with ``size`` cells of ``cell_m`` metres."""
+
+    def __init__(self, lat0, lng0, size, cell_m):
+        self.lat0 = lat0
+        self.lng0 = lng0
+        self.size = size
+        self.cell_m = cell_m
+        self.m_per_deg_lng = M_PER_DEG_LAT * math.cos(math.radians(lat0))
+
+    def to_xy(self, lat, lng):
+        return (lng - self.lng0) * self.m_per_deg_lng, (lat - self.lat0) * M_PER_DEG_LAT
+
+    def to_latlng(self, x, y):
+        return self.lat0 + y / M_PER_DEG_LAT, self.lng0 + x / self.m_per_deg_lng
+
+    def cell_centres(self, rows, cols):
+        half = self.size / 2.0
+        x = (cols - half + 0.5) * self.cell_m
+        y = (half - rows - 0.5) * self.cell_m
+        return x, y
+
+    def to_cell(self, x, y):
+        half = self.size / 2.0
+        return half - y / self.cell_m - 0.5, x / self.cell_m + half - 0.5
+
+
+def _burn_radius_m(fire):
+    return math.sqrt(max(fire.get('size', 0), 0) * M2_PER_ACRE / math.pi)
+
+
+def _stamp_disc(grid, target, row, col, radius_cells, value, reducer):
+    """Applies ``reducer`` with ``value`` to cells within a disc, using a bounding-box slice."""
+    r = int(math.ceil(radius_cells))
+    r0, r1 = max(int(row) - r, 0), min(int(row) + r + 2, grid.size)
+    c0, c1 = max(int(col) - r, 0), min(int(col) + r + 2, grid.size)
+    if r0 >= r1 or c0 >= c1:
+        return
+    rr, cc = np.ogrid[r0:r1, c0:c1]
+    inside = (rr - row) ** 2 + (cc - col) ** 2 <= radius_cells ** 2
+    window = target[r0:r1, c0:c1]
+    reducer(window, np.where(inside, value, window).astype(target.dtype), out=window)
+
+
+def seed(grid, fires):
+    """Builds the initial burning mask and spread-rate map from fire records."""
+    burning = np.zeros((grid.size, grid.size), dtype=np.float32)
+    rate = np.full((grid.size, grid.size), BACKGROUND_RATE, dtype=np.float32)
+    for fire in fires:
+        x, y = grid.to_xy(fire['lat'], fire['lng'])
+        row, col = grid.to_cell(x, y)
+        radius = max(_burn_radius_m(fire) / grid.cell_m, 0.5)
+        strength = min(max(fire.get('intensity', 0), 0), 100) / 100.0
+        _stamp_disc(grid, rate, row, col, radius * INFLUENCE_RADII, strength, np.maximum)
+        _stamp_disc(grid, burning, row, col, radius, 1.0, np.maximum)
+    return burning, rate
+
+
+def _steps(weights, cell_m, horizons):
+    """``(base, substeps)``: horizons are multiples of ``base`` minutes, each run in ``substeps`` steps."""
+    fmax = max(w for _, w in weights)
+    # CFL: a cell can ignite at most one neighbour ring per step
+    dt_max = cell_m / (BASE_SPREAD_M_PER_MIN * fmax)
+    base = 0
+    for h in horizons:
+        base = gcd(base, int(h))
+    return base, max(1, math.ceil(base / dt_max))
+
+
+def cell_steps(grid_size=DEFAULT_GRID, cell_m=DEFAULT_CELL_M, wind_mph=DEFAULT_WIND_MPH,
+               wind_from_deg=DEFAULT_WIND_FROM_DEG, horizons=HORIZONS_MIN):
+    """Work a projection takes: grid cells times automaton steps up to the last horizon."""
+    base, substeps = _steps(wind_weights(wind_mph, wind_from_deg), cell_m, horizons)
+    return grid_size * grid_size * (max(int(h) for h in horizons) // base) * substeps
+
+
+def simulate(burning, rate, weights, cell_m, horizons=HORIZONS_MIN):
+    """Runs the automaton and returns the burning mask at each horizon (minutes)."""
+    base, substeps = _steps(weights, cell_m, horizons)
+    dt = base / substeps
+    coef = np.float32(dt * BASE_SPREAD_M_PER_MIN / cell_m)
+
+    # fold the constant rate/step scale into a single per-cell multiplier
+    gain = rate * coef
+    progress = np.zeros_like(burning)
+    acc = np.empty_like(burning)
+    tmp = np.empty_like(burning)
+    shifts = [(_shift_slices(dy, dx), np.float32(w)) for (dy, dx), w in weights]
+
+    snapshots = {}
+    steps_done = 0
+    for h in sorted(horizons):
+        target = (int(h) // base) * substeps
+        while steps_done < target:
+            acc.fill(0)
+            for (dst, src), w in shifts:
+                np.multiply(burning[src], w, out=tmp[dst])
+                acc[dst] += tmp[dst]
+            acc *= gain
+            progress += acc
+            np.copyto(burning, 1.0, where=progress >= 1.0)
+            steps_done += 1
+        snapshots[h] = burning > 0
+    return snapshots
+
+
+def perimeters(grid, mask, fires):
+    """Star-shaped perimeter polygon per fire from the burning mask.
+
+    Boundary cells are attributed to their nearest seed fire, then the
+    farthest boundary cell in each angular bin around that fire becomes a
+    polygon vertex.
+    """
+    interior = mask.copy()
+    interior[1:, :] &= mask[:-1, :]
+    interior[:-1, :] &= mask[1:, :]
+    interior[:, 1:] &= mask[:, :-1]
+    interior[:, :-1] &= mask[:, 1:]
+    rows, cols = np.nonzero(mask & ~interior)
+    if rows.size == 0 or not fires:
+        return []
+
+    x, y = grid.cell_centres(rows, cols)
+    centres = np.array([grid.to_xy(f['lat'], f['lng']) for f in fires])
+    dx = x[:, None] - centres[None, :, 0]
+    dy = y[:, None] - centres[None, :, 1]
+    owner = np.argmin(dx * dx + dy * dy, axis=1)
+    ox = dx[np.arange(owner.size), owner]
+    oy = dy[np.arange(owner.size), owner]
+
+    radius = np.hypot(ox, oy)
+    bins = ((np.arctan2(oy, ox) + math.pi) / (2 * math.pi) * PERIMETER_BINS).astype(np.int64) % PERIMETER_BINS
+    best = np.full(len(fires) * PERIMETER_BINS, -1.0)
+    np.maximum.at(best, owner * PERIMETER_BINS + bins, radius)
+    best = best.reshape(len(fires), PERIMETER_BINS)
+
+    angles = (np.arange(PERIMETER_BINS) + 0.5) / PERIMETER_BINS * 2 * math.pi - math.pi
+    result = []
+    for k, fire in enumerate(fires):
+        present = best[k] >= 0
+        if not present.any():
+            continue
+        r = best[k][present] + grid.cell_m / 2.0
+        px = centres[k, 0] + r * np.cos(angles[present])
+        py = centres[k, 1] + r * np.sin(angles[present])
+        lat, lng = grid.to_latlng(px, py)
+        result.append({
+            "id": fire['id'],
+            "polygon": [[round(float(a), 6), round(float(b), 6)] for a, b in zip(lat, lng)],
+        })
+    return result
+
+
+def project(fires, grid_size=DEFAULT_GRID, cell_m=DEFAULT_CELL_M,
+            wind_mph=DEFAULT_WIND_MPH, wind_from_deg=DEFAULT_WIND_FROM_DEG,
+            horizons=HORIZONS_MIN):
+    """Projects perimeters for the given fire records at each horizon."""
+    active = [f for f in fires if f.get('status') != 'Contained']
+    result = {
+        "grid": {"size": grid_size, "cellMeters": cell_m},
+        "wind": {"speedMph": wind_mph, "fromDeg": wind_from_deg},
+        "horizons": [],
+    }
+    if not active:
+        result["horizons"] = [{"minutes": h, "areaAcres": 0.0, "perimeters": []} for h in horizons]
+        return result
+
+    lat0 = sum(f['lat'] for f in active) / len(active)
+    lng0 = sum(f['lng'] for f in active) / len(active)
+    grid = Grid(lat0, lng0, grid_size, cell_m)
+    result["grid"]["center"] = {"lat": lat0, "lng": lng0}
+
+    burning, rate = seed(grid, active)
+    snapshots = simulate(burning, rate, wind_weights(wind_mph, wind_from_deg), cell_m, horizons)
+    for h in horizons:
+        mask = snapshots[h]
+        result["horizons"].append({
+            "minutes": h,
+            "areaAcres": round(float(mask.sum()) * cell_m * cell_m / M2_PER_ACRE, 1),
+            "perimeters": perimeters(grid, mask, active),
+        })
+    return result
+
+
+def current_projection(grid_size=DEFAULT_GRID, cell_m=DEFAULT_CELL_M,
+                       wind_mph=DEFAULT_WIND_MPH, wind_from_deg=DEFAULT_WIND_FROM_DEG):
+    """Projection of the latest fire state, cached per telemetry data version."""
+    version, fires, _ = telemetry.snapshot()
+    key = (version, grid_size, cell_m, wind_mph, wind_from_deg)
+    cached = _cache.get(key)
+    if cached is None:
+        cached = project(fires, grid_size, cell_m, wind_mph, wind_from_deg)
+        cached["dataVersion"] = version
+        _cache.set(key, cached)
+    return cached
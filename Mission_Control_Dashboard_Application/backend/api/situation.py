@@ -0,0 +1,171 @@
+"""Live situational context for the Fire Warden.
+
+``Situation`` follows the latest record per fire and drone as samples are
+ingested (it is a telemetry listener) and keeps the aggregates a summary
+needs up to date as it goes: counts per status, active acreage, battery and
+water totals, the active fires ordered by priority and the drones short on
+battery or water ordered by battery. ``build`` then only reads those
+aggregates and the newest critical notifications from the notification
+store, so its cost does not grow with history or fleet size.
+
+``summary_text`` renders the context as the short plain-text brief used by
+the keyword replies and meant for an LLM prompt.
+"""
+import threading
+from bisect import bisect_left, insort
+from collections import Counter
+
+from . import assignment, telemetry
+from .notification_store import store as notification_store
+
+WORST_FIRES = 3
+LOW_DRONES = 5
+CRITICAL_ALERTS = 3
+INACTIVE_FIRE_STATUSES = {'Contained', 'Extinguished'}
+
+
+def _discard(keys, key):
+    i = bisect_left(keys, key)
+    if i < len(keys) and keys[i] == key:
+        del keys[i]
+
+
+def _count(counter, key, delta):
+    counter[key] += delta
+    if not counter[key]:
+        del counter[key]
+
+
+def _fire_rank(fire):
+    # ascending order, so the worst fire sorts last
+    return assignment.fire_priority(fire), fire.get('size', 0), fire['id']
+
+
+def _drone_rank(drone):
+    return drone.get('battery', 0), drone.get('water', 0), drone['id']
+
+
+class Situation:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._clear()
+
+    def _clear(self):
+        self._fires = {}
+        self._drones = {}
+        self._fire_status = Counter()
+        self._drone_status = Counter()
+        self._active_acres = 0.0
+        self._battery = 0.0
+        self._water = 0.0
+        self._active = []  # _fire_rank of active fires, ascending
+        self._low = []  # _drone_rank of unfit drones, ascending
+        self._seeded = False
+
+    def on_sample(self, kind, record, previous):
+        """Telemetry listener: folds one fire or drone sample into the aggregates."""
+        with self._lock:
+            if not self._seeded:
+                return  # the first build seeds from the latest state, which has this sample
+            if kind == 'fire':
+                self._set_fire(record)
+            elif kind == 'drone':
+                self._set_drone(record)
+
+    def reset(self):
+        """Rebuilds the aggregates from the latest telemetry state."""
+        with self._lock:
+            # samples ingested meanwhile wait in on_sample and are applied after
+            _, fires, drones = telemetry.snapshot()
+            self._clear()
+            for fire in fires:
+                self._set_fire(fire)
+            for drone in drones:
+                self._set_drone(drone)
+            self._seeded = True
+
+    def build(self):
+        """Compact context: fire and drone counts, worst fires, low drones, recent critical alerts."""
+        if not self._seeded:
+            self.reset()
+        alerts = notification_store.query(severities=['critical'], limit=CRITICAL_ALERTS, newest_first=True)
+        with self._lock:
+            fleet = len(self._drones)
+            worst = [self._fires[fire_id] for *_, fire_id in reversed(self._active[-WORST_FIRES:])]
+            low = [self._drones[drone_id] for *_, drone_id in self._low[:LOW_DRONES]]
+            return {
+                "fires": {
+                    "total": len(self._fires),
+                    "active": len(self._active),
+                    "activeAcres": round(self._active_acres, 1),
+                    "byStatus": dict(self._fire_status),
+                    "worst": [{k: fire.get(k) for k in ('id', 'status', 'intensity', 'size', 'lat', 'lng')}
+                              for fire in worst],
+                },
+                "drones": {
+                    "total": fleet,
+                    "fit": fleet - len(self._low),
+                    "byStatus": dict(self._drone_status),
+                    "avgBattery": round(self._battery / fleet, 1) if fleet else None,
+                    "avgWater": round(self._water / fleet, 1) if fleet else None,
+                    "low": [{k: drone.get(k) for k in ('id', 'status', 'battery', 'water')} for drone in low],
+                    "lowCount": len(self._low),
+                },
+                "criticalAlerts": [{k: n.get(k) for k in ('id', 'title', 'timestamp', 'acknowledged')}
+                                   for n in alerts],
+            }
+
+    def _set_fire(self, fire):
+        old = self._fires.get(fire['id'])
+        if old is not None:
+            if fire.get('timestamp', 0) < old.get('timestamp', 0):
+                return
+            _count(self._fire_status, old.get('status'), -1)
+            if old.get('status') not in INACTIVE_FIRE_STATUSES:
+                self._active_acres -= old.get('size', 0)
+                _discard(self._active, _fire_rank(old))
+        self._fires[fire['id']] = fire
+        _count(self._fire_status, fire.get('status'), 1)
+        if fire.get('status') not in INACTIVE_FIRE_STATUSES:
+            self._active_acres += fire.get('size', 0)
+            insort(self._active, _fire_rank(fire))
+
+    def _set_drone(self, drone):
+        old = self._drones.get(drone['id'])
+        if old is not None:
+            if drone.get('timestamp', 0) < old.get('timestamp', 0):
+                return
+            _count(self._drone_status, old.get('status'), -1)
+            self._battery -= old.get('battery', 0)
+            self._water -= old.get('water', 0)
+            if not assignment.is_fit(old):
+                _discard(self._low, _drone_rank(old))
+        self._drones[drone['id']] = drone
+        _count(self._drone_status, drone.get('status'), 1)
+        self._battery += drone.get('battery', 0)
+        self._water += drone.get('water', 0)
+        if not assignment.is_fit(drone):
+            insort(self._low, _drone_rank(drone))
+
+
+def summary_text(context):
+    """The context as a few plain sentences."""
+    fires, drones = context['fires'], context['drones']
+    lines = [f"{fires['active']} active fire{'s' if fires['active'] != 1 else ''} "
+             f"covering {fires['activeAcres']:g} acres ({fires['total']} tracked)."]
+    if fires['worst']:
+        lines.append("Highest priority: " + "; ".join(
+            f"{f['id']} ({f['status']}, intensity {f['intensity']}, {f['size']} acres)" for f in fires['worst']) + ".")
+    if drones['total']:
+        lines.append(f"{drones['fit']} of {drones['total']} drones fit for dispatch; average battery "
+                     f"{drones['avgBattery']:g}%, average water {drones['avgWater']:g}%.")
+    if drones['low']:
+        lines.append("Needing recharge or refill: " + ", ".join(
+            f"{d['id']} ({d['battery']}% battery, {d['water']}% water)" for d in drones['low']) + ".")
+    alerts = [a for a in context['criticalAlerts'] if not a.get('acknowledged')]
+    if alerts:
+        lines.append("Unacknowledged critical alerts: " + "; ".join(a['title'] for a in alerts) + ".")
+    return " ".join(lines)
+
+
+situation = Situation()
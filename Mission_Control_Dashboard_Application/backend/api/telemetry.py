@@ -0,0 +1,114 @@
+"""Live fire/drone state shared by the REST views and websocket consumers.
+
+The history lists are the append-only record logs the HTTP endpoints query.
+Alongside them we keep the newest record per entity id and a data version
+that bumps on every ingest, so derived results (projections, tiles, chat
+replies) can be cached against the version instead of rescanning history.
+
+Listeners registered with ``add_listener`` are called after every ingest
+with ``(kind, record, previous)``, where ``previous`` is the entity's prior
+latest record (or None), so consumers can react to changes incrementally.
+Samples another worker produced are ingested with ``relayed=True``; they
+reach only the listeners registered with ``relayed=True`` (the default).
+"""
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_fire_history = []
+_drone_history = []
+_latest_fires = {}
+_latest_drones = {}
+_data_version = 0
+_listeners = []
+
+
+def _track_latest(latest, record):
+    """Updates the latest map and returns the record it replaced (or None)."""
+    current = latest.get(record['id'])
+    if current is None or record.get('timestamp', 0) >= current.get('timestamp', 0):
+        latest[record['id']] = record
+    return current
+
+
+def _notify(kind, record, previous, relayed):
+    for listener, on_relayed in _listeners:
+        if relayed and not on_relayed:
+            continue
+        try:
+            listener(kind, record, previous)
+        except Exception:
+            logger.exception("telemetry listener failed for %s %s", kind, record.get('id'))
+
+
+def add_listener(listener, relayed=True):
+    """Registers ``listener(kind, record, previous)`` to run after every ingest (or only local ones)."""
+    if all(registered is not listener for registered, _ in _listeners):
+        _listeners.append((listener, relayed))
+
+
+def load(fires, drones):
+    """Adopt existing record lists as the backing histories."""
+    global _fire_history, _drone_history, _data_version
+    with _lock:
+        _fire_history = fires
+        _drone_history = drones
+        _latest_fires.clear()
+        _latest_drones.clear()
+        for f in fires:
+            _track_latest(_latest_fires, f)
+        for d in drones:
+            _track_latest(_latest_drones, d)
+        _data_version += 1
+
+
+def ingest_fire(record, relayed=False):
+    """Append a fire sample to history and update the latest state."""
+    global _data_version
+    with _lock:
+        _fire_history.append(record)
+        previous = _track_latest(_latest_fires, record)
+        _data_version += 1
+        version = _data_version
+    _notify('fire', record, previous, relayed)
+    return version
+
+
+def ingest_drone(record, relayed=False):
+    """Append a drone sample to history and update the latest state."""
+    global _data_version
+    with _lock:
+        _drone_history.append(record)
+        previous = _track_latest(_latest_drones, record)
+        _data_version += 1
+        version = _data_version
+    _notify('drone', record, previous, relayed)
+    return version
+
+
+def fire_history_since(start):
+    """Fire records appended since history index ``start``, and the new history length."""
+    with _lock:
+        return _fire_history[start:], len(_fire_history)
+
+
+def data_version():
+    return _data_version
+
+
+def latest_fires():
+    with _lock:
+        return list(_latest_fires.values())
+
+
+def latest_drones():
+    with _lock:
+        return list(_latest_drones.values())
+
+
+def snapshot():
+    """Returns (data_version, latest fires, latest drones) taken atomically."""
+    with _lock:
+        return _data_version, list(_latest_fires.values()), list(_latest_drones.values())
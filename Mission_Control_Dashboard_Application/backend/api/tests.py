@@ -1,3 +1,1119 @@
+import asyncio
+import itertools
+import json
+import random
+import re
+import time
+from collections import OrderedDict
+from unittest import mock
+
+import numpy as np
+
+from django.db import DatabaseError
 from django.test import TestCase
 
-# Create your tests here.
+from api import acks, assignment, llm, metrics, projection, telemetry, tiles
+from api.intents import DEFAULT, DEFAULT_INTENTS, Intent, IntentRouter
+from api.alerts import ABOVE, BELOW, DEFAULT_RULES, HYSTERESIS, AlertEngine, Rule
+from api.cache import LRUCache
+from api.models import NotificationAck
+from api.situation import Situation, summary_text
+from api.views import fire_warden
+from api.coalescing import NotificationCoalescer, fingerprint
+from api.notification_store import SEVERITIES, NotificationStore
+
+LABELS = ('fire', 'drone', 'weather', 'comms')
+SOURCES = ('sensor-a', 'sensor-b', 'drone-1')
+
+
+def _notification(i, timestamp=None, **fields):
+    rng = random.Random(i)
+    return dict({
+        "id": i,
+        "timestamp": timestamp if timestamp is not None else 1_000 + i * 10,
+        "severity": rng.choice(SEVERITIES),
+        "labels": rng.sample(LABELS, rng.randint(0, 2)),
+        "source": rng.choice(SOURCES),
+        "acknowledged": rng.random() < 0.3,
+    }, **fields)
+
+
+def _matches(n, start=None, end=None, severities=(), labels=(), sources=(), acknowledged=None):
+    return ((start is None or n["timestamp"] >= start)
+            and (end is None or n["timestamp"] <= end)
+            and (not severities or n["severity"] in severities)
+            and (not labels or not set(labels).isdisjoint(n["labels"]))
+            and (not sources or n["source"] in sources)
+            and (acknowledged is None or n["acknowledged"] == acknowledged))
+
+
+def _pages(store, limit, **filters):
+    ids, cursor = [], None
+    while True:
+        page, cursor = store.page(cursor=cursor, limit=limit, **filters)
+        ids.extend(n["id"] for n in page)
+        if cursor is None:
+            return ids
+
+
+class NotificationStoreQueryTests(TestCase):
+    def setUp(self):
+        self.notifications = [_notification(i) for i in range(400)]
+        self.store = NotificationStore()
+        self.store.load(self.notifications)
+
+    def assertQuery(self, **filters):
+        expected = [n["id"] for n in self.notifications if _matches(n, **filters)]
+        self.assertEqual([n["id"] for n in self.store.query(**filters)], expected, filters)
+        newest = [n["id"] for n in self.store.query(newest_first=True, **filters)]
+        self.assertEqual(newest, expected[::-1], filters)
+
+    def test_single_field_filters(self):
+        self.assertQuery()
+        for severity in SEVERITIES:
+            self.assertQuery(severities=[severity])
+        for label in LABELS:
+            self.assertQuery(labels=[label])
+        for source in SOURCES:
+            self.assertQuery(sources=[source])
+        self.assertQuery(acknowledged=True)
+        self.assertQuery(acknowledged=False)
+
+    def test_values_of_one_field_are_ored(self):
+        self.assertQuery(severities=['critical', 'low'])
+        self.assertQuery(labels=['fire', 'comms'])
+        self.assertQuery(sources=['sensor-a', 'drone-1'])
+
+    def test_fields_are_anded(self):
+        self.assertQuery(severities=['high', 'critical'], labels=['fire'])
+        self.assertQuery(severities=['info'], sources=['sensor-b'], acknowledged=False)
+        self.assertQuery(labels=['drone', 'weather'], sources=['drone-1'], acknowledged=True)
+        # a broad field next to a narrow one is checked per candidate rather than intersected
+        self.assertQuery(acknowledged=False, severities=['critical'], labels=['comms'])
+
+    def test_time_range_is_inclusive(self):
+        self.assertQuery(start=1_500, end=2_500)
+        self.assertQuery(start=1_500, end=1_500)
+        self.assertQuery(start=2_000, severities=['medium'], labels=['fire'])
+        self.assertQuery(end=1_990, sources=['sensor-a'])
+        self.assertQuery(start=3_000, end=2_000)
+
+    def test_unknown_values_match_nothing(self):
+        self.assertEqual(self.store.query(labels=['nope']), [])
+        self.assertEqual(self.store.query(severities=['critical'], sources=['nope']), [])
+
+    def test_limit_takes_the_requested_end(self):
+        expected = [n["id"] for n in self.notifications if _matches(n, labels=['fire'])]
+        oldest = self.store.query(labels=['fire'], limit=5)
+        newest = self.store.query(labels=['fire'], limit=5, newest_first=True)
+        self.assertEqual([n["id"] for n in oldest], expected[:5])
+        self.assertEqual([n["id"] for n in newest], expected[::-1][:5])
+
+    def test_replacement_reindexes(self):
+        self.store.add(dict(self.notifications[10], severity='critical', labels=['comms']))
+        self.assertIn(10, [n["id"] for n in self.store.query(severities=['critical'], labels=['comms'])])
+        self.assertEqual(len(self.store), 400)
+
+    def test_ack_change_moves_between_posting_lists(self):
+        target = next(n for n in self.notifications if not n["acknowledged"])
+        self.assertEqual(self.store.set_acknowledged([target["id"], 'unknown']), [target["id"]])
+        self.assertEqual(self.store.set_acknowledged([target["id"]]), [])
+        self.assertIn(target["id"], [n["id"] for n in self.store.query(acknowledged=True)])
+        self.assertNotIn(target["id"], [n["id"] for n in self.store.query(acknowledged=False)])
+
+
+class NotificationStorePagingTests(TestCase):
+    def test_pages_cover_the_query(self):
+        store = NotificationStore()
+        notifications = [_notification(i) for i in range(250)]
+        store.load(notifications)
+        for newest_first in (True, False):
+            for filters in ({}, {"severities": ['high', 'critical']}, {"labels": ['fire'], "acknowledged": False}):
+                expected = [n["id"] for n in store.query(newest_first=newest_first, **filters)]
+                self.assertEqual(_pages(store, 7, newest_first=newest_first, **filters), expected)
+
+    def test_equal_timestamps_page_without_gaps_or_repeats(self):
+        store = NotificationStore()
+        store.load(_notification(i, timestamp=5_000) for i in range(30))
+        self.assertEqual(_pages(store, 4, newest_first=False), list(range(30)))
+
+    def test_newest_first_paging_ignores_newer_inserts(self):
+        store = NotificationStore()
+        store.load(_notification(i) for i in range(100))
+        page, cursor = store.page(limit=10)
+        seen = [n["id"] for n in page]
+        store.load(_notification(i) for i in range(100, 150))
+        while cursor is not None:
+            page, cursor = store.page(cursor=cursor, limit=10)
+            seen.extend(n["id"] for n in page)
+        self.assertEqual(seen, list(range(99, -1, -1)))
+
+    def test_oldest_first_paging_reaches_newer_inserts(self):
+        store = NotificationStore()
+        store.load(_notification(i) for i in range(30))
+        page, cursor = store.page(limit=10, newest_first=False)
+        seen = [n["id"] for n in page]
+        store.load(_notification(i) for i in range(30, 45))
+        while cursor is not None:
+            page, cursor = store.page(cursor=cursor, limit=10, newest_first=False)
+            seen.extend(n["id"] for n in page)
+        self.assertEqual(seen, list(range(45)))
+
+    def test_paging_continues_past_evictions(self):
+        store = NotificationStore(max_records=100)
+        store.load(_notification(i) for i in range(100))
+        page, cursor = store.page(limit=10)
+        seen = [n["id"] for n in page]
+        # each add past the cap evicts the overflow plus the oldest tenth: 0-10, then 11-21
+        store.load(_notification(i) for i in range(100, 120))
+        self.assertEqual(len(store), 98)
+        while cursor is not None:
+            page, cursor = store.page(cursor=cursor, limit=10)
+            seen.extend(n["id"] for n in page)
+        # the rest of the first pages, minus what was evicted, with no repeats
+        self.assertEqual(seen, list(range(99, 21, -1)))
+
+    def test_eviction_drops_oldest_from_every_posting_list(self):
+        store = NotificationStore(max_records=50)
+        notifications = [_notification(i) for i in range(80)]
+        store.load(notifications)
+        kept = {n["id"] for n in store.query()}
+        self.assertEqual(min(kept), 80 - len(store))
+        for label in LABELS:
+            expected = [n["id"] for n in notifications if n["id"] in kept and label in n["labels"]]
+            self.assertEqual([n["id"] for n in store.query(labels=[label])], expected)
+
+
+class NotificationStoreCountsTests(TestCase):
+    def assertCounts(self, store, notifications):
+        unread = [n for n in notifications if not n["acknowledged"]]
+        labels = {}
+        for n in unread:
+            for label in n["labels"]:
+                labels[label] = labels.get(label, 0) + 1
+        self.assertEqual(store.counts(), {
+            "total": len(notifications),
+            "unacknowledged": len(unread),
+            "bySeverity": {s: sum(n["severity"] == s for n in unread) for s in SEVERITIES},
+            "byLabel": labels,
+        })
+
+    def test_counts_follow_inserts_acks_replacements_and_evictions(self):
+        store = NotificationStore(max_records=60)
+        notifications = {i: _notification(i) for i in range(50)}
+        store.load(notifications.values())
+        self.assertCounts(store, list(notifications.values()))
+
+        ids = [i for i, n in notifications.items() if not n["acknowledged"]][:10]
+        store.set_acknowledged(ids)
+        for i in ids:
+            notifications[i] = dict(notifications[i], acknowledged=True)
+        store.set_acknowledged(ids[:3], acknowledged=False)
+        for i in ids[:3]:
+            notifications[i] = dict(notifications[i], acknowledged=False)
+        self.assertCounts(store, list(notifications.values()))
+
+        notifications[5] = dict(notifications[5], severity='critical', labels=['comms'], acknowledged=False)
+        store.add(notifications[5])
+        self.assertCounts(store, list(notifications.values()))
+
+        for i in range(50, 70):
+            notifications[i] = _notification(i)
+            store.add(notifications[i])
+        kept = {n["id"] for n in store.query()}
+        self.assertCounts(store, [n for i, n in notifications.items() if i in kept])
+
+
+class NotificationQueryViewTests(TestCase):
+    def setUp(self):
+        self.store = NotificationStore()
+        self.store.load(_notification(i) for i in range(60))
+        patcher = mock.patch('api.views.notifications.store', self.store)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_cursor_pages_through_filtered_results(self):
+        expected = [n["id"] for n in self.store.query(severities=['high', 'low'], newest_first=True)]
+        ids, params = [], {"severity": 'high,low', "order": 'newest', "limit": 4}
+        while True:
+            body = self.client.get('/api/notifications/', params).json()
+            ids.extend(n["id"] for n in body["notifications"])
+            if body["nextCursor"] is None:
+                break
+            params["cursor"] = body["nextCursor"]
+        self.assertEqual(ids, expected)
+
+    def test_rejects_bad_parameters(self):
+        for params in ({"severity": 'urgent'}, {"start": 'soon'}, {"acknowledged": 'maybe'},
+                       {"order": 'random'}, {"limit": 'ten'}, {"cursor": '!'}):
+            response = self.client.get('/api/notifications/', params)
+            self.assertEqual(response.status_code, 400, params)
+            self.assertIn("error", response.json())
+
+    def test_counts(self):
+        response = self.client.get('/api/notifications/counts/')
+        self.assertEqual(response.json(), self.store.counts())
+
+
+def _alert(title='Fire C-2 intensity at 80%', severity='medium', source='Fire Detection System', **fields):
+    return dict({"title": title, "severity": severity, "source": source, "entity": 'C-2',
+                 "message": title, "timestamp": 1_000}, **fields)
+
+
+class NotificationCoalescerTests(TestCase):
+    def setUp(self):
+        ids = iter(range(1, 1_000))
+        self.coalescer = NotificationCoalescer(window=60, rate_per_minute=60, burst=2, max_queued=3,
+                                               id_factory=lambda: next(ids))
+
+    def test_fingerprint_blanks_values_but_keeps_ids(self):
+        self.assertEqual(fingerprint(_alert('Fire C-2 intensity at 80%')),
+                         fingerprint(_alert('Fire C-2 intensity at 91.5%')))
+        self.assertNotEqual(fingerprint(_alert('Fire C-2 intensity at 80%')),
+                            fingerprint(_alert('Fire C-3 intensity at 80%')))
+        self.assertNotEqual(fingerprint(_alert()), fingerprint(_alert(entity='C-3')))
+
+    def test_repeats_within_window_merge_into_one_update(self):
+        first, = self.coalescer.submit(_alert(), now=0)
+        self.assertEqual((first["id"], first["count"]), (1, 1))
+        self.assertEqual(self.coalescer.submit(_alert('Fire C-2 intensity at 85%', timestamp=2_000), now=10), [])
+        self.assertEqual(self.coalescer.submit(_alert('Fire C-2 intensity at 90%', timestamp=3_000), now=20), [])
+        # the update waits a window after the last send
+        self.assertEqual(self.coalescer.next_deadline(), 60)
+        self.assertEqual(self.coalescer.flush(now=59.9), [])
+        update, = self.coalescer.flush(now=60)
+        self.assertEqual(update["id"], 1)
+        self.assertEqual(update["count"], 3)
+        self.assertEqual((update["firstSeen"], update["lastSeen"]), (1_000, 3_000))
+        self.assertEqual(update["title"], 'Fire C-2 intensity at 90%')
+        self.assertEqual(self.coalescer.metrics()["merged"], 2)
+
+    def test_window_slides_with_each_repeat(self):
+        self.coalescer.submit(_alert(), now=0)
+        sent = []
+        for now in (50, 100, 150, 209):
+            sent += self.coalescer.submit(_alert(), now=now)
+        # still the first notification, updated once per window rather than per repeat
+        self.assertEqual([(n["id"], n["count"]) for n in sent], [(1, 2), (1, 4)])
+        self.assertEqual(self.coalescer.next_deadline(), 209 + 60)
+        update, = self.coalescer.flush(now=269)
+        self.assertEqual((update["id"], update["count"]), (1, 5))
+
+    def test_repeat_after_quiet_window_starts_a_new_notification(self):
+        self.coalescer.submit(_alert(), now=0)
+        self.assertEqual(self.coalescer.flush(now=61), [])
+        self.assertEqual(self.coalescer.metrics()["openGroups"], 0)
+        again, = self.coalescer.submit(_alert(), now=61)
+        self.assertEqual((again["id"], again["count"]), (2, 1))
+
+    def test_severity_escalation_is_kept_for_the_next_update(self):
+        self.coalescer.submit(_alert(severity='medium'), now=0)
+        self.assertEqual(self.coalescer.submit(_alert(severity='high'), now=5), [])
+        self.assertEqual(self.coalescer.submit(_alert(severity='low'), now=10), [])
+        update, = self.coalescer.flush(now=60)
+        self.assertEqual(update["severity"], 'high')
+
+    def test_critical_repeat_flushes_at_once(self):
+        self.coalescer.submit(_alert(), now=0)
+        self.coalescer.submit(_alert(), now=5)
+        update, = self.coalescer.submit(_alert(severity='critical'), now=10)
+        self.assertEqual((update["id"], update["count"], update["severity"]), (1, 3, 'critical'))
+        # nothing left to send; the next window starts from the critical send
+        self.assertEqual(self.coalescer.flush(now=60), [])
+        self.assertEqual(self.coalescer.submit(_alert(), now=20), [])
+        self.assertEqual(self.coalescer.next_deadline(), 70)
+
+    def test_new_notifications_are_rate_limited_per_source(self):
+        sent = [n for i in range(4) for n in self.coalescer.submit(_alert(f'Alert {chr(65 + i)}'), now=0)]
+        self.assertEqual([n["title"] for n in sent], ['Alert A', 'Alert B'])
+        other, = self.coalescer.submit(_alert('Alert A', source='Drone Management System'), now=0)
+        self.assertEqual(other["source"], 'Drone Management System')
+        # one token a second
+        self.assertEqual(self.coalescer.next_deadline(), 1.0)
+        self.assertEqual([n["title"] for n in self.coalescer.flush(now=1.0)], ['Alert C'])
+        self.assertEqual([n["title"] for n in self.coalescer.flush(now=2.0)], ['Alert D'])
+
+    def test_queue_drops_oldest_non_critical_and_critical_skips_it(self):
+        for i in range(2):
+            self.coalescer.submit(_alert(f'Alert {chr(65 + i)}'), now=0)
+        self.coalescer.submit(_alert('Alert Q', severity='critical'), now=0)  # skips the bucket
+        self.coalescer.submit(_alert('Alert R', severity='high'), now=0)
+        self.coalescer.submit(_alert('Alert S'), now=0)
+        self.coalescer.submit(_alert('Alert T'), now=0)
+        self.assertEqual(self.coalescer.metrics()["queued"], 3)
+        self.coalescer.submit(_alert('Alert U'), now=0)
+        self.assertEqual(self.coalescer.metrics()["dropped"], 1)
+        released = [n["title"] for t in (1, 2, 3) for n in self.coalescer.flush(now=t)]
+        self.assertEqual(released, ['Alert S', 'Alert T', 'Alert U'])
+
+
+class AlertEngineTests(TestCase):
+    DEFAULTS = {
+        'fire': {"status": 'Active', "intensity": 40, "size": 10},
+        'drone': {"status": 'Active', "battery": 100, "water": 100},
+    }
+
+    def setUp(self):
+        self.engine = AlertEngine(DEFAULT_RULES)
+        self.previous = {}
+        self.clock = 0
+
+    def sample(self, entity, entity_id, minutes=1, **fields):
+        """Feeds the next sample of an entity, ``minutes`` after its last one; returns the alert titles."""
+        self.clock += int(minutes * 60_000)
+        previous = self.previous.get((entity, entity_id))
+        record = dict(previous or dict(self.DEFAULTS[entity], id=entity_id), timestamp=self.clock, **fields)
+        self.previous[(entity, entity_id)] = record
+        return [n["title"] for n in self.engine.evaluate(entity, record, previous)]
+
+    def test_hysteresis_above_fires_once_until_reset(self):
+        self.assertEqual(self.sample('fire', 'C-1', size=95), [])
+        self.assertEqual(self.sample('fire', 'C-1', size=100), [])  # at the threshold is not past it
+        self.assertEqual(self.sample('fire', 'C-1', size=101), ['Fire C-1 exceeds 100 acres'])
+        # wandering around the threshold without reaching the reset level stays quiet
+        for size in (98, 104, 90, 120):
+            self.assertEqual(self.sample('fire', 'C-1', size=size), [])
+        self.assertEqual(self.sample('fire', 'C-1', size=89), [])  # re-armed
+        self.assertEqual(self.sample('fire', 'C-1', size=101), ['Fire C-1 exceeds 100 acres'])
+
+    def test_hysteresis_below_fires_once_until_reset(self):
+        title = 'Drone D-1 battery at {}%'
+        self.assertEqual(self.sample('drone', 'D-1', battery=40), [])
+        self.assertEqual(self.sample('drone', 'D-1', battery=19), [title.format(19)])
+        for battery in (25, 18, 30, 10):
+            self.assertEqual(self.sample('drone', 'D-1', battery=battery), [])
+        self.assertEqual(self.sample('drone', 'D-1', battery=31), [])  # re-armed
+        self.assertEqual(self.sample('drone', 'D-1', battery=15), [title.format(15)])
+
+    def test_first_sample_inside_the_condition_fires(self):
+        self.assertEqual(self.sample('fire', 'C-1', size=150), ['Fire C-1 exceeds 100 acres'])
+        self.assertEqual(self.sample('fire', 'C-1', size=160), [])
+
+    def test_hysteresis_state_is_per_entity(self):
+        self.assertEqual(self.sample('fire', 'C-1', size=150), ['Fire C-1 exceeds 100 acres'])
+        self.assertEqual(self.sample('fire', 'C-2', size=150), ['Fire C-2 exceeds 100 acres'])
+        self.sample('fire', 'C-1', size=50)
+        self.assertEqual(self.sample('fire', 'C-1', size=150), ['Fire C-1 exceeds 100 acres'])
+        self.assertEqual(self.sample('fire', 'C-2', size=151), [])
+
+    def test_custom_hysteresis_band(self):
+        engine = AlertEngine([Rule('hot', 'fire', 'intensity', kind=HYSTERESIS, op=ABOVE, value=80, reset=60,
+                                   title='hot'),
+                              Rule('cold', 'fire', 'intensity', kind=HYSTERESIS, op=BELOW, value=20, reset=40,
+                                   title='cold')])
+        previous, fired = None, []
+        for intensity in (50, 81, 70, 85, 59, 19, 30, 15, 41, 90):
+            record = {"id": 'C-1', "timestamp": len(fired), "intensity": intensity}
+            fired.append([n["title"] for n in engine.evaluate('fire', record, previous)])
+            previous = record
+        self.assertEqual(fired, [[], ['hot'], [], [], [], ['cold'], [], [], [], ['hot']])
+
+    def test_hysteresis_reset_must_be_past_the_value(self):
+        for op, value, reset in ((ABOVE, 80, None), (ABOVE, 80, '60'), (ABOVE, 80, 80), (ABOVE, 80, 90),
+                                 (BELOW, 20, 20), (BELOW, 20, 10), (BELOW, None, 40), ('equals', 20, 40)):
+            engine = AlertEngine()
+            with self.assertRaises(ValueError, msg=(op, value, reset)):
+                engine.add_rule(Rule('band', 'fire', 'intensity', kind=HYSTERESIS, op=op, value=value, reset=reset))
+            self.assertEqual(engine.rules, [])
+        AlertEngine([Rule('band', 'fire', 'intensity', kind=HYSTERESIS, op=BELOW, value=20.5, reset=21)])
+
+    def test_threshold_status_rules_fire_on_the_edge(self):
+        self.assertEqual(self.sample('fire', 'C-1', status='Active'), [])
+        self.assertEqual(self.sample('fire', 'C-1', status='Critical'), ['Fire C-1 is now critical'])
+        self.assertEqual(self.sample('fire', 'C-1', status='Critical'), [])
+        self.sample('fire', 'C-1', status='Active')
+        self.assertEqual(self.sample('fire', 'C-1', status='Critical'), ['Fire C-1 is now critical'])
+
+    def test_rate_rule_uses_sample_timestamps(self):
+        self.assertEqual(self.sample('fire', 'C-1', intensity=40), [])
+        self.assertEqual(self.sample('fire', 'C-1', minutes=2, intensity=50), [])  # 5 per minute
+        self.assertEqual(self.sample('fire', 'C-1', minutes=0.5, intensity=56), ['Fire C-1 intensity rising fast'])
+        self.assertEqual(self.sample('fire', 'C-1', minutes=0.5, intensity=63), [])  # still fast: no new edge
+
+    def test_late_sample_is_ignored(self):
+        self.sample('fire', 'C-1', size=50)
+        previous = self.previous[('fire', 'C-1')]
+        late = dict(previous, timestamp=previous["timestamp"] - 1, size=150)
+        self.assertEqual(self.engine.evaluate('fire', late, previous), [])
+        self.assertEqual(self.sample('fire', 'C-1', size=150), ['Fire C-1 exceeds 100 acres'])
+
+
+def _chunk(message):
+    data = json.dumps(message).encode() + b'\n'
+    return b'%x\r\n%s\r\n' % (len(data), data)
+
+
+_STREAM_HEADERS = b"HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson\r\nTransfer-Encoding: chunked\r\n\r\n"
+
+
+class _LLMService:
+    """Scripted stand-in for the LLM service: ``respond(payload, reader, writer)`` answers each request."""
+
+    def __init__(self, respond):
+        self.respond = respond
+        self.requests = []
+        self.connections = 0
+        self.disconnects = 0
+
+    async def __aenter__(self):
+        self.received = asyncio.Event()
+        self.disconnected = asyncio.Event()
+        self._server = await asyncio.start_server(self._serve, '127.0.0.1', 0)
+        return self
+
+    async def __aexit__(self, *exc):
+        self._server.close()
+        await self._server.wait_closed()
+
+    def client(self, **options):
+        port = self._server.sockets[0].getsockname()[1]
+        return llm.LLMClient(f"http://127.0.0.1:{port}/v1/chat", **options)
+
+    async def _serve(self, reader, writer):
+        self.connections += 1
+        try:
+            while await reader.readline():
+                headers = {}
+                while (line := await reader.readline()) not in (b'\r\n', b''):
+                    name, _, value = line.decode().partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                self.requests.append(json.loads(await reader.readexactly(int(headers['content-length']))))
+                self.received.set()
+                await self.respond(self.requests[-1], reader, writer)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except asyncio.CancelledError:
+            pass  # the test's loop is closing with a keep-alive connection open
+        finally:
+            self.disconnects += 1
+            self.disconnected.set()
+            writer.close()
+
+
+async def _reply_with_tag(payload, reader, writer):
+    writer.write(_STREAM_HEADERS + _chunk({"token": payload["tag"]}) + _chunk({"done": True}) + b'0\r\n\r\n')
+    await writer.drain()
+
+
+async def _never_reply(payload, reader, writer):
+    await reader.read()  # until the client closes the connection
+
+
+class LLMClientTests(TestCase):
+    async def test_queue_serves_users_round_robin(self):
+        gate = None
+
+        async def respond(payload, reader, writer):
+            if payload.get("hold"):
+                await gate.wait()
+            await _reply_with_tag(payload, reader, writer)
+
+        gate = asyncio.Event()
+        async with _LLMService(respond) as service:
+            client = service.client(max_concurrency=1)
+            holder = asyncio.create_task(client.complete('ops', {"tag": 'hold', "hold": True}))
+            await service.received.wait()
+            tasks = []
+            for user, tag in (('a', 'a1'), ('a', 'a2'), ('a', 'a3'), ('b', 'b1'), ('c', 'c1')):
+                tasks.append(asyncio.create_task(client.complete(user, {"tag": tag})))
+                await asyncio.sleep(0)  # queue in this order
+            self.assertEqual(client.metrics()["queued"], 5)
+            gate.set()
+            await asyncio.gather(holder, *tasks)
+            client.close()
+        # a user with a burst waits behind one request of every other user
+        self.assertEqual([r["tag"] for r in service.requests], ['hold', 'a1', 'b1', 'c1', 'a2', 'a3'])
+        # one keep-alive connection carried every request
+        self.assertEqual(service.connections, 1)
+
+    async def test_per_user_queue_is_bounded(self):
+        async with _LLMService(_never_reply) as service:
+            client = service.client(max_concurrency=1, max_queued_per_user=2)
+            holder = asyncio.create_task(client.complete('ops', {}))
+            await service.received.wait()
+            queued = [asyncio.create_task(client.complete('a', {})) for _ in range(2)]
+            await asyncio.sleep(0)
+            with self.assertRaises(llm.QueueFull):
+                await client.complete('a', {})
+            for task in [holder, *queued]:
+                task.cancel()
+            await asyncio.gather(holder, *queued, return_exceptions=True)
+        self.assertEqual(client.counts["rejected"], 1)
+
+    async def test_deadline_passes_while_queued(self):
+        async with _LLMService(_never_reply) as service:
+            client = service.client(max_concurrency=1)
+            holder = asyncio.create_task(client.complete('ops', {}))
+            await service.received.wait()
+            with self.assertRaises(llm.DeadlineExceeded):
+                await client.complete('a', {}, deadline=time.monotonic() + 0.05)
+            self.assertEqual(client.metrics()["queued"], 0)
+            holder.cancel()
+            await asyncio.gather(holder, return_exceptions=True)
+        self.assertEqual(len(service.requests), 1)  # the expired request never reached the service
+        self.assertEqual(client.counts["expired"], 1)
+
+    async def test_deadline_waiting_for_the_reply_closes_the_connection(self):
+        async with _LLMService(_never_reply) as service:
+            client = service.client()
+            try:
+                await client.complete('a', {}, deadline=time.monotonic() + 0.05)
+            except llm.DeadlineExceeded as e:
+                # held, as a caller logging it later would, so the frames cannot close the socket for us
+                error = e
+            self.assertIsInstance(error, llm.DeadlineExceeded)
+            await asyncio.wait_for(service.disconnected.wait(), 1)
+        self.assertEqual(client.metrics()["active"], 0)
+
+    async def test_cancel_before_the_reply_closes_the_connection(self):
+        async with _LLMService(_never_reply) as service:
+            client = service.client()
+            task = asyncio.create_task(client.complete('a', {}))
+            await service.received.wait()
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError as e:
+                error = e  # held, so the frames cannot close the socket for us
+            self.assertIsInstance(error, asyncio.CancelledError)
+            await asyncio.wait_for(service.disconnected.wait(), 1)
+        self.assertEqual(client.counts["cancelled"], 1)
+
+    async def test_cancel_mid_reply_closes_the_connection(self):
+        async def respond(payload, reader, writer):
+            writer.write(_STREAM_HEADERS + _chunk({"token": 'first '}))
+            await writer.drain()
+            await reader.read()
+
+        async with _LLMService(respond) as service:
+            client = service.client()
+            first = asyncio.Event()
+
+            async def read():
+                async for _ in client.stream('a', {}):
+                    first.set()
+
+            task = asyncio.create_task(read())
+            await asyncio.wait_for(first.wait(), 1)
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            await asyncio.wait_for(service.disconnected.wait(), 1)
+        self.assertEqual(client.counts["cancelled"], 1)
+
+    async def test_malformed_status_line_is_an_llm_error(self):
+        async def respond(payload, reader, writer):
+            writer.write(b"garbage\r\n\r\n")
+            await writer.drain()
+            await reader.read()
+
+        async with _LLMService(respond) as service:
+            client = service.client()
+            with self.assertRaisesRegex(llm.LLMError, 'malformed status'):
+                await client.complete('a', {})
+            await asyncio.wait_for(service.disconnected.wait(), 1)
+        self.assertEqual(client.counts["failed"], 1)
+
+
+class SituationTests(TestCase):
+    def setUp(self):
+        self.fires = {f'C-{k}': {"id": f'C-{k}', "timestamp": 0, "status": 'Active', "intensity": 20 * k,
+                                 "size": 10.0 * k, "lat": 34.0, "lng": -118.0} for k in range(1, 5)}
+        self.drones = {f'D-{k}': {"id": f'D-{k}', "timestamp": 0, "status": 'Active', "battery": 90 - 10 * k,
+                                  "water": 80} for k in range(1, 5)}
+        patch = mock.patch.object(telemetry, 'snapshot',
+                                  lambda: (0, list(self.fires.values()), list(self.drones.values())))
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def ingest(self, situation, kind, record):
+        latest = self.fires if kind == 'fire' else self.drones
+        previous = latest.get(record['id'])
+        if previous is None or record['timestamp'] >= previous['timestamp']:
+            latest[record['id']] = record
+        situation.on_sample(kind, record, previous)
+
+    def test_incremental_updates_match_a_rebuild(self):
+        live = Situation()
+        live.build()  # seeds from the latest state
+        rng = random.Random(11)
+        for tick in range(1, 200):
+            if rng.random() < 0.5:
+                fire_id = f'C-{rng.randint(1, 6)}'  # C-5 and C-6 appear along the way
+                fire = dict(self.fires.get(fire_id, {"id": fire_id, "lat": 34.0, "lng": -118.0}), timestamp=tick,
+                            status=rng.choice(['Active', 'Critical', 'Contained']), intensity=rng.randint(0, 100),
+                            size=float(rng.randint(1, 200)))
+                self.ingest(live, 'fire', fire)
+            else:
+                drone = dict(self.drones[f'D-{rng.randint(1, 4)}'], battery=rng.randint(0, 100),
+                             water=rng.randint(0, 100), status=rng.choice(['Active', 'Low Battery']),
+                             timestamp=tick - rng.choice([0, 0, 0, 5]))  # now and then a late sample
+                self.ingest(live, 'drone', drone)
+        rebuilt = Situation()
+        self.assertEqual(live.build(), rebuilt.build())
+
+    def test_build_reports_aggregates_and_rankings(self):
+        situation = Situation()
+        situation.build()
+        self.ingest(situation, 'fire', dict(self.fires['C-4'], timestamp=1, status='Contained'))
+        self.ingest(situation, 'drone', dict(self.drones['D-1'], timestamp=1, battery=15))
+        context = situation.build()
+        self.assertEqual(context["fires"]["active"], 3)
+        self.assertEqual(context["fires"]["activeAcres"], 60.0)
+        self.assertEqual(context["fires"]["byStatus"], {'Active': 3, 'Contained': 1})
+        self.assertEqual([f["id"] for f in context["fires"]["worst"]], ['C-3', 'C-2', 'C-1'])
+        self.assertEqual([d["id"] for d in context["drones"]["low"]], ['D-1'])
+        self.assertEqual((context["drones"]["fit"], context["drones"]["total"]), (3, 4))
+        self.assertEqual(context["drones"]["avgBattery"], 48.8)  # (15 + 70 + 60 + 50) / 4, to one decimal
+        self.assertIn("3 active fires covering 60 acres (4 tracked).", summary_text(context))
+
+
+@mock.patch.object(llm, 'client', None)
+class FireWardenReplyCacheTests(TestCase):
+    def setUp(self):
+        self.version = 1
+        patches = [mock.patch.object(fire_warden, '_reply_cache', LRUCache(maxsize=8, ttl=60)),
+                   mock.patch.object(telemetry, 'data_version', lambda: self.version)]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_repeat_question_hits_until_the_data_changes(self):
+        reply, cached = fire_warden.answer('What is the fire STATUS?')
+        self.assertFalse(cached)
+        self.assertEqual(fire_warden.answer('what is the fire status'), (reply, True))  # same once normalized
+        self.assertTrue(fire_warden.answer('Give me a sitrep')[1])  # same intent, same reply
+        self.version += 1
+        self.assertFalse(fire_warden.answer('What is the fire status?')[1])
+        self.assertTrue(fire_warden.answer('What is the fire status?')[1])
+
+    def test_replies_that_read_no_telemetry_survive_new_data(self):
+        self.assertFalse(fire_warden.answer('Wind forecast?')[1])
+        self.version += 1
+        self.assertTrue(fire_warden.answer('Wind forecast?')[1])
+
+    def test_free_form_questions_are_keyed_by_their_text(self):
+        self.assertFalse(fire_warden.answer('Hello there')[1])
+        self.assertFalse(fire_warden.answer('Anyone listening?')[1])
+        self.assertTrue(fire_warden.answer('hello,  there!')[1])
+
+    def test_replies_expire_after_the_ttl(self):
+        with mock.patch('api.cache.time.monotonic', return_value=1000.0):
+            fire_warden.answer('Wind forecast?')
+        with mock.patch('api.cache.time.monotonic', return_value=1059.0):
+            self.assertTrue(fire_warden.answer('Wind forecast?')[1])
+        with mock.patch('api.cache.time.monotonic', return_value=1061.0):
+            self.assertFalse(fire_warden.answer('Wind forecast?')[1])
+
+
+@mock.patch.object(llm, 'client', None)
+class FireWardenChatViewTests(TestCase):
+    url = '/api/fire-warden/chat/'
+
+    def test_json_body(self):
+        response = self.client.post(self.url, {"message": 'What is the fire status?'}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["type"], 'text')
+        self.assertIn(response['X-Cache'], ('HIT', 'MISS'))
+
+    def test_form_bodies(self):
+        form = self.client.post(self.url, {"message": 'How are the drones doing?'})  # multipart
+        encoded = self.client.post(self.url, 'message=How+are+the+drones+doing%3F',
+                                   content_type='application/x-www-form-urlencoded')
+        self.assertEqual(form.status_code, 200)
+        self.assertEqual(encoded.status_code, 200)
+        self.assertEqual(encoded.json(), form.json())
+        self.assertEqual(encoded['X-Cache'], 'HIT')
+
+    def test_bad_requests_keep_drf_error_shapes(self):
+        malformed = self.client.post(self.url, '{"message":', content_type='application/json')
+        self.assertEqual(malformed.status_code, 400)
+        self.assertTrue(malformed.json()["detail"].startswith('JSON parse error'))
+        unsupported = self.client.post(self.url, 'message', content_type='text/plain')
+        self.assertEqual(unsupported.status_code, 415)
+        method = self.client.get(self.url)
+        self.assertEqual(method.status_code, 405)
+        self.assertEqual(method.json(), {"detail": 'Method "GET" not allowed.'})
+        for body in ({}, {"message": '   '}, {"message": 3}):
+            response = self.client.post(self.url, body, content_type='application/json')
+            self.assertEqual(response.status_code, 400, body)
+            self.assertEqual(response.json(), {"error": 'Message is required'})
+
+
+class IntentRouterTests(TestCase):
+    router = IntentRouter(DEFAULT_INTENTS)
+
+    def test_synonyms_route_to_their_intent(self):
+        for message, intent in (('give me a sitrep', 'status'), ('what is the overview', 'status'),
+                                ('any tactic for the east flank', 'plan'), ('where is the uav', 'drone'),
+                                ('how is the fleet', 'drone'), ('humidity right now', 'weather'),
+                                ('hello there', DEFAULT), ('', DEFAULT)):
+            self.assertEqual(self.router.match(message), intent, message)
+
+    def test_highest_priority_intent_wins(self):
+        self.assertEqual(self.router.match('wind forecast for the drone plan status'), 'status')
+        self.assertEqual(self.router.match('drone strategy given the wind'), 'plan')
+        self.assertEqual(self.router.match('weather for the drones'), 'drone')
+        tied = IntentRouter([Intent('first', ('alpha',)), Intent('second', ('beta',))])
+        self.assertEqual(tied.match('beta then alpha'), 'first')  # equal priority: earliest declared
+
+    def test_phrases_match_at_word_start_only(self):
+        # the substring match this replaced routed "explain" to plan and "beta" to an "eta" phrase
+        self.assertEqual(self.router.match('explain the situation'), 'status')
+        self.assertEqual(self.router.match('please explain'), DEFAULT)
+        self.assertEqual(self.router.match('drones and plans'), 'plan')  # a phrase still matches its longer forms
+        eta = IntentRouter([Intent('eta', ('eta',))])
+        self.assertEqual(eta.match('beta test'), DEFAULT)
+        self.assertEqual(eta.match('eta please'), 'eta')
+
+    def test_longest_overlapping_phrase_wins(self):
+        router = IntentRouter([Intent('fire', ('fire',), priority=10), Intent('line', ('fire line',), priority=0)])
+        self.assertEqual(router.match('hold the fire line'), 'line')
+        self.assertEqual(router.match('the fire is growing'), 'fire')
+
+    def test_phrase_declared_twice_is_rejected(self):
+        with self.assertRaises(ValueError):
+            IntentRouter([Intent('a', ('wind',)), Intent('b', ('Wind',))])
+
+
+class FireDroneParamTests(TestCase):
+    def test_out_of_range_numbers_fall_back_or_clamp(self):
+        huge = '9' * 400  # an int too large for float()
+        for url in (f'/api/fire-drone/projection/?grid=16&wind_speed=nan&wind_dir=inf&cell={huge}',
+                    f'/api/fire-drone/projection/?grid=-{huge}&cell=1000',
+                    f'/api/fire-drone/tiles/3/1/2/?size={huge}&window={huge}&output=array',
+                    f'/api/fire-drone/tiles/3/1/2/?size=-{huge}&window=nan&output=array'):
+            self.assertEqual(self.client.get(url).status_code, 200, url)
+        tile = self.client.get(f'/api/fire-drone/tiles/3/1/2/?size={huge}&window={huge}&output=array').json()
+        self.assertEqual(tile["window"], 7 * 24 * 60)
+
+
+def _blank(z, x, y, start_ms, end_ms, size=tiles.TILE_SIZE):
+    return np.zeros((size, size), dtype=np.uint8)
+
+
+@mock.patch.object(tiles, 'rasterize', side_effect=_blank)
+class TileVersionTests(TestCase):
+    LAT, LNG = 34.05, -118.25
+
+    def setUp(self):
+        patches = [mock.patch.object(tiles, '_cache', LRUCache(maxsize=8)),
+                   mock.patch.object(tiles, '_tile_versions', OrderedDict()),
+                   mock.patch.object(telemetry, 'data_version', lambda: self.version)]
+        self.version = 1
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def tile_at(self, z, lat=LAT, lng=LNG):
+        gx, gy = tiles.global_pixels(lat, lng, z)
+        return z, int(gx // tiles.TILE_SIZE), int(gy // tiles.TILE_SIZE)
+
+    def serve(self, *keys):
+        for z, x, y in keys:
+            tiles.tile(z, x, y, now_ms=0, output='array')
+
+    def sample(self, lat=LAT, lng=LNG):
+        self.version += 1
+        tiles.on_sample('fire', {"id": 'C-1', "lat": lat, "lng": lng}, None)
+
+    def rendered(self, rasterize):
+        return [call.args[:3] for call in rasterize.call_args_list]
+
+    def test_sample_invalidates_only_the_tiles_it_touches(self, rasterize):
+        near, parent, far = self.tile_at(12), self.tile_at(6), self.tile_at(12, lat=-33.9, lng=151.2)
+        self.serve(near, parent, far)
+        self.serve(near, parent, far)
+        self.assertEqual(self.rendered(rasterize), [near, parent, far])
+        rasterize.reset_mock()
+        self.sample()
+        self.serve(near, parent, far)
+        self.assertEqual(self.rendered(rasterize), [near, parent])
+
+    def test_versions_are_kept_for_recently_served_tiles_only(self, rasterize):
+        self.sample()  # nothing served yet: nothing tracked
+        self.assertEqual(len(tiles._tile_versions), 0)
+        keys = [(12, x, 0) for x in range(20)]
+        self.serve(*keys)
+        self.serve(keys[12])
+        self.assertEqual(list(tiles._tile_versions), keys[13:] + [keys[12]])
+        self.assertEqual(set(tiles._tile_versions.values()), {self.version})
+        self.sample()
+        near = self.tile_at(12)
+        self.serve(near)
+        self.assertEqual(tiles._tile_versions[near], self.version)  # untracked: starts at the current version
+        self.assertEqual(len(tiles._tile_versions), 8)
+
+
+class ProjectionTests(TestCase):
+    FIRE = {"id": 'C-1', "lat": 34.0, "lng": -118.0, "size": 5, "intensity": 80, "status": 'Active'}
+
+    def simulate(self, wind_mph):
+        grid = projection.Grid(self.FIRE["lat"], self.FIRE["lng"], 64, 25.0)
+        burning, rate = projection.seed(grid, [self.FIRE])
+        return projection.simulate(burning, rate, projection.wind_weights(wind_mph, 45.0), grid.cell_m)
+
+    def test_single_fire_without_wind_grows_symmetrically(self):
+        sizes = []
+        for minutes, mask in sorted(self.simulate(0.0).items()):
+            for mirrored in (mask[::-1], mask[:, ::-1], mask.T):
+                self.assertTrue((mask == mirrored).all(), minutes)
+            sizes.append(int(mask.sum()))
+        self.assertEqual(sizes, sorted(set(sizes)))  # strictly growing
+        self.assertFalse((self.simulate(12.0)[60] == self.simulate(0.0)[60]).all())
+
+    def test_wind_pushes_the_head_downwind(self):
+        mask = self.simulate(12.0)[60]
+        rows, cols = np.nonzero(mask)
+        # wind from the north-east drives the fire south (down the rows) and west (down the columns)
+        centre = mask.shape[0] / 2 - 0.5
+        self.assertGreater(rows.max() - centre, centre - rows.min())
+        self.assertGreater(centre - cols.min(), cols.max() - centre)
+
+    def test_project_reports_growing_perimeters(self):
+        result = projection.project([self.FIRE], grid_size=64, wind_mph=0.0)
+        areas = [h["areaAcres"] for h in result["horizons"]]
+        self.assertEqual([h["minutes"] for h in result["horizons"]], list(projection.HORIZONS_MIN))
+        self.assertEqual(areas, sorted(areas))
+        self.assertGreater(areas[0], self.FIRE["size"])
+        for horizon in result["horizons"]:
+            self.assertEqual([p["id"] for p in horizon["perimeters"]], ['C-1'])
+
+    def test_contained_or_no_fires_project_nothing(self):
+        for fires in ([], [dict(self.FIRE, status='Contained')]):
+            result = projection.project(fires, grid_size=64)
+            self.assertEqual(result["horizons"], [{"minutes": h, "areaAcres": 0.0, "perimeters": []}
+                                                  for h in projection.HORIZONS_MIN])
+            self.assertNotIn("center", result["grid"])
+
+
+def _brute_force(cost, demand):
+    """Least total cost over every way of filling min(drones, slots) slots, one drone per slot."""
+    n_drones, n_fires = cost.shape
+    filled = min(n_drones, int(sum(demand)))
+    best = np.inf
+    for fires in itertools.product(range(-1, n_fires), repeat=n_drones):
+        counts = np.bincount([f for f in fires if f >= 0], minlength=n_fires)
+        if counts.sum() == filled and (counts <= demand).all():
+            best = min(best, sum(cost[d, f] for d, f in enumerate(fires) if f >= 0))
+    return best
+
+
+class AssignmentSolverTests(TestCase):
+    def setUp(self):
+        self.rng = np.random.default_rng(7)
+
+    def total(self, cost, assigned, demand):
+        counts = np.bincount(assigned[assigned >= 0], minlength=cost.shape[1])
+        self.assertTrue((counts <= demand).all(), assigned)
+        return sum(cost[d, f] for d, f in enumerate(assigned) if f >= 0)
+
+    def test_solve_lap_matches_brute_force(self):
+        for _ in range(20):
+            cost = self.rng.integers(1, 50, size=(3, 4)).astype(float)
+            cols = assignment.solve_lap(cost)
+            self.assertEqual(len(set(cols.tolist())), 3)
+            best = min(sum(cost[r, c] for r, c in enumerate(perm)) for perm in itertools.permutations(range(4), 3))
+            self.assertEqual(cost[np.arange(3), cols].sum(), best)
+
+    def test_exact_assignment_is_optimal_for_rectangular_and_slotted_fires(self):
+        # 4 drones x 3 fires: more drones than slots, slots to spare, and a fire needing two drones
+        for demand in ([1, 1, 1], [2, 2, 1], [2, 1, 0]):
+            demand = np.array(demand)
+            for _ in range(10):
+                cost = self.rng.integers(1, 50, size=(4, 3)).astype(float)
+                assigned = assignment._assign_exact(cost, demand)
+                self.assertEqual((assigned >= 0).sum(), min(4, demand.sum()))
+                self.assertEqual(self.total(cost, assigned, demand), _brute_force(cost, demand), (cost, demand))
+
+    def test_exact_assignment_leaves_unreachable_drones_idle(self):
+        cost = np.array([[1.0, assignment.INFEASIBLE], [assignment.INFEASIBLE, assignment.INFEASIBLE]])
+        self.assertEqual(assignment._assign_exact(cost, np.array([1, 1])).tolist(), [0, -1])
+
+    def test_greedy_local_search_fixes_the_greedy_fill(self):
+        # the greedy fill takes the 1 and is left with the 100; one swap finds 2 + 2
+        cost = np.array([[1.0, 2.0], [2.0, 100.0]])
+        self.assertEqual(assignment._assign_greedy(cost, np.array([1, 1])).tolist(), [1, 0])
+
+    def test_greedy_fallback_is_feasible_and_close_to_optimal(self):
+        for demand in ([1, 1, 1], [2, 2, 1]):
+            demand = np.array(demand)
+            for _ in range(10):
+                cost = self.rng.integers(1, 50, size=(4, 3)).astype(float)
+                assigned = assignment._assign_greedy(cost, demand)
+                self.assertEqual((assigned >= 0).sum(), min(4, demand.sum()))
+                self.assertGreaterEqual(self.total(cost, assigned, demand), _brute_force(cost, demand))
+
+    def test_assign_uses_the_greedy_fallback_past_the_exact_limit(self):
+        drones = [{"id": f'D-{k}', "lat": 34.0 + k / 100, "lng": -118.0, "battery": 90, "water": 90,
+                   "status": 'Active'} for k in range(4)]
+        fires = [{"id": f'C-{k}', "lat": 34.0 + k / 50, "lng": -118.0, "size": 20, "intensity": 40,
+                  "status": 'Active'} for k in range(3)]
+        exact = assignment.assign(drones, fires)
+        with mock.patch.object(assignment, 'EXACT_LIMIT', 0), \
+                mock.patch.object(assignment, '_assign_greedy', wraps=assignment._assign_greedy) as greedy:
+            fallback = assignment.assign(drones, fires)
+        greedy.assert_called_once()
+        self.assertEqual(fallback, exact)
+
+
+_SAMPLE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{[a-zA-Z_][a-zA-Z0-9_]*="(?:[^"\\\n]|\\.)*"'
+                     r'(?:,[a-zA-Z_][a-zA-Z0-9_]*="(?:[^"\\\n]|\\.)*")*\})? (\S+)$')
+
+
+class MetricsEndpointTests(TestCase):
+    def scrape(self):
+        """``(types, samples)`` of a /metrics response, checking every line against the text format."""
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        types, samples = {}, {}
+        for line in response.content.decode().splitlines():
+            if line.startswith('# TYPE '):
+                _, _, name, kind = line.split(' ')
+                self.assertNotIn(name, types, line)
+                self.assertIn(kind, ('counter', 'gauge', 'histogram'), line)
+                types[name] = kind
+                continue
+            if line.startswith('# HELP '):
+                continue
+            found = _SAMPLE.match(line)
+            self.assertIsNotNone(found, line)
+            name, labels, value = found.groups()
+            family = re.sub(r'_(bucket|sum|count)$', '', name) if name not in types else name
+            self.assertIn(family, types, f"{line} has no TYPE line before it")
+            samples[(name, labels or '')] = float(value)
+        return types, samples
+
+    def test_histograms_are_cumulative_and_match_their_count(self):
+        self.client.get('/api/fire-drone/tiles/3/1/2/?output=array')
+        types, samples = self.scrape()
+        self.assertEqual(types['http_request_duration_seconds'], 'histogram')
+        labels = '{view="fire_intensity_tile",method="GET"'
+        buckets = [value for (name, label), value in samples.items()
+                   if name == 'http_request_duration_seconds_bucket' and label.startswith(labels + ',')]
+        self.assertEqual(len(buckets), len(metrics.LATENCY_BUCKETS) + 1)
+        self.assertEqual(buckets, sorted(buckets))
+        self.assertEqual(buckets[-1], samples[('http_request_duration_seconds_count', labels + '}')])
+
+    def test_counters_only_grow(self):
+        before = self.scrape()[1]
+        for _ in range(3):
+            self.client.get('/api/fire-drone/tiles/3/1/2/?output=array')
+        types, after = self.scrape()
+        for (name, labels), value in before.items():
+            family = re.sub(r'_(bucket|sum|count)$', '', name)
+            if types.get(name) == 'counter' or types.get(family) == 'histogram':
+                self.assertGreaterEqual(after.get((name, labels), 0), value, (name, labels))
+        key = ('http_responses_total', '{view="fire_intensity_tile",method="GET",status="2xx"}')
+        self.assertEqual(after[key] - before.get(key, 0), 3)
+
+    def test_unknown_methods_share_one_label(self):
+        self.client.generic('BREW', '/api/fire-drone/tiles/3/1/2/')
+        samples = self.scrape()[1]
+        self.assertIn(('http_request_duration_seconds_count', '{view="fire_intensity_tile",method="other"}'),
+                      samples)
+        self.assertFalse(any('BREW' in labels for _, labels in samples))
+
+    def test_collector_values_become_gauges_and_counters(self):
+        values = {"size": 3, "hits": 10, "queue": {"depth": 2, "dropped": 4}, "byStatus": {"Active": 1, 'a"b': 2}}
+        with mock.patch.dict(metrics._collectors):
+            metrics.add_collector('testCache', lambda: values, counters=('hits', 'queue.dropped'))
+            types, samples = self.scrape()
+        self.assertEqual(types['mission_control_test_cache_size'], 'gauge')
+        self.assertEqual(types['mission_control_test_cache_hits_total'], 'counter')
+        self.assertEqual(types['mission_control_test_cache_queue_dropped_total'], 'counter')
+        self.assertEqual(samples[('mission_control_test_cache_queue_depth', '')], 2)
+        self.assertEqual(samples[('mission_control_test_cache_by_status', '{status="a\\"b"}')], 2)
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class AckWriterTests(TestCase):
+    def setUp(self):
+        self.clock = _Clock()
+        # no background thread: each test flushes when it chooses
+        self.writer = acks.AckWriter(flush_interval=None, batch_size=3, max_pending=10, max_backoff=5.0,
+                                     clock=self.clock)
+
+    def persisted(self):
+        return {row.notification_id: (row.acknowledged, row.acknowledged_by)
+                for row in NotificationAck.objects.all()}
+
+    def test_latest_change_per_notification_is_written_in_batches(self):
+        self.writer.enqueue({i: (True, 'op-1', 1_000) for i in range(1, 7)})
+        self.writer.enqueue({2: (False, 'op-2', 2_000), 7: (True, 'op-2', 2_000)})
+        self.assertEqual(self.writer.metrics()["pending"], 7)
+        self.assertEqual(self.writer.flush(), 7)
+        self.assertEqual(self.writer.flush(), 0)
+        self.assertEqual(self.persisted()[2], (False, 'op-2'))
+        self.assertEqual(len(self.persisted()), 7)
+        self.assertEqual((self.writer.written, self.writer.batches), (7, 3))
+
+    def test_failed_batch_is_requeued_behind_newer_changes(self):
+        self.writer.enqueue({i: (True, 'op-1', 1_000) for i in range(1, 7)})
+        write = acks.AckWriter._write
+        self.writer._write = mock.Mock(side_effect=[None, DatabaseError("locked")])
+        with self.assertLogs('api.acks', 'ERROR'):
+            self.assertEqual(self.writer.flush(), 3)
+        # a change made while the batch was failing wins over the re-queued one
+        self.writer.enqueue({5: (False, 'op-2', 2_000)})
+        self.assertEqual(self.writer.metrics()["pending"], 3)
+        self.writer._write = write
+        self.assertEqual(self.writer.flush(), 3)
+        self.assertEqual(self.persisted()[5], (False, 'op-2'))
+        self.assertEqual(self.writer.failed, 1)
+
+    def test_failures_back_off_exponentially_until_a_write_succeeds(self):
+        self.writer._write = mock.Mock(side_effect=DatabaseError("down"))
+        self.writer.enqueue({1: (True, 'op-1', 1_000)})
+        retries = []
+        with self.assertLogs('api.acks', 'ERROR') as logs:
+            for _ in range(5):
+                self.writer.flush()
+                retries.append(self.writer.retry_at - self.clock.now)
+                self.assertFalse(self.writer.due())
+                self.clock.now = self.writer.retry_at
+                self.assertTrue(self.writer.due())
+        self.assertEqual(retries, [1.0, 2.0, 4.0, 5.0, 5.0])
+        self.assertEqual(len(logs.records), 1)  # once per streak, not per retry
+        self.assertEqual(self.writer.metrics()["failing"], 5)
+
+        self.writer._write = mock.Mock()
+        with self.assertLogs('api.acks', 'INFO') as logs:
+            self.assertEqual(self.writer.flush(), 1)
+        self.assertIn('recovered after 5', logs.output[0])
+        self.assertEqual((self.writer.failing, self.writer.retry_at), (0, 0.0))
+        self.assertTrue(self.writer.due())
+
+    def test_queue_drops_oldest_changes_past_its_cap(self):
+        with self.assertLogs('api.acks', 'WARNING'):
+            self.writer.enqueue({i: (True, 'op-1', 1_000) for i in range(1, 14)})
+        self.assertEqual(self.writer.metrics()["dropped"], 3)
+        self.writer.flush()
+        self.assertEqual(sorted(self.persisted()), list(range(4, 14)))
+
+    def test_restore_applies_acks_newer_than_the_notification(self):
+        store = NotificationStore()
+        store.load([_notification(1, timestamp=1_000, acknowledged=False),
+                    _notification(2, timestamp=1_000, acknowledged=True),
+                    _notification(3, timestamp=5_000, acknowledged=False)])
+        NotificationAck.objects.bulk_create([
+            NotificationAck(notification_id=1, acknowledged=True, updated_at=2_000),
+            NotificationAck(notification_id=2, acknowledged=False, updated_at=2_000),
+            # written for an earlier notification that reused id 3
+            NotificationAck(notification_id=3, acknowledged=True, updated_at=2_000),
+        ])
+        with mock.patch.object(acks, '_restored', False):
+            acks.restore(store)
+            store.set_acknowledged([1], False)
+            acks.restore(store)  # once per process
+        self.assertEqual([store.get(i)["acknowledged"] for i in (1, 2, 3)], [False, False, False])
+        with mock.patch.object(acks, '_restored', False):
+            acks.restore(store)
+        self.assertTrue(store.get(1)["acknowledged"])
@@ -0,0 +1,209 @@
+"""Pre-rendered fire intensity heatmap tiles (Web Mercator z/x/y).
+
+Fire samples are mirrored into growable NumPy columns, synced incrementally
+from the append-only telemetry history. A tile is rendered by masking the
+columns to the time window and the tile bounds, binning the max intensity per
+pixel with ``np.maximum.at`` and dilating by a few pixels so points read as
+areas.
+
+Rendered tiles sit in an LRU keyed by (tile, size, window, window bucket,
+tile version). The tile version only moves when a sample lands within the
+tile's area (plus the dilation margin at the smallest tile size, which
+covers every size), so new data invalidates the handful of tiles it touches
+rather than the whole cache. Versions are kept only for the tiles served
+most recently, as many as the render cache holds; a tile served without one
+starts at the current data version, which every earlier sample is below.
+"""
+import base64
+import math
+import struct
+import threading
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+
+from . import telemetry
+from .cache import LRUCache
+
+TILE_SIZE = 256
+MIN_TILE_SIZE = 16
+MAX_TILE_SIZE = 512
+MAX_ZOOM = 18
+RADIUS_PX = 4
+BUCKET_MS = 60 * 1000
+DEFAULT_WINDOW_MIN = 24 * 60
+MAX_LAT = 85.05112878
+
+_lock = threading.Lock()
+_lat = np.empty(0)
+_lng = np.empty(0)
+_intensity = np.empty(0, dtype=np.float32)
+_ts = np.empty(0, dtype=np.int64)
+_count = 0
+_synced = 0
+
+_cache = LRUCache(maxsize=512)
+_versions_lock = threading.Lock()
+_tile_versions = OrderedDict()  # (z, x, y) -> data version, least recently served first
+
+
+def _grow(column, capacity):
+    grown = np.empty(capacity, dtype=column.dtype)
+    grown[:column.size] = column
+    return grown
+
+
+def _sync():
+    """Appends history records not yet mirrored into the columns."""
+    global _lat, _lng, _intensity, _ts, _count, _synced
+    with _lock:
+        records, total = telemetry.fire_history_since(_synced)
+        if not records:
+            return
+        needed = _count + len(records)
+        if needed > _lat.size:
+            capacity = max(needed, 2 * _lat.size, 1024)
+            _lat, _lng = _grow(_lat, capacity), _grow(_lng, capacity)
+            _intensity, _ts = _grow(_intensity, capacity), _grow(_ts, capacity)
+        end = _count + len(records)
+        _lat[_count:end] = [r['lat'] for r in records]
+        _lng[_count:end] = [r['lng'] for r in records]
+        _intensity[_count:end] = [r.get('intensity', 0) for r in records]
+        _ts[_count:end] = [r.get('timestamp', 0) for r in records]
+        _count, _synced = end, total
+
+
+def global_pixels(lat, lng, z, size=TILE_SIZE):
+    """Web Mercator pixel coordinates at zoom ``z`` (scalars or arrays)."""
+    scale = size * (1 << z)
+    lat = np.clip(lat, -MAX_LAT, MAX_LAT)
+    x = (np.asarray(lng) + 180.0) / 360.0 * scale
+    sin_lat = np.sin(np.radians(lat))
+    y = (0.5 - np.log((1 + sin_lat) / (1 - sin_lat)) / (4 * math.pi)) * scale
+    return x, y
+
+
+def on_sample(kind, record, previous):
+    """Telemetry listener: bumps the version of every tile a fire sample can reach."""
+    if kind != 'fire':
+        return
+    version = telemetry.data_version()
+    # the dilation reaches RADIUS_PX pixels of whatever size a tile is rendered at; in the
+    # TILE_SIZE pixels used here that is widest for the smallest tiles
+    margin = (RADIUS_PX + 1) * TILE_SIZE / MIN_TILE_SIZE
+    with _versions_lock:
+        if not _tile_versions:
+            return
+        for z in range(MAX_ZOOM + 1):
+            gx, gy = global_pixels(record['lat'], record['lng'], z)
+            last = (1 << z) - 1
+            x0, x1 = max(int((gx - margin) // TILE_SIZE), 0), min(int((gx + margin) // TILE_SIZE), last)
+            y0, y1 = max(int((gy - margin) // TILE_SIZE), 0), min(int((gy + margin) // TILE_SIZE), last)
+            for x in range(x0, x1 + 1):
+                for y in range(y0, y1 + 1):
+                    # untracked tiles pick up the current version when next served
+                    if (z, x, y) in _tile_versions:
+                        _tile_versions[(z, x, y)] = version
+
+
+def _tile_version(key):
+    """Version of a tile being served, tracking it (and dropping the least recently served) if new."""
+    with _versions_lock:
+        version = _tile_versions.get(key)
+        if version is None:
+            version = _tile_versions[key] = telemetry.data_version()
+            if len(_tile_versions) > _cache.maxsize:
+                _tile_versions.popitem(last=False)
+        else:
+            _tile_versions.move_to_end(key)
+        return version
+
+
+def _dilate(grid, radius):
+    """Separable max filter of the given radius."""
+    for axis in (0, 1):
+        out = grid.copy()
+        for d in range(1, radius + 1):
+            if axis == 0:
+                np.maximum(out[d:], grid[:-d], out=out[d:])
+                np.maximum(out[:-d], grid[d:], out=out[:-d])
+            else:
+                np.maximum(out[:, d:], grid[:, :-d], out=out[:, d:])
+                np.maximum(out[:, :-d], grid[:, d:], out=out[:, :-d])
+        grid = out
+    return grid
+
+
+def rasterize(z, x, y, start_ms, end_ms, size=TILE_SIZE):
+    """Max fire intensity (0-100) per pixel of a tile, as a uint8 array."""
+    _sync()
+    with _lock:
+        lat, lng = _lat[:_count], _lng[:_count]
+        intensity, ts = _intensity[:_count], _ts[:_count]
+    in_window = (ts >= start_ms) & (ts < end_ms)
+    grid = np.zeros((size, size), dtype=np.uint8)
+    if not in_window.any():
+        return grid
+
+    gx, gy = global_pixels(lat[in_window], lng[in_window], z, size)
+    px = np.floor(gx - x * size).astype(np.int64)
+    py = np.floor(gy - y * size).astype(np.int64)
+    inside = (px >= -RADIUS_PX) & (px < size + RADIUS_PX) & (py >= -RADIUS_PX) & (py < size + RADIUS_PX)
+    if not inside.any():
+        return grid
+
+    # bin into a padded canvas so samples just off the edge still bleed in
+    pad = RADIUS_PX
+    canvas = np.zeros((size + 2 * pad, size + 2 * pad), dtype=np.uint8)
+    values = np.clip(intensity[in_window][inside], 0, 100).astype(np.uint8)
+    np.maximum.at(canvas, (py[inside] + pad, px[inside] + pad), values)
+    return _dilate(canvas, RADIUS_PX)[pad:pad + size, pad:pad + size]
+
+
+def _colormap():
+    """RGBA lookup for intensity 0-100: transparent, then yellow through red."""
+    lut = np.zeros((256, 4), dtype=np.uint8)
+    level = np.arange(1, 256, dtype=np.float32).clip(max=100) / 100.0
+    lut[1:, 0] = 255
+    lut[1:, 1] = (220 * (1.0 - level)).astype(np.uint8)
+    lut[1:, 3] = (96 + 159 * level).astype(np.uint8)
+    return lut
+
+
+_LUT = _colormap()
+
+
+def _png_chunk(tag, data):
+    return struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag + data) & 0xFFFFFFFF)
+
+
+def encode_png(grid):
+    """Encodes an intensity grid as an RGBA PNG using the fire colormap."""
+    h, w = grid.shape
+    rgba = _LUT[grid]
+    rows = np.zeros((h, 1 + w * 4), dtype=np.uint8)  # filter byte 0 per row
+    rows[:, 1:] = rgba.reshape(h, w * 4)
+    return b''.join([
+        b'\x89PNG\r\n\x1a\n',
+        _png_chunk(b'IHDR', struct.pack('>IIBBBBB', w, h, 8, 6, 0, 0, 0)),
+        _png_chunk(b'IDAT', zlib.compress(rows.tobytes(), 6)),
+        _png_chunk(b'IEND', b''),
+    ])
+
+
+def encode_array(grid):
+    return {"size": grid.shape[0], "encoding": "uint8-base64", "data": base64.b64encode(grid.tobytes()).decode('ascii')}
+
+
+def tile(z, x, y, now_ms, window_min=DEFAULT_WINDOW_MIN, size=TILE_SIZE, output='png'):
+    """Cached tile for the window ending at the current bucket boundary."""
+    end = (now_ms // BUCKET_MS + 1) * BUCKET_MS
+    start = end - window_min * 60 * 1000
+    key = (z, x, y, size, window_min, end, _tile_version((z, x, y)), output)
+    cached = _cache.get(key)
+    if cached is None:
+        grid = rasterize(z, x, y, start, end, size)
+        cached = encode_png(grid) if output == 'png' else encode_array(grid)
+        _cache.set(key, cached)
+    return cached
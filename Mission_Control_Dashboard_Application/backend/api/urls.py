@@ -5,8 +5,13 @@ urlpatterns = [
     # Fire/Drone endpoints
     path('fire-drone/recent/', fire_drone.recent_fire_drone_data, name='recent_fire_drone_data'),
     path('fire-drone/query/', fire_drone.query_fire_drone_data, name='query_fire_drone_data'),
+    path('fire-drone/projection/', fire_drone.fire_spread_projection, name='fire_spread_projection'),
+    path('fire-drone/tiles/<int:z>/<int:x>/<int:y>/', fire_drone.fire_intensity_tile, name='fire_intensity_tile'),
     
     # Notification endpoints
+    path('notifications/', notifications.query_notifications, name='query_notifications'),
+    path('notifications/counts/', notifications.notification_counts, name='notification_counts'),
+    path('notifications/ack/', notifications.acknowledge_notifications, name='acknowledge_notifications'),
     path('notifications/recent/', notifications.recent_notifications, name='recent_notifications'),
     
     # Fire Warden AI chat endpoint
@@ -1,9 +1,13 @@
+from django.http import HttpResponse
 from rest_framework.response import Response
 from rest_framework.decorators import api_view
 import time
 import logging
+import math
 import sys
 
+from api import projection, telemetry, tiles
+
 logger = logging.getLogger(__name__)
 
 # --- Mock Fire/Drone Data ---
@@ -45,6 +49,8 @@ MOCK_DRONE_DATA = [
     {"id": "D-6", "lat": 34.0820, "lng": -118.4420, "battery": 5, "water": 8, "status": "Critical", "timestamp": now_ms - int(24*60*60*1000*0.02)},
 ]
 
+telemetry.load(MOCK_FIRE_DATA, MOCK_DRONE_DATA)
+
 @api_view(['GET'])
 def recent_fire_drone_data(request):
     """Returns fire/drone records from last 24h."""
@@ -107,4 +113,61 @@ def query_fire_drone_data(request):
         return Response({"fires": [], "drones": drones})
 
     # otherwise return both lists
-    return Response({"fires": fires, "drones": drones})
\ No newline at end of file
+    return Response({"fires": fires, "drones": drones})
+
+
+def _number_param(request, name, default, cast=float):
+    try:
+        value = cast(request.GET.get(name, default))
+    except (TypeError, ValueError):
+        return default
+    # float() accepts 'nan' and 'inf', which no range clamp catches; any int is finite (and
+    # may be too large for isfinite to convert)
+    return value if isinstance(value, int) or math.isfinite(value) else default
+
+
+@api_view(['GET'])
+def fire_spread_projection(request):
+    """Projected perimeters of active fires at T+15/30/60 minutes.
+
+    Optional query params:
+    - grid: cells per side (default 512, max 1000)
+    - cell: cell size in metres (default 25)
+    - wind_speed: mph (default 12)
+    - wind_dir: degrees the wind blows from (default 45, north-east)
+
+    Fine cells and strong wind need more automaton steps; combinations
+    costing more than ``projection.MAX_CELL_STEPS`` are rejected with 400.
+    """
+    grid = min(max(_number_param(request, 'grid', projection.DEFAULT_GRID, int), 16), projection.MAX_GRID)
+    cell = min(max(_number_param(request, 'cell', projection.DEFAULT_CELL_M), 1.0), 1000.0)
+    wind_speed = min(max(_number_param(request, 'wind_speed', projection.DEFAULT_WIND_MPH), 0.0), 100.0)
+    wind_dir = _number_param(request, 'wind_dir', projection.DEFAULT_WIND_FROM_DEG) % 360.0
+
+    if projection.cell_steps(grid, cell, wind_speed, wind_dir) > projection.MAX_CELL_STEPS:
+        return Response({"error": "Projection too fine: use a larger cell, a smaller grid or less wind"},
+                        status=400)
+
+    return Response(projection.current_projection(grid, cell, wind_speed, wind_dir))
+
+
+@api_view(['GET'])
+def fire_intensity_tile(request, z, x, y):
+    """Fire intensity heatmap tile at Web Mercator z/x/y.
+
+    Optional query params:
+    - window: minutes of history to include (default 1440)
+    - size: tile edge in pixels (default 256)
+    - output: 'png' (default) or 'array' for base64 uint8 intensities
+    """
+    if z > tiles.MAX_ZOOM or not (0 <= x < (1 << z) and 0 <= y < (1 << z)):
+        return Response({"error": "Tile out of range"}, status=400)
+
+    window = min(max(_number_param(request, 'window', tiles.DEFAULT_WINDOW_MIN, int), 1), 7*24*60)
+    size = min(max(_number_param(request, 'size', tiles.TILE_SIZE, int), tiles.MIN_TILE_SIZE), tiles.MAX_TILE_SIZE)
+    output = 'array' if request.GET.get('output') == 'array' else 'png'
+
+    result = tiles.tile(z, x, y, int(time.time() * 1000), window, size, output)
+    if output == 'png':
+        return HttpResponse(result, content_type='image/png')
+    return Response({"z": z, "x": x, "y": y, "window": window, **result})
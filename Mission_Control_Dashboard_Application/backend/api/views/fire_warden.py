@@ -1,42 +1,98 @@
-from rest_framework.response import Response
-from rest_framework.decorators import api_view
+from django.conf import settings
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+import json
 import logging
+import re
+
+from asgiref.sync import sync_to_async
+
+from api import assignment, intents, llm, telemetry
+from api.cache import LRUCache
+from api.intents import DEFAULT
+from api.notification_store import store as notification_store
+from api.situation import situation, summary_text
 
 logger = logging.getLogger(__name__)
 
+_cache_config = getattr(settings, 'FIRE_WARDEN_CACHE', {})
+# Replies are cached per intent (or normalized message) and telemetry data
+# version, so repeat questions about unchanged data skip recomputation
+_reply_cache = LRUCache(maxsize=_cache_config.get('MAX_ENTRIES', 256), ttl=_cache_config.get('TTL_SECONDS', 120))
 
-@api_view(['POST'])
-def fire_warden_chat(request):
-    """
-    Fire Warden AI chat endpoint.
-    Expects JSON body: { "message": "user message text" }
-    Returns structured response with type and content.
-    """
-    message = request.data.get('message', '').strip()
-    
-    if not message:
-        return Response({"error": "Message is required"}, status=400)
-    
-    logger.info(f"Fire Warden chat request: {message[:100]}")
-    
-    # Generate response based on keywords
-    lowerMessage = message.lower()
-    
-    if 'status' in lowerMessage or 'situation' in lowerMessage:
-        return Response({
-            'type': 'text',
-            'content': 'Current situation analysis: We have 7 active fires across multiple sectors. Fire F-2 in Sector C is the primary concern due to increasing wind speeds. I recommend deploying additional drones to the northeast perimeter.'
-        })
-    
-    if 'strategy' in lowerMessage or 'plan' in lowerMessage:
-        return Response({
+# replies that do not read telemetry are cached across data versions
+_STATIC_INTENTS = {DEFAULT} | {i.name for i in intents.router.intents.values() if i.reply and not i.fields}
+
+
+def _dispatch_actions():
+    """Plan title and actions derived from the drone-to-fire assignment."""
+    _, fires, drones = telemetry.snapshot()
+    assignments, reserve = assignment.assign(drones, fires)
+    actions = [
+        f"Dispatch {', '.join(a['drones'])} to {a['fire']} (ETA {a['etaMinutes']:.0f} min)"
+        for a in assignments
+    ]
+    if reserve:
+        actions.append(f"Hold {', '.join(reserve)} in reserve")
+    recall = sorted(d['id'] for d in drones if not assignment.is_fit(d))
+    if recall:
+        actions.append(f"Recall {', '.join(recall)} for recharge and refill")
+    title = f"{assignments[0]['fire']} Reinforcement Strategy" if assignments else 'Fleet Readiness Plan'
+    return title, actions, assignments
+
+
+def normalize_message(message):
+    """Lowercased message with punctuation and repeated whitespace removed."""
+    return ' '.join(re.sub(r'[^\w\s-]', ' ', message.lower()).split())
+
+
+def detect_intent(message):
+    """Keyword intent of a normalized message, or 'default'."""
+    return intents.router.match(message)
+
+
+def _template_fields():
+    """Values for intent reply templates, from the live situational context."""
+    context = situation.build()
+    fires, drones = context['fires'], context['drones']
+    return {
+        'summary': summary_text(context),
+        'active_fires': fires['active'],
+        'active_acres': fires['activeAcres'],
+        'tracked_fires': fires['total'],
+        'fit_drones': drones['fit'],
+        'total_drones': drones['total'],
+        'avg_battery': drones['avgBattery'],
+        'avg_water': drones['avgWater'],
+    }
+
+
+def _cache_key(message, intent):
+    # an LLM reply is written from the live context whatever the intent, so it is never static
+    static = intent in _STATIC_INTENTS and llm.client is None
+    version = None if static else (telemetry.data_version(), notification_store.version)
+    # free-form questions are keyed by their text, which an LLM reply would depend on
+    return (intent, message if intent == DEFAULT else None, version)
+
+
+def _reply(intent):
+    """Response body for an intent."""
+    if intent == 'status':
+        context = situation.build()
+        content = f"Current situation analysis: {summary_text(context)}"
+        worst = context['fires']['worst']
+        if worst:
+            content += f" I recommend reinforcing {worst[0]['id']} first."
+        return {'type': 'text', 'content': content}
+
+    if intent == 'plan':
+        title, actions, assignments = _dispatch_actions()
+        return {
             'type': 'plan',
             'content': 'I\'ve analyzed the situation and generated a tactical plan:',
             'plan': {
-                'title': 'Sector C Reinforcement Strategy',
-                'actions': [
-                    'Redeploy Drones D-15, D-18, D-22, D-24 from Sector A to Sector C',
-                    'Position drones at coordinates: N42.5°, N43.1°, N43.7°, N44.2°',
+                'title': title,
+                'actions': actions + [
                     'Increase water drop frequency to every 90 seconds',
                     'Establish firebreak along northeastern perimeter'
                 ],
@@ -44,24 +100,134 @@ def fire_warden_chat(request):
                     'containment': '40% faster containment',
                     'eta': '2.5 hours',
                     'successProbability': '87%'
-                }
+                },
+                'assignments': assignments
             }
-        })
-    
-    if 'drone' in lowerMessage:
-        return Response({
-            'type': 'text',
-            'content': 'Drone fleet status: 24 of 30 drones are currently active. Average battery level is 78%, average water capacity is 52%. Drones D-06 and D-04 will need to return for refueling within the next 15 minutes.'
-        })
-    
-    if 'weather' in lowerMessage or 'wind' in lowerMessage:
-        return Response({
-            'type': 'text',
-            'content': 'Current weather conditions: Wind speed is 12 mph from the northeast. Forecast shows winds may increase to 18 mph within the next 2 hours. Temperature is 85°F with 15% humidity. These conditions favor rapid fire spread.'
-        })
-    
+        }
+
+    if intent == 'drone':
+        drones = situation.build()['drones']
+        if not drones['total']:
+            return {'type': 'text', 'content': 'Drone fleet status: no drones are reporting.'}
+        by_status = ', '.join(f"{n} {status}" for status, n in sorted(drones['byStatus'].items()))
+        content = (f"Drone fleet status: {drones['fit']} of {drones['total']} drones are fit for dispatch "
+                   f"({by_status}). Average battery level is {drones['avgBattery']:g}%, average water "
+                   f"capacity is {drones['avgWater']:g}%.")
+        if drones['low']:
+            content += (f" {', '.join(d['id'] for d in drones['low'])} need to return for recharge or refill"
+                        + (f" ({drones['lowCount']} in total)." if drones['lowCount'] > len(drones['low']) else "."))
+        return {'type': 'text', 'content': content}
+
+    spec = intents.router.intents.get(intent)
+    if spec is not None and spec.reply:
+        # intents answered from the table, with live values filled into their template
+        try:
+            content = spec.reply.format_map(_template_fields()) if spec.fields else spec.reply
+        except (KeyError, ValueError):
+            content = spec.reply
+        return {'type': 'text', 'content': content}
+
     # Default response
-    return Response({
+    return {
         'type': 'text',
         'content': 'I understand your query. Based on current fire patterns and resource availability, I can provide strategic recommendations. Would you like me to analyze a specific sector or generate a comprehensive tactical plan?'
-    })
+    }
+
+
+def draft(message):
+    """``(reply, cached, key)``: the cached reply, or a fresh keyword reply that is not cached yet."""
+    normalized = normalize_message(message)
+    intent = detect_intent(normalized)
+    key = _cache_key(normalized, intent)
+    reply = _reply_cache.get(key)
+    if reply is not None:
+        return reply, True, key
+    return _reply(intent), False, key
+
+
+def remember(key, reply):
+    """Caches the final reply under the key ``draft`` returned."""
+    _reply_cache.set(key, reply)
+
+
+def answer(message):
+    """``(reply, cached)`` for a chat message, from the reply cache when it is current."""
+    reply, cached, key = draft(message)
+    if not cached:
+        remember(key, reply)
+    return reply, cached
+
+
+def llm_payload(message, reply):
+    """Request body for the LLM service: the question, the live context and the keyword reply as a draft."""
+    return {
+        'message': message,
+        'context': summary_text(situation.build()),
+        'draft': reply['content'],
+    }
+
+
+async def _llm_answer(user, message):
+    reply, cached, key = await sync_to_async(draft, thread_sensitive=False)(message)
+    if cached:
+        return reply, True
+    payload = await sync_to_async(llm_payload, thread_sensitive=False)(message, reply)
+    text = await llm.client.complete(user, payload)
+    reply = dict(reply, content=text)
+    remember(key, reply)
+    return reply, False
+
+
+_FORM_TYPES = ('application/x-www-form-urlencoded', 'multipart/form-data')
+
+
+def _request_data(request):
+    """``(data, error_response)`` for the body, parsed as DRF's default parsers would (JSON or form)."""
+    if request.content_type in _FORM_TYPES:
+        return request.POST, None
+    if request.content_type not in ('application/json', '') and request.body:
+        return None, JsonResponse({"detail": f'Unsupported media type "{request.content_type}" in request.'},
+                                  status=415)
+    try:
+        return json.loads(request.body or b'{}'), None
+    except ValueError as e:
+        return None, JsonResponse({"detail": f"JSON parse error - {e}"}, status=400)
+
+
+@csrf_exempt
+async def fire_warden_chat(request):
+    """
+    Fire Warden AI chat endpoint.
+    Expects JSON body: { "message": "user message text" } (form-encoded also accepted)
+    Returns structured response with type and content.
+    Repeat questions on unchanged data are served from cache (X-Cache: HIT).
+
+    Async, so a request waiting in the LLM client's queue holds no worker
+    thread; a full queue answers 503 at once. DRF has no async views, so the
+    body parsing and error responses of ``@api_view`` are kept by hand.
+    """
+    if request.method != 'POST':
+        return JsonResponse({"detail": f'Method "{request.method}" not allowed.'}, status=405,
+                            headers={'Allow': 'POST, OPTIONS'})
+    data, error = _request_data(request)
+    if error is not None:
+        return error
+    message = data.get('message') if hasattr(data, 'get') else None
+    message = message.strip() if isinstance(message, str) else ''
+
+    if not message:
+        return JsonResponse({"error": "Message is required"}, status=400)
+
+    logger.info(f"Fire Warden chat request: {message[:100]}")
+
+    if llm.client is None:
+        reply, cached = await sync_to_async(answer, thread_sensitive=False)(message)
+    else:
+        user = await request.auser()
+        user = user.get_username() if user.is_authenticated else request.META.get('REMOTE_ADDR')
+        try:
+            reply, cached = await _llm_answer(user, message)
+        except llm.LLMError as e:
+            logger.warning(f"Fire Warden LLM request failed: {e}")
+            return JsonResponse({"error": str(e)}, status=503)
+    return JsonResponse(reply, headers={'X-Cache': 'HIT' if cached else 'MISS'})
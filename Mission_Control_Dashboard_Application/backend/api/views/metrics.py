@@ -0,0 +1,12 @@
+from django.http import HttpResponse
+from django.views.decorators.http import require_GET
+
+from api import metrics
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+@require_GET
+def prometheus_metrics(request):
+    """Request and component metrics in the Prometheus text format."""
+    return HttpResponse(metrics.render(), content_type=CONTENT_TYPE)
@@ -2,6 +2,11 @@ from rest_framework.response import Response
 from rest_framework.decorators import api_view
 import time
 
+from api import acks
+from api.notification_store import SEVERITIES, store
+
+MAX_PAGE_SIZE = 1000
+
 # --- Mock Notification Data ---
 now_ms = int(time.time() * 1000)
 
@@ -58,10 +63,135 @@ MOCK_NOTIFICATIONS = [
     },
 ]
 
+store.load(MOCK_NOTIFICATIONS)
+
+
+def _encode_cursor(key):
+    """Opaque page cursor: the store key of the last notification on the page, in base 36."""
+    digits = '0123456789abcdefghijklmnopqrstuvwxyz'
+    out = ''
+    while True:
+        key, r = divmod(key, 36)
+        out = digits[r] + out
+        if not key:
+            return out
+
+
+def _list_param(request, name):
+    """Values of a repeatable, comma-separated query param."""
+    return [v.strip() for raw in request.GET.getlist(name) for v in raw.split(',') if v.strip()]
+
+
 @api_view(['GET'])
 def recent_notifications(request):
-    """Returns all notifications from last 24h (all pre-acknowledged)."""
+    """Returns all notifications from last 24h."""
+    acks.restore(store)
     now_ms = int(time.time() * 1000)
     start_ts = now_ms - 24*60*60*1000
-    recent = [n for n in MOCK_NOTIFICATIONS if start_ts <= n['timestamp'] <= now_ms]
-    return Response({"notifications": recent})
\ No newline at end of file
+    return Response({"notifications": store.query(start=start_ts, end=now_ms)})
+
+
+@api_view(['GET'])
+def query_notifications(request):
+    """Query retained notifications, oldest first.
+
+    Optional query params (lists are comma-separated or repeated; a
+    notification matches a list if it has any of the values):
+    - start, end: integer ms since epoch (inclusive)
+    - severity: critical, high, medium, low, info
+    - label: notification labels
+    - source: notification sources
+    - acknowledged: true or false
+    - order: oldest (default) or newest
+    - limit, cursor: page through the results; each page comes with the
+      ``nextCursor`` to pass for the next one (null after the last)
+    """
+    acks.restore(store)
+    bounds = {}
+    for name in ('start', 'end'):
+        value = request.GET.get(name)
+        if value is None:
+            continue
+        try:
+            bounds[name] = int(value)
+        except ValueError:
+            return Response({"error": f"'{name}' must be an integer timestamp in ms"}, status=400)
+
+    severities = _list_param(request, 'severity')
+    unknown = [s for s in severities if s not in SEVERITIES]
+    if unknown:
+        return Response({"error": f"Unknown severity: {', '.join(unknown)}"}, status=400)
+
+    acknowledged = request.GET.get('acknowledged')
+    if acknowledged is not None:
+        if acknowledged.lower() not in ('true', 'false'):
+            return Response({"error": "'acknowledged' must be true or false"}, status=400)
+        acknowledged = acknowledged.lower() == 'true'
+
+    order = request.GET.get('order', 'oldest')
+    if order not in ('oldest', 'newest'):
+        return Response({"error": "'order' must be oldest or newest"}, status=400)
+
+    filters = dict(
+        start=bounds.get('start'),
+        end=bounds.get('end'),
+        severities=severities,
+        labels=_list_param(request, 'label'),
+        sources=_list_param(request, 'source'),
+        acknowledged=acknowledged,
+    )
+    newest_first = order == 'newest'
+    limit, cursor = request.GET.get('limit'), request.GET.get('cursor')
+    if limit is None and cursor is None:
+        return Response({"notifications": store.query(newest_first=newest_first, **filters)})
+
+    try:
+        limit = min(max(int(limit), 1), MAX_PAGE_SIZE) if limit is not None else 50
+    except ValueError:
+        return Response({"error": "'limit' must be an integer"}, status=400)
+    if cursor is not None:
+        try:
+            cursor = int(cursor, 36)
+        except ValueError:
+            return Response({"error": "Invalid 'cursor'"}, status=400)
+    notifications, next_key = store.page(cursor=cursor, limit=limit, newest_first=newest_first, **filters)
+    return Response({
+        "notifications": notifications,
+        "nextCursor": _encode_cursor(next_key) if next_key is not None else None,
+    })
+
+
+@api_view(['GET'])
+def notification_counts(request):
+    """Unacknowledged notification counts for badges, kept up to date by the store."""
+    acks.restore(store)
+    return Response(store.counts())
+
+
+@api_view(['POST'])
+def acknowledge_notifications(request):
+    """Acknowledge (or un-acknowledge) notifications by id.
+
+    Body: {"ids": [101, 102], "acknowledged": true, "by": "operator-1"}
+    ("acknowledged" defaults to true, "by" is optional). The change is
+    applied at once, broadcast on the notifications stream and persisted in
+    the background. Returns the ids whose state changed and those unknown.
+    """
+    ids = request.data.get('ids')
+    if not isinstance(ids, list) or not ids:
+        return Response({"error": "'ids' must be a non-empty list of notification ids"}, status=400)
+    if len(ids) > acks.MAX_IDS_PER_REQUEST:
+        return Response({"error": f"At most {acks.MAX_IDS_PER_REQUEST} ids per request"}, status=400)
+    if not all(isinstance(i, int) and not isinstance(i, bool) for i in ids):
+        return Response({"error": "Notification ids must be integers"}, status=400)
+    acknowledged = request.data.get('acknowledged', True)
+    if not isinstance(acknowledged, bool):
+        return Response({"error": "'acknowledged' must be true or false"}, status=400)
+    by = request.data.get('by')
+    if by is not None and not isinstance(by, str):
+        return Response({"error": "'by' must be a string"}, status=400)
+
+    acks.restore(store)
+    changed = acks.acknowledge(store, ids, acknowledged, by)
+    unknown = [i for i in ids if store.get(i) is None]
+    return Response({"acknowledged": acknowledged, "updated": changed, "unknown": unknown})
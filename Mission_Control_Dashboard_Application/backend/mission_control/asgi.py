@@ -19,8 +19,12 @@ django_asgi_app = get_asgi_application()
 
 # Import the project-level routing aggregator
 from mission_control import routing as app_routing
+from websockets.broadcast import FollowStreams
+from websockets.consumers.fire_tracking import fire_broadcaster
+from websockets.consumers.notifications import notifications_broadcaster
 
-application = ProtocolTypeRouter({
+# Every worker relays both streams, so its REST views see the live data
+application = FollowStreams(ProtocolTypeRouter({
     "http": django_asgi_app,
     "websocket": URLRouter(app_routing.websocket_urlpatterns),
-})
\ No newline at end of file
+}), [fire_broadcaster, notifications_broadcaster])
@@ -45,6 +45,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.metrics.RequestMetricsMiddleware',  # outermost, so it times the whole stack
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -135,6 +136,68 @@ CHANNEL_LAYERS = {
         "BACKEND": "channels.layers.InMemoryChannelLayer"
     }
 }
+# Compress websocket frames for clients that offer permessage-deflate (websockets/server.py)
+WEBSOCKET_PERMESSAGE_DEFLATE = True
+
+# Several daphne workers on one host, without Redis (websockets/layers.py):
+# CHANNEL_LAYERS = {
+#     "default": {
+#         "BACKEND": "websockets.layers.UnixSocketChannelLayer",
+#         "CONFIG": {"path": "/tmp/mission-control-channels"},
+#     }
+# }
+
+# Per-connection outbound queues (websockets/outbox.py)
+WEBSOCKET_OUTBOX = {
+    "MAX_FRAMES": 256,  # queued frames before telemetry is dropped oldest-first
+    "MAX_LAG_SECONDS": 15,  # disconnect a client whose oldest queued frame is this old
+    "BATCH_WINDOW_MS": 200,  # default window for clients connecting with ?batch
+}
+
+# Notification deduplication and per-source rate limits (api/coalescing.py)
+NOTIFICATION_COALESCING = {
+    "WINDOW_SECONDS": 60,  # repeats this close together merge into one notification
+    "RATE_PER_MINUTE": 12,  # new notifications per source, after the burst
+    "BURST": 10,
+    "MAX_QUEUED": 100,  # per source, waiting for a token
+}
+
+# Fire Warden chat reply cache (api/views/fire_warden.py)
+FIRE_WARDEN_CACHE = {
+    "TTL_SECONDS": 120,  # a cached reply is reused at most this long
+    "MAX_ENTRIES": 256,
+}
+
+# Stand-in token stream for ws/fire-warden/ until an LLM backend is configured (api/llm.py)
+FIRE_WARDEN_STREAM = {
+    "FIRST_TOKEN_MS": 400,  # delay before the first token
+    "TOKENS_PER_SECOND": 40,
+}
+
+# Fire Warden LLM service (api/llm.py). Without a URL replies use the stand-in
+# token stream above; `manage.py run_llm_stub` serves the protocol locally.
+FIRE_WARDEN_LLM = {
+    "URL": None,  # e.g. "http://127.0.0.1:8081/v1/chat"
+    "MAX_CONCURRENCY": 8,  # requests in flight to the service at once
+    "MAX_QUEUED": 256,  # waiting requests across all users before new ones are refused
+    "MAX_QUEUED_PER_USER": 4,
+    "TIMEOUT_SECONDS": 30,  # deadline per reply, from the moment the message arrives
+}
+
+# Request metrics served on /metrics (api/metrics.py); bucket upper bounds
+REQUEST_METRICS = {
+    "LATENCY_BUCKETS": (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),  # seconds
+    "SIZE_BUCKETS": (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216),  # bytes
+}
+
+# Acknowledgement persistence (api/acks.py)
+NOTIFICATION_ACKS = {
+    "FLUSH_INTERVAL": 1.0,  # seconds between write-behind flushes
+    "BATCH_SIZE": 500,  # rows per bulk upsert; a full batch flushes early
+    "MAX_IDS_PER_REQUEST": 10_000,
+    "MAX_PENDING": 100_000,  # queued changes kept while the database is failing; oldest dropped past this
+    "MAX_BACKOFF": 60.0,  # longest wait, in seconds, between retries of a failing write
+}
 
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
@@ -17,7 +17,10 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 
+from api.views.metrics import prometheus_metrics
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('api.urls')),
+    path('metrics', prometheus_metrics, name='metrics'),
 ]
\ No newline at end of file
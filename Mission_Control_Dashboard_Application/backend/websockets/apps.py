@@ -1,6 +1,28 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class WebsocketsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'websockets'
+
+    def ready(self):
+        from api import acks, alerts
+        from .consumers.notifications import broadcast_ack, emit_alert
+        alerts.add_sink(emit_alert)
+        acks.add_sink(broadcast_ack)
+
+        from api import metrics
+        from . import outbox
+        from .consumers import fire_warden, notifications
+        metrics.add_collector('websocket_outbox', outbox.metrics,
+                              counters=('coalescedFrames', 'droppedFrames', 'slowDisconnects'))
+        metrics.add_collector('notification_coalescer', notifications.coalescer.metrics,
+                              counters=('merged', 'dropped'))
+        metrics.add_collector('fire_warden_ttft', fire_warden.ttft_stats.summary, counters=('count',))
+
+        if getattr(settings, 'WEBSOCKET_PERMESSAGE_DEFLATE', False):
+            # daphne's runserver builds its server from this hook
+            from daphne.management.commands.runserver import Command as RunserverCommand
+            from .server import DeflateServer
+            RunserverCommand.server_cls = DeflateServer
@@ -0,0 +1,395 @@
+import asyncio
+import json
+import logging
+import threading
+from collections import deque
+
+import msgpack
+from channels.layers import get_channel_layer
+
+from .subscriptions import SubscriptionIndex
+
+logger = logging.getLogger(__name__)
+
+FRAME_EVENT = "stream.frame"
+SUBMIT_EVENT = "stream.submit"
+REPLAY_BUFFER_SIZE = 1024
+
+
+def encode_frame(message):
+    """Encodes a message once into the text frame sent to every subscriber."""
+    return json.dumps(message, separators=(',', ':'))
+
+
+def encode_batch(frames):
+    """Wraps already encoded frames into one ``batch`` frame without re-encoding them."""
+    return '{"type":"batch","items":[' + ','.join(frames) + ']}'
+
+
+def encode_binary(frame):
+    """MessagePack form of a JSON frame, for sockets that negotiated binary framing."""
+    return msgpack.packb(json.loads(frame), use_bin_type=True)
+
+
+_BATCH_PREFIX = b''.join([msgpack.Packer().pack_map_header(2), msgpack.packb("type"), msgpack.packb("batch"),
+                          msgpack.packb("items")])
+
+
+def encode_binary_batch(frames):
+    """MessagePack ``batch`` frame built from already packed items."""
+    return _BATCH_PREFIX + msgpack.Packer().pack_array_header(len(frames)) + b''.join(frames)
+
+
+async def publish_frame(group, frame, meta=None):
+    """Publishes a pre-encoded frame to every process subscribed to ``group``.
+
+    ``meta`` carries the routing attributes (id, lat, lng, severity, labels)
+    that subscription filters are matched against.
+    """
+    await get_channel_layer().group_send(group, {"type": FRAME_EVENT, "frame": frame, "meta": meta or {}})
+
+
+class ReplayBuffer:
+    """Sequence numbers and a bounded ring of a stream's recent frames.
+
+    ``stamp`` numbers a message, encodes it and keeps the frame so a client
+    reconnecting with the last sequence it saw can be sent only what it
+    missed. ``since`` returns None when that gap reaches past the ring.
+    Workers that did not stamp a frame ``record`` it as it arrives.
+
+    With a ``state`` (such as ``websockets.deltas.StreamState``; anything
+    with ``apply(message)`` and ``keyframes()``) every message is also
+    applied to it, so ``snapshot`` can hand a new client the current state
+    of each entity together with the ``seq`` it reflects. ``on_relay`` is
+    called with each message recorded from another worker, after ``state``.
+    """
+
+    def __init__(self, size=REPLAY_BUFFER_SIZE, state=None, on_relay=None):
+        self._frames = deque(maxlen=size)
+        self._lock = threading.Lock()
+        self.state = state
+        self.on_relay = on_relay
+        self.seq = 0
+
+    def stamp(self, message):
+        with self._lock:
+            self.seq += 1
+            frame = encode_frame(dict(message, seq=self.seq))
+            self._frames.append((self.seq, frame))
+            if self.state is not None:
+                self.state.apply(message)
+            return self.seq, frame
+
+    def continue_from(self, seq):
+        """Numbers the next frame after ``seq``, the last one given out on the stream, if that is ahead."""
+        with self._lock:
+            if seq > self.seq:
+                self._frames.clear()  # this worker missed frames; resuming clients must resync
+                self.seq = seq
+
+    def record(self, seq, frame):
+        """Keeps a frame stamped by another worker; a gap restarts the ring."""
+        with self._lock:
+            if seq <= self.seq:
+                return
+            if seq != self.seq + 1:
+                self._frames.clear()
+            self.seq = seq
+            self._frames.append((seq, frame))
+            if self.state is None and self.on_relay is None:
+                return
+            message = json.loads(frame)
+            if self.state is not None:
+                self.state.apply(message)
+        if self.on_relay is not None:
+            try:
+                self.on_relay(message)
+            except Exception:
+                logger.exception("relaying stream frame %d failed", seq)
+
+    def snapshot(self):
+        """``(seq, keyframes)``: the latest record per entity as of ``seq``."""
+        with self._lock:
+            return self.seq, self.state.keyframes() if self.state is not None else []
+
+    def since(self, seq):
+        """Frames after ``seq``, oldest first, or None if some have been evicted."""
+        with self._lock:
+            if seq > self.seq:
+                return None  # from before a restart
+            if seq == self.seq:
+                return []
+            if not self._frames or self._frames[0][0] > seq + 1:
+                return None
+            skip = seq + 1 - self._frames[0][0]
+            return [frame for _, frame in list(self._frames)[skip:]]
+
+
+class LocalFanout:
+    """Process-local delivery of a stream's frames.
+
+    Only one channel per process joins the channel-layer group; every frame
+    that arrives on it is handed, as the same immutable string, to each local
+    subscriber's ``push_frame``, which queues it without waiting on the socket. The layer therefore carries a frame once per
+    process rather than once per socket, and nothing is re-encoded. Frames go
+    only to subscribers whose filter matches the frame's routing metadata.
+    """
+
+    def __init__(self, group, replay=None):
+        self.group = group
+        self.replay = replay
+        self.subscribers = SubscriptionIndex()
+        self.following = False
+        self._listener = None
+        self._ready = None
+
+    async def add(self, consumer, flt=None):
+        self.subscribers.add(consumer, flt)
+        await self._start()
+
+    async def follow(self):
+        """Keeps listening, and recording into ``replay``, whether or not anyone is subscribed."""
+        self.following = True
+        await self._start()
+
+    async def _start(self):
+        if self._listener is None:
+            self._ready = asyncio.get_running_loop().create_future()
+            self._listener = asyncio.create_task(self._listen(self._ready))
+        # frames published before the group join completes would be missed
+        await asyncio.shield(self._ready)
+
+    async def discard(self, consumer):
+        self.subscribers.discard(consumer)
+        if self.subscribers or self.following or self._listener is None:
+            return
+        listener, self._listener = self._listener, None
+        listener.cancel()
+        try:
+            await listener
+        except asyncio.CancelledError:
+            pass
+
+    def set_filter(self, consumer, flt):
+        if consumer in self.subscribers:
+            self.subscribers.add(consumer, flt)
+
+    async def deliver(self, frame, meta=None):
+        meta = meta or {}
+        binary = None
+        for consumer in self.subscribers.match(meta):
+            try:
+                if consumer.binary:
+                    # converted once per frame, and only if a binary socket wants it
+                    if binary is None:
+                        binary = encode_binary(frame)
+                    consumer.push_frame(binary, meta)
+                else:
+                    consumer.push_frame(frame, meta)
+            except Exception:
+                logger.exception("dropping frame for %s subscriber", self.group)
+
+    async def _listen(self, ready):
+        layer = get_channel_layer()
+        channel = await layer.new_channel()
+        await layer.group_add(self.group, channel)
+        ready.set_result(channel)
+        try:
+            while True:
+                event = await layer.receive(channel)
+                meta = event.get("meta") or {}
+                if self.replay is not None and "seq" in meta:
+                    self.replay.record(meta["seq"], event["frame"])
+                await self.deliver(event["frame"], meta)
+        finally:
+            await layer.group_discard(self.group, channel)
+
+
+class Broadcaster:
+    """Runs a stream's producer loops while anyone is subscribed.
+
+    Each tick calls ``produce()`` once, encodes the result once and publishes
+    the frame to the stream's channel-layer group, so the cost of a tick is
+    one production plus the fan-out however many sockets are connected, and
+    the data generated does not depend on the number of clients. ``route``
+    maps a message to the metadata its subscribers are filtered on. Every
+    frame carries the stream's ``seq`` and is kept in ``replay``.
+
+    ``add_source`` adds another producer with its own interval to the same
+    stream (and sequence); a producer may return a list of messages, each
+    published as its own frame.
+
+    With several workers sharing a channel layer that offers
+    ``acquire_lock`` (``websockets.layers``), only the worker holding the
+    stream's producer lock produces; the others just relay its frames.
+    That worker is also the only one to number frames: messages raised
+    elsewhere (REST acks, alerts) go through ``submit``, which forwards them
+    to it over the layer. ``on_relay(message)`` lets the other workers
+    mirror what the leader's producers did, such as ingesting telemetry;
+    ``follow`` keeps a worker relaying while it has no subscribers.
+    """
+
+    def __init__(self, group, produce, interval, first_delay=0.0, route=None, state=None, on_relay=None):
+        self.group = group
+        self.route = route
+        self.sources = [(produce, interval, first_delay)]
+        self.replay = ReplayBuffer(state=state, on_relay=on_relay)
+        self.fanout = LocalFanout(group, self.replay)
+        self._tasks = []
+        self._inbox = None  # while leading: receives the messages other workers submit
+
+    def add_source(self, produce, interval, first_delay=0.0):
+        self.sources.append((produce, interval, first_delay))
+
+    @property
+    def subscribers(self):
+        return len(self.fanout.subscribers)
+
+    async def follow(self):
+        """Relays the stream's frames into this worker from now on, without a subscriber."""
+        await self.fanout.follow()
+
+    async def subscribe(self, consumer):
+        """Registers a consumer; starts the producer on the first one."""
+        await self.fanout.add(consumer)
+        if not self._tasks or all(task.done() for task in self._tasks):
+            self._tasks = [asyncio.create_task(self._run(*source)) for source in self.sources]
+            self._lead()  # take the lead now rather than at the first tick, if nobody has it
+
+    async def unsubscribe(self, consumer):
+        """Drops a consumer; stops the producer once nobody is left."""
+        if consumer not in self.fanout.subscribers:
+            return
+        await self.fanout.discard(consumer)
+        if self.fanout.subscribers or not self._tasks:
+            return
+        # detach first so a consumer connecting meanwhile starts fresh producers
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if not self._tasks:
+            self._step_down()
+
+    def stamp(self, message):
+        """Numbers and encodes a message; returns the frame and its routing metadata."""
+        seq, frame = self.replay.stamp(message)
+        set_value = getattr(get_channel_layer(), "set_lock_value", None)
+        if set_value is not None:
+            set_value(self._lock_name, seq)  # where the next leader carries on numbering
+        meta = dict(self.route(message) if self.route else {}, seq=seq)
+        return frame, meta
+
+    async def publish(self, message):
+        """Encodes one message and publishes the frame to every subscriber."""
+        frame, meta = self.stamp(message)
+        await publish_frame(self.group, frame, meta)
+        return frame
+
+    async def submit(self, message):
+        """Publishes a message raised outside the stream's producers, numbered by the leading worker.
+
+        Two workers stamping on their own would hand out the same ``seq``,
+        and receivers drop the second frame as already seen. So a worker
+        that does not lead forwards the message to the one that does, and
+        applies it to its own stream state at once. With no leader at all,
+        this worker takes the lock just long enough to stamp the message.
+        """
+        layer = get_channel_layer()
+        if not hasattr(layer, "acquire_lock") or self._inbox is not None:
+            await self.publish(message)
+        elif self._lead():
+            try:
+                frame, meta = self.stamp(message)
+            finally:
+                if not self._tasks:
+                    self._step_down()  # leave the lead to a worker whose producers are running
+            await publish_frame(self.group, frame, meta)
+        else:
+            if self.replay.state is not None:
+                self.replay.state.apply(message)
+            await layer.group_send(self._inbox_group, {"type": SUBMIT_EVENT, "message": message})
+
+    @property
+    def _lock_name(self):
+        return f"producer-{self.group}"
+
+    @property
+    def _inbox_group(self):
+        return f"{self.group}.leader"
+
+    def _lead(self):
+        layer = get_channel_layer()
+        acquire = getattr(layer, "acquire_lock", None)
+        if acquire is None:
+            return True
+        if not acquire(self._lock_name):
+            return False
+        if self._inbox is None:
+            # just took the lead: carry on from the last seq the previous leader gave out
+            self.replay.continue_from(layer.lock_value(self._lock_name))
+            self._inbox = asyncio.create_task(self._serve_submissions())
+        return True
+
+    def _step_down(self):
+        if self._inbox is not None:
+            self._inbox.cancel()
+            self._inbox = None
+        release = getattr(get_channel_layer(), "release_lock", None)
+        if release is not None:
+            release(self._lock_name)
+
+    async def _serve_submissions(self):
+        layer = get_channel_layer()
+        channel = await layer.new_channel()
+        await layer.group_add(self._inbox_group, channel)
+        try:
+            while True:
+                event = await layer.receive(channel)
+                try:
+                    await self.publish(event["message"])
+                except Exception:
+                    logger.exception("publishing a submitted %s message failed", self.group)
+        finally:
+            await layer.group_discard(self._inbox_group, channel)
+
+    async def _run(self, produce, interval, first_delay):
+        try:
+            await asyncio.sleep(first_delay)
+            while True:
+                if self._lead():
+                    try:
+                        messages = produce()
+                    except Exception:
+                        logger.exception("producer for %s failed", self.group)
+                    else:
+                        for message in messages if isinstance(messages, list) else [messages]:
+                            await self.publish(message)
+                await asyncio.sleep(interval)
+        except asyncio.CancelledError:
+            return
+
+
+class FollowStreams:
+    """ASGI wrapper that makes the worker follow ``broadcasters`` once its event loop runs.
+
+    Every worker then keeps its replay buffers and stream state (and, through
+    ``on_relay``, the REST-facing stores) current, including workers that only
+    serve HTTP.
+    """
+
+    def __init__(self, application, broadcasters):
+        self.application = application
+        self.broadcasters = broadcasters
+        self._following = None
+
+    async def __call__(self, scope, receive, send):
+        if self._following is None:
+            self._following = asyncio.ensure_future(self._follow())
+        return await self.application(scope, receive, send)
+
+    async def _follow(self):
+        try:
+            await asyncio.gather(*(broadcaster.follow() for broadcaster in self.broadcasters))
+        except Exception:
+            logger.exception("following the broadcast streams failed")
@@ -1,2 +1,3 @@
 from .fire_tracking import FireTrackingConsumer
+from .fire_warden import FireWardenConsumer
 from .notifications import NotificationsConsumer
\ No newline at end of file
@@ -0,0 +1,147 @@
+import json
+from urllib.parse import parse_qs
+
+import msgpack
+from channels.generic.websocket import AsyncWebsocketConsumer
+
+from websockets.broadcast import encode_batch, encode_binary, encode_binary_batch
+from websockets.outbox import BATCH_WINDOW_MS, Outbox
+from websockets.subscriptions import Filter, FilterError
+
+
+MIN_BATCH_WINDOW_MS = 50
+MAX_BATCH_WINDOW_MS = 1000
+BINARY_SUBPROTOCOL = "msgpack"
+
+
+class StreamConsumer(AsyncWebsocketConsumer):
+    """Websocket that relays one broadcast stream to its client.
+
+    Subclasses set ``broadcaster`` and ``log_prefix``; frames arrive already
+    encoded from the broadcaster's local fan-out. A client may narrow the
+    stream by sending ``{"type": "subscribe", ...}`` with a filter (see
+    ``websockets.subscriptions``); it is answered with ``subscribed`` or
+    ``error``.
+
+    Connecting with ``?resume_from=<seq>`` replays the frames missed since
+    that sequence number, or sends ``{"type": "resync", "seq": ...}`` when
+    they are no longer buffered. Live frames arriving meanwhile wait in the
+    outbox until the replay is sent, so a client may see a few frames twice
+    and should drop any ``seq`` at or below the last one it applied.
+
+    Streams whose broadcaster keeps entity state (delta-encoded telemetry)
+    first send new and resynced clients ``{"type": "snapshot", "seq": ...,
+    "items": [...]}`` holding a keyframe per entity as of ``seq``; later
+    frames at or below that ``seq`` are already reflected in it.
+
+    Live frames go through a bounded ``Outbox``; set ``coalesce`` on
+    telemetry streams so queued frames collapse to the latest per entity.
+    Connecting with ``?batch`` (or ``?batch=<ms>``) switches the socket to
+    ``{"type": "batch", "items": [...]}`` frames sent once per window.
+
+    JSON text frames are the default. Offering the ``msgpack`` subprotocol,
+    or connecting with ``?format=msgpack``, switches every frame to binary
+    MessagePack with the same structure.
+    """
+    broadcaster = None
+    log_prefix = "[WS]"
+    coalesce = False
+    binary = False
+    outbox = None
+
+    async def connect(self):
+        params = parse_qs(self.scope.get("query_string", b"").decode(), keep_blank_values=True)
+        offered = BINARY_SUBPROTOCOL in self.scope.get("subprotocols", ())
+        self.binary = offered or params.get("format", [""])[0] == BINARY_SUBPROTOCOL
+        await self.accept(subprotocol=BINARY_SUBPROTOCOL if offered else None)
+        batch_window = self._batch_window(params)
+        self.outbox = Outbox(self._send_frame, self.close, self.coalesce, batch_window=batch_window)
+        resume_from = self._resume_from(params)
+        await self.broadcaster.subscribe(self)
+        if resume_from is None:
+            await self._send_snapshot()
+            self.outbox.start()
+            print(f"{self.log_prefix} connected")
+            return
+
+        missed = self.broadcaster.replay.since(resume_from)
+        if missed is None:
+            await self.send_message({"type": "resync", "seq": self.broadcaster.replay.seq})
+            await self._send_snapshot()
+        else:
+            if self.binary:
+                missed = [encode_binary(frame) for frame in missed]
+            if batch_window is not None and missed:
+                missed = [encode_binary_batch(missed) if self.binary else encode_batch(missed)]
+            for frame in missed:
+                await self._send_frame(frame)
+        self.outbox.start()
+        print(f"{self.log_prefix} resumed from {resume_from}: "
+              f"{'resync' if missed is None else f'{len(missed)} replayed'}")
+
+    async def _send_snapshot(self):
+        seq, items = self.broadcaster.replay.snapshot()
+        if items:
+            await self.send_message({"type": "snapshot", "seq": seq, "items": items})
+
+    @staticmethod
+    def _resume_from(params):
+        try:
+            return max(int(params["resume_from"][0]), 0)
+        except (KeyError, ValueError):
+            return None
+
+    @staticmethod
+    def _batch_window(params):
+        """Batch window in seconds from ``?batch=<ms>``, or None when not batching."""
+        if "batch" not in params:
+            return None
+        try:
+            window_ms = int(params["batch"][0])
+        except ValueError:
+            window_ms = BATCH_WINDOW_MS
+        return min(max(window_ms, MIN_BATCH_WINDOW_MS), MAX_BATCH_WINDOW_MS) / 1000.0
+
+    async def disconnect(self, close_code):
+        await self.broadcaster.unsubscribe(self)
+        if self.outbox is not None:
+            await self.outbox.stop()
+        print(f"{self.log_prefix} disconnected: {close_code}")
+
+    async def receive(self, text_data=None, bytes_data=None):
+        try:
+            if bytes_data is not None:
+                data = msgpack.unpackb(bytes_data, raw=False)
+            else:
+                data = json.loads(text_data or '')
+        except ValueError:
+            await self.send_message({"type": "error", "error": "Invalid message encoding"})
+            return
+        if not isinstance(data, dict) or data.get("type") != "subscribe":
+            await self.send_message({"type": "error", "error": "Unsupported message type"})
+            return
+        try:
+            flt = Filter.parse(data)
+        except FilterError as e:
+            await self.send_message({"type": "error", "error": str(e)})
+            return
+        self.broadcaster.fanout.set_filter(self, flt)
+        await self.send_message({"type": "subscribed", "filter": flt.to_dict() if flt else {}})
+
+    async def send_message(self, message):
+        """Sends a control message in the socket's negotiated format."""
+        if self.binary:
+            await self.send(bytes_data=msgpack.packb(message, use_bin_type=True))
+        else:
+            await self.send(text_data=json.dumps(message))
+
+    def push_frame(self, frame, meta=None):
+        """Queues a frame pre-encoded by the broadcaster, unchanged."""
+        if self.outbox is not None:
+            self.outbox.put(frame, meta)
+
+    async def _send_frame(self, frame):
+        if isinstance(frame, bytes):
+            await self.send(bytes_data=frame)
+        else:
+            await self.send(text_data=frame)
@@ -1,14 +1,22 @@
-import json
-import asyncio
+import random
 import time
-from channels.generic.websocket import AsyncWebsocketConsumer
 
-# Append live updates into the API mock dataset so HTTP queries see recent websocket events
+from websockets.broadcast import Broadcaster
+from websockets.deltas import DeltaEncoder, StreamState
+
+from .base import StreamConsumer
+
+FIRE_UPDATES_GROUP = "fire-updates"
+FIRE_UPDATE_INTERVAL = 20
+DRONE_UPDATE_INTERVAL = 5
+
+# Feed live updates into the shared telemetry store so HTTP queries see recent websocket events
 try:
-    # import the mock data list from the API module; the Django app exposes `api` as a package
-    from api.views.fire_drone import MOCK_FIRE_DATA
+    # importing the view module registers the API mock histories with the store
+    from api.views import fire_drone as _fire_drone_views  # noqa: F401
+    from api import telemetry
 except Exception:
-    MOCK_FIRE_DATA = None
+    telemetry = None
 
 def _now_ms():
     return int(time.time() * 1000)
@@ -28,13 +36,13 @@ def growing_fire_update():
         "timestamp": _now_ms()
     }
 
-    # Append to the API's mock dataset if available so HTTP endpoints reflect WS-generated updates.
+    # Ingest into the API's telemetry store if available so HTTP endpoints reflect WS-generated updates.
     try:
-        if MOCK_FIRE_DATA is not None:
-            # append a shallow copy to avoid accidental coupling
-            MOCK_FIRE_DATA.append(payload.copy())
+        if telemetry is not None:
+            # ingest a shallow copy to avoid accidental coupling
+            telemetry.ingest_fire(payload.copy())
     except Exception:
-        # best-effort only; do not crash the consumer if append fails
+        # best-effort only; do not crash the consumer if ingest fails
         pass
 
     return {
@@ -42,27 +50,120 @@ def growing_fire_update():
         "payload": payload,
     }
 
-class FireTrackingConsumer(AsyncWebsocketConsumer):
-    async def connect(self):
-        await self.accept()
-        self._task = asyncio.create_task(self._send_periodic())
-        print("[Fire WS] connected")
-
-    async def disconnect(self, close_code):
-        if hasattr(self, "_task"):
-            self._task.cancel()
-            try:
-                await self._task
-            except asyncio.CancelledError:
-                pass
-        print(f"[Fire WS] disconnected: {close_code}")
-
-    async def _send_periodic(self):
+# Simulated fleet, seeded from the latest drone records on the first tick
+_fleet = {}
+drone_encoder = DeltaEncoder("drone")
+
+def _drone_status(drone):
+    if drone["battery"] <= 10 or drone["water"] <= 5:
+        return "Critical"
+    if drone["battery"] < 30:
+        return "Low Battery"
+    if drone["water"] < 20:
+        return "Low Water"
+    return "Active"
+
+def _advance_drone(drone):
+    """One tick of a drone on station: it mostly holds position and drains slowly."""
+    if drone["battery"] <= 5:
+        # back to base: recharged and refilled
+        drone["battery"], drone["water"] = 100, 100
+    if random.random() < 0.3:
+        drone["lat"] = round(drone["lat"] + random.uniform(-0.0005, 0.0005), 4)
+        drone["lng"] = round(drone["lng"] + random.uniform(-0.0005, 0.0005), 4)
+    if random.random() < 0.3:
+        drone["battery"] -= 1
+    if drone["water"] > 0 and random.random() < 0.05:
+        drone["water"] = max(drone["water"] - 5, 0)
+    drone["status"] = _drone_status(drone)
+
+def drone_fleet_update():
+    """Advances every drone once; returns a keyframe or delta for each drone that changed."""
+    if not _fleet and telemetry is not None:
+        for drone in telemetry.latest_drones():
+            _fleet[drone["id"]] = dict(drone)
+    now = _now_ms()
+    messages = []
+    for drone in _fleet.values():
+        _advance_drone(drone)
+        drone["timestamp"] = now
         try:
-            while True:
-                msg = growing_fire_update()
-                await self.send(text_data=json.dumps(msg))
-                print(f"[Fire WS] intensity={msg['payload']['intensity']}")
-                await asyncio.sleep(20)
-        except asyncio.CancelledError:
-            return
\ No newline at end of file
+            if telemetry is not None:
+                telemetry.ingest_drone(drone.copy())
+        except Exception:
+            pass
+        message = drone_encoder.encode(drone)
+        if message is not None:
+            messages.append(message)
+    return messages
+
+_FIRE_SEVERITY = {"Critical": "critical", "Active": "medium", "Contained": "low"}
+_DRONE_SEVERITY = {"Critical": "critical", "Low Battery": "high", "Low Water": "medium", "Active": "low"}
+
+def route_drone_update(message):
+    """Routing metadata for a drone keyframe or delta, from the drone's full state."""
+    drone = fire_stream_state.latest("drone", message["payload"]["id"]) or message["payload"]
+    meta = {
+        "id": drone.get("id"),
+        "lat": drone.get("lat"),
+        "lng": drone.get("lng"),
+        "severity": _DRONE_SEVERITY.get(drone.get("status"), "info"),
+        "labels": ["Drone Update"],
+    }
+    if message["type"] == "drone_delta":
+        meta["delta"] = True
+    return meta
+
+def route_fire_update(message):
+    """Routing metadata that subscription filters match a fire update against."""
+    if message["type"] != "fire":
+        return route_drone_update(message)
+    fire = message["payload"]
+    severity = _FIRE_SEVERITY.get(fire.get("status"), "info")
+    if severity == "medium" and fire.get("intensity", 0) >= 70:
+        severity = "high"
+    return {
+        "id": fire.get("id"),
+        "lat": fire.get("lat"),
+        "lng": fire.get("lng"),
+        "severity": severity,
+        "labels": ["Fire Update"],
+    }
+
+def _ingest_relayed(message):
+    """Mirrors a frame the leading worker produced: ingests it and keeps the simulation in step."""
+    global _test_fire_intensity
+    if telemetry is None:
+        return
+    if message["type"] == "fire":
+        fire = dict(message["payload"])
+        if fire["id"] == "F-TEST":
+            _test_fire_intensity = fire["intensity"]
+        telemetry.ingest_fire(fire, relayed=True)
+        return
+    # the stream state has already folded a delta into the drone's full record
+    drone = fire_stream_state.latest("drone", message["payload"]["id"])
+    if drone is not None:
+        if drone["id"] in _fleet:
+            _fleet[drone["id"]] = dict(drone)
+        telemetry.ingest_drone(drone, relayed=True)
+
+def _produce_fire_update():
+    msg = growing_fire_update()
+    print(f"[Fire WS] intensity={msg['payload']['intensity']}")
+    return msg
+
+# Latest fire and drone per id, for the snapshot sent to new connections
+fire_stream_state = StreamState(("fire", "drone"))
+
+# One producer for all connections: each tick advances the test fire once
+fire_broadcaster = Broadcaster(
+    FIRE_UPDATES_GROUP, _produce_fire_update, FIRE_UPDATE_INTERVAL, route=route_fire_update,
+    state=fire_stream_state, on_relay=_ingest_relayed,
+)
+fire_broadcaster.add_source(drone_fleet_update, DRONE_UPDATE_INTERVAL)
+
+class FireTrackingConsumer(StreamConsumer):
+    broadcaster = fire_broadcaster
+    log_prefix = "[Fire WS]"
+    coalesce = True
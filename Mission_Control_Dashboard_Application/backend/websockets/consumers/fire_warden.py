@@ -0,0 +1,142 @@
+import asyncio
+import json
+import logging
+import time
+
+from asgiref.sync import sync_to_async
+from channels.generic.websocket import AsyncWebsocketConsumer
+
+from api import llm
+from api.views import fire_warden
+
+logger = logging.getLogger(__name__)
+
+# Time from a message arriving to its first token going out, over recent replies
+ttft_stats = llm.LatencyStats()
+
+
+async def _at_once(text):
+    yield text
+
+
+class FireWardenConsumer(AsyncWebsocketConsumer):
+    """Streams Fire Warden replies token by token.
+
+    The client sends ``{"type": "message", "id": <any>, "message": "..."}``
+    and receives ``start`` (with the intent's reply type), one ``token``
+    frame per chunk of text, and ``done`` with the plan (for plan replies)
+    and the reply's ``ttftMs``, ``totalMs`` and token count. A new message,
+    ``{"type": "cancel"}`` or disconnecting cancels the reply in flight,
+    which then ends with ``cancelled``. Replies served from the reply cache
+    are sent as a single token without the model's delays.
+
+    With ``FIRE_WARDEN_LLM['URL']`` set, replies are generated by the LLM
+    service through ``llm.client``, queued fairly per user, with the message's
+    arrival plus ``TIMEOUT_SECONDS`` as the deadline; cancelling the reply
+    cancels the request. A full queue or a failed request ends with
+    ``error`` (``busy`` is true when the client queue was full).
+    """
+
+    log_prefix = "[Fire Warden WS]"
+
+    async def connect(self):
+        self._reply = None
+        await self.accept()
+        print(f"{self.log_prefix} connected")
+
+    async def disconnect(self, close_code):
+        await self._cancel()
+        print(f"{self.log_prefix} disconnected: {close_code}")
+
+    async def receive(self, text_data=None, bytes_data=None):
+        try:
+            data = json.loads(text_data or '')
+        except ValueError:
+            await self._send({"type": "error", "error": "Invalid message encoding"})
+            return
+        kind = data.get("type") if isinstance(data, dict) else None
+        if kind == "cancel":
+            await self._cancel()
+            return
+        if kind != "message":
+            await self._send({"type": "error", "error": "Unsupported message type"})
+            return
+        message = data.get("message")
+        if not isinstance(message, str) or not message.strip():
+            await self._send({"type": "error", "id": data.get("id"), "error": "Message is required"})
+            return
+        await self._cancel()
+        deadline = time.monotonic() + (llm.client.timeout if llm.client is not None else 0)
+        self._reply = asyncio.create_task(
+            self._stream(data.get("id"), message.strip(), time.perf_counter(), deadline))
+
+    async def _cancel(self):
+        reply, self._reply = self._reply, None
+        if reply is None or reply.done():
+            return
+        reply.cancel()
+        try:
+            await reply
+        except asyncio.CancelledError:
+            pass
+
+    async def _stream(self, reply_id, message, received, deadline):
+        tokens = 0
+        try:
+            reply, cached, key = await sync_to_async(fire_warden.draft, thread_sensitive=False)(message)
+            await self._send({"type": "start", "id": reply_id, "replyType": reply["type"], "cached": cached})
+            if cached:
+                stream = _at_once(reply["content"])
+            elif llm.client is not None:
+                payload = await sync_to_async(fire_warden.llm_payload, thread_sensitive=False)(message, reply)
+                stream = llm.client.stream(self._user(), payload, deadline)
+            else:
+                stream = llm.stub_tokens(reply["content"])
+            ttft = None
+            text = []
+            async for token in stream:
+                text.append(token)
+                await self._send({"type": "token", "id": reply_id, "text": token})
+                tokens += 1
+                if ttft is None:
+                    ttft = time.perf_counter() - received
+                    ttft_stats.record(ttft)
+            done = {
+                "type": "done",
+                "id": reply_id,
+                "tokens": tokens,
+                "ttftMs": round(ttft * 1000, 1) if ttft is not None else None,
+                "totalMs": round((time.perf_counter() - received) * 1000, 1),
+            }
+            if reply.get("plan") is not None:
+                done["plan"] = reply["plan"]
+            if not cached:
+                fire_warden.remember(key, dict(reply, content="".join(text)))
+            await self._send(done)
+            print(f"{self.log_prefix} reply {reply_id}: {tokens} tokens, ttft {done['ttftMs']} ms")
+        except asyncio.CancelledError:
+            await self._send({"type": "cancelled", "id": reply_id, "tokens": tokens})
+            raise
+        except llm.LLMError as e:
+            print(f"{self.log_prefix} reply {reply_id} failed: {e}")
+            await self._send({"type": "error", "id": reply_id, "error": str(e),
+                              "busy": isinstance(e, llm.QueueFull)})
+        except Exception:
+            # a task nobody awaits: without this the client would wait for a reply that never comes
+            logger.exception("Fire Warden reply %s failed", reply_id)
+            await self._send({"type": "error", "id": reply_id, "error": "Fire Warden reply failed",
+                              "busy": False})
+
+    def _user(self):
+        """Key for the LLM client's per-user queue: the user name, else the client address."""
+        user = self.scope.get("user")
+        if user is not None and user.is_authenticated:
+            return user.get_username()
+        client = self.scope.get("client")
+        return client[0] if client else None
+
+    async def _send(self, message):
+        try:
+            await self.send(text_data=json.dumps(message))
+        except Exception:
+            pass  # the socket closed under a reply being cancelled
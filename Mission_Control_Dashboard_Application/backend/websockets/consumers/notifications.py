@@ -1,18 +1,38 @@
-import json
 import asyncio
+import logging
 import random
 import time
-from channels.generic.websocket import AsyncWebsocketConsumer
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+
+from api.coalescing import NotificationCoalescer
+from websockets.broadcast import Broadcaster
+
+from .base import StreamConsumer
+
+logger = logging.getLogger(__name__)
+
+NOTIFICATIONS_GROUP = "notifications"
+NOTIFICATION_INTERVAL = 60
+
+try:
+    # importing the view module loads the mock notifications into the store
+    from api.views import notifications as _notification_views  # noqa: F401
+    from api.notification_store import store as notification_store
+except Exception:
+    notification_store = None
 
 def _now_ms():
     return int(time.time() * 1000)
 
 _notification_counter = 100
 
-def generate_notification():
+def _next_notification_id():
     global _notification_counter
     _notification_counter += 1
-    
+    return _notification_counter
+
+def generate_notification():
     severities = ['critical', 'high', 'medium', 'low', 'info']
     templates = [
         ("Drone {id} battery at {level}%", "Drone Management System"),
@@ -31,7 +51,7 @@ def generate_notification():
     labels = random.sample(possible_labels, k=num_labels)
 
     return {
-        "id": _notification_counter,
+        "id": _next_notification_id(),
         "severity": random.choice(severities),
         "title": template.format(
             id=f"D-{random.randint(1,20)}",
@@ -47,27 +67,109 @@ def generate_notification():
         "labels": labels
     }
 
-class NotificationsConsumer(AsyncWebsocketConsumer):
-    async def connect(self):
-        await self.accept()
-        self._task = asyncio.create_task(self._send_periodic())
-        print("[Notifications WS] connected")
-
-    async def disconnect(self, close_code):
-        if hasattr(self, "_task"):
-            self._task.cancel()
-            try:
-                await self._task
-            except asyncio.CancelledError:
-                pass
-        print(f"[Notifications WS] disconnected: {close_code}")
-
-    async def _send_periodic(self):
-        try:
-            while True:
-                await asyncio.sleep(60)
-                notif = generate_notification()
-                await self.send(text_data=json.dumps(notif))
-                print(f"[Notifications WS] sent: {notif['title']}")
-        except asyncio.CancelledError:
-            return
\ No newline at end of file
+def route_notification(notification):
+    """Routing metadata that subscription filters match a notification against."""
+    if notification.get('type') == 'ack':
+        return {"all": True}  # every operator may hold the acknowledged notifications
+    location = notification.get('location') or {}
+    return {
+        "id": notification.get('entity'),
+        "lat": location.get('lat'),
+        "lng": location.get('lng'),
+        "severity": notification.get('severity'),
+        "labels": notification.get('labels') or [],
+    }
+
+# Repeats are merged and sources rate limited before anything is stored or sent
+coalescer = NotificationCoalescer(id_factory=_next_notification_id)
+_flush_timer = None
+_submissions = set()  # scheduled submits, referenced until done so they are not collected mid-flight
+
+def _submitted(task):
+    _submissions.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error("publishing a notification failed", exc_info=task.exception())
+
+def _publish(notification):
+    """Submits a notification to the stream, which numbers it and pushes it to every notifications socket.
+
+    Telemetry is usually ingested from inside a consumer's event loop, so the
+    submission is scheduled there; from plain sync code it is sent inline.
+    """
+    if get_channel_layer() is None:
+        return
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        async_to_sync(notifications_broadcaster.submit)(notification)
+    else:
+        task = loop.create_task(notifications_broadcaster.submit(notification))
+        _submissions.add(task)
+        task.add_done_callback(_submitted)
+
+def _flush_coalesced():
+    global _flush_timer
+    _flush_timer = None
+    for notification in coalescer.flush():
+        _publish(notification)
+    _schedule_flush()
+
+def _schedule_flush():
+    """Arms a timer for the coalescer's next merged update or rate-limited release."""
+    global _flush_timer
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return  # outside a loop the next submit flushes instead
+    if _flush_timer is not None:
+        _flush_timer.cancel()
+        _flush_timer = None
+    deadline = coalescer.next_deadline()
+    if deadline is not None:
+        _flush_timer = loop.call_later(max(deadline - time.monotonic(), 0.0), _flush_coalesced)
+
+def emit_alert(notification):
+    """Alert sink: passes a rule-engine notification through the coalescer and publishes the result."""
+    for merged in coalescer.submit(notification):
+        _publish(merged)
+    _schedule_flush()
+
+def broadcast_ack(ids, acknowledged, by, timestamp):
+    """Ack sink: tells every notifications socket (and worker) about an ack change."""
+    _publish({"type": "ack", "ids": ids, "acknowledged": acknowledged, "by": by, "timestamp": timestamp})
+
+def _produce_notification():
+    notifications = coalescer.submit(generate_notification())
+    _schedule_flush()
+    for notif in notifications:
+        print(f"[Notifications WS] sent: {notif['title']}")
+    return notifications
+
+class _StoreFeed:
+    """Stream state that files every notification on the stream in the REST store.
+
+    Applied where a notification is stamped and in every worker relaying
+    it, so ``/api/notifications/`` sees live notifications and ack changes
+    on any worker.
+    """
+
+    def apply(self, notification):
+        if notification_store is None:
+            return
+        if notification.get('type') == 'ack':
+            notification_store.set_acknowledged(notification['ids'], notification['acknowledged'])
+        else:
+            notification_store.add({k: v for k, v in notification.items() if k != 'seq'})
+
+    def keyframes(self):
+        return []
+
+# One producer for all connections: each tick generates a single notification
+notifications_broadcaster = Broadcaster(
+    NOTIFICATIONS_GROUP, _produce_notification, NOTIFICATION_INTERVAL, first_delay=NOTIFICATION_INTERVAL,
+    route=route_notification, state=_StoreFeed(),
+)
+
+class NotificationsConsumer(StreamConsumer):
+    broadcaster = notifications_broadcaster
+    log_prefix = "[Notifications WS]"
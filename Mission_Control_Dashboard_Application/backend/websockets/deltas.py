@@ -0,0 +1,81 @@
+"""Field-level delta encoding for entity telemetry on a stream.
+
+``DeltaEncoder`` turns successive full records for an entity into stream
+messages: a keyframe (``{"type": "drone", "payload": <full record>}``) the
+first time an entity is seen and every ``keyframe_every`` records after
+that, and otherwise a delta (``{"type": "drone_delta", "payload": {...}}``)
+holding the id, the timestamp and only the fields that changed since the
+last frame sent for that entity. A record with no changes sends nothing.
+Clients that do not understand deltas still get a full record at every
+keyframe.
+
+``StreamState`` rebuilds the latest full record per entity from those
+messages, so a worker can send a newly connected client a snapshot to apply
+later deltas to.
+"""
+import threading
+
+KEYFRAME_EVERY = 10
+
+
+def delta_type(entity_type):
+    return f"{entity_type}_delta"
+
+
+class DeltaEncoder:
+    def __init__(self, entity_type, keyframe_every=KEYFRAME_EVERY, always=('id', 'timestamp')):
+        self.entity_type = entity_type
+        self.keyframe_every = keyframe_every
+        self.always = always
+        self._last = {}  # id -> last record sent
+        self._since_keyframe = {}
+
+    def encode(self, record):
+        """Message for this record, or None when nothing but the ``always`` fields changed."""
+        entity_id = record['id']
+        last = self._last.get(entity_id)
+        count = self._since_keyframe.get(entity_id, 0) + 1
+        if last is None or count >= self.keyframe_every:
+            self._last[entity_id] = dict(record)
+            self._since_keyframe[entity_id] = 0
+            return {"type": self.entity_type, "payload": dict(record)}
+        self._since_keyframe[entity_id] = count
+        changed = {k: v for k, v in record.items() if k not in self.always and last.get(k) != v}
+        if not changed:
+            return None
+        self._last[entity_id] = dict(record)
+        for k in self.always:
+            changed[k] = record[k]
+        return {"type": delta_type(self.entity_type), "payload": changed}
+
+
+class StreamState:
+    """Latest full record per (entity type, id), rebuilt from keyframes and deltas."""
+
+    def __init__(self, entity_types):
+        self._deltas = {delta_type(t): t for t in entity_types}
+        self._types = set(entity_types)
+        self._latest = {}
+        self._lock = threading.Lock()
+
+    def apply(self, message):
+        kind = message.get("type")
+        payload = message.get("payload")
+        if payload is None or (kind not in self._types and kind not in self._deltas):
+            return
+        with self._lock:
+            if kind in self._types:
+                self._latest[(kind, payload['id'])] = dict(payload)
+                return
+            current = self._latest.get((self._deltas[kind], payload['id']))
+            if current is not None:
+                current.update(payload)
+
+    def latest(self, entity_type, entity_id):
+        with self._lock:
+            record = self._latest.get((entity_type, entity_id))
+            return dict(record) if record is not None else None
+
+    def keyframes(self):
+        with self._lock:
+            return [{"type": kind, "payload": dict(record)} for (kind, _), record in self._latest.items()]
@@ -0,0 +1,337 @@
+"""Channel layer for several daphne workers on one host, without a broker.
+
+Every worker process listens on its own Unix domain socket in a shared
+directory. Process-specific channel names embed the owning process
+(``specific..<pid>-<token>!<local>``), so a send goes straight to that
+process's socket. Group membership lives in the filesystem as empty files,
+``groups/<group>/<channel>``, which every worker can list.
+
+``group_send`` packs the message once, groups the members by process and
+writes one frame per process carrying the list of its member channels;
+the receiving worker unpacks it into each local channel's queue. With the
+per-process broadcast fan-out that means one frame per worker per
+broadcast, whatever the number of sockets.
+
+Frames are length-prefixed MessagePack over persistent stream connections.
+A worker that has died is noticed when its socket refuses a connection; its
+socket file and group entries are removed then.
+
+Limitations: channels without a ``!`` (shared worker channels) are only
+reachable within their own process, and messages sent to a full queue in
+another process are dropped (logged) rather than raising ``ChannelFull``.
+"""
+import asyncio
+import fcntl
+import logging
+import os
+import random
+import string
+import struct
+import time
+
+import msgpack
+from channels.exceptions import ChannelFull
+from channels.layers import BaseChannelLayer
+
+logger = logging.getLogger(__name__)
+
+_HEADER = struct.Struct('>I')
+_LISTING_SETTLE_NS = 20_000_000  # directory mtimes are coarse; re-list very recent changes
+_LOCK_VALUE_WIDTH = 20  # fixed width, so a rewrite never leaves a longer number's tail behind
+
+
+def _token(length=12):
+    return ''.join(random.choice(string.ascii_letters) for _ in range(length))
+
+
+def _pack(message):
+    return msgpack.packb(message, use_bin_type=True)
+
+
+def _unpack(data):
+    return msgpack.unpackb(data, raw=False)
+
+
+class UnixSocketChannelLayer(BaseChannelLayer):
+    extensions = ["groups", "flush"]
+
+    def __init__(self, path='/tmp/mission-control-channels', expiry=60, capacity=100,
+                 channel_capacity=None, **kwargs):
+        super().__init__(expiry=expiry, capacity=capacity, channel_capacity=channel_capacity, **kwargs)
+        self.path = path
+        self.process = f"{os.getpid()}-{_token(6)}"
+        self._procs_dir = os.path.join(path, 'procs')
+        self._groups_dir = os.path.join(path, 'groups')
+        self._locks_dir = os.path.join(path, 'locks')
+        for directory in (self._procs_dir, self._groups_dir, self._locks_dir):
+            os.makedirs(directory, mode=0o700, exist_ok=True)
+        self._socket_path = os.path.join(self._procs_dir, f"{self.process}.sock")
+
+        self.channels = {}
+        self._server = None
+        self._server_loop = None
+        self._peers = {}  # loop -> {process: StreamWriter}
+        self._listings = {}  # group -> (dir mtime_ns, {process: [channels]})
+        self._locks = {}  # name -> descriptor of the file holding the flock
+
+    # Channel layer API
+
+    async def new_channel(self, prefix="specific."):
+        await self._ensure_server()
+        return f"{prefix}.{self.process}!{_token()}"
+
+    async def send(self, channel, message):
+        assert isinstance(message, dict), "message is not a dict"
+        self.require_valid_channel_name(channel)
+        process = self._process_of(channel)
+        if process is None or process == self.process:
+            self._put_local(channel, _pack(message), strict=True)
+        else:
+            await self._send_remote(process, [channel], _pack(message))
+
+    async def receive(self, channel):
+        self.require_valid_channel_name(channel)
+        await self._ensure_server()
+        queue = self._queue(channel)
+        try:
+            return await queue.get()
+        finally:
+            if queue.empty():
+                self.channels.pop(channel, None)
+
+    # Groups extension
+
+    async def group_add(self, group, channel):
+        self.require_valid_group_name(group)
+        self.require_valid_channel_name(channel)
+        directory = os.path.join(self._groups_dir, group)
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        with open(os.path.join(directory, channel), 'a'):
+            pass
+
+    async def group_discard(self, group, channel):
+        self.require_valid_channel_name(channel)
+        self.require_valid_group_name(group)
+        try:
+            os.unlink(os.path.join(self._groups_dir, group, channel))
+        except FileNotFoundError:
+            pass
+
+    async def group_send(self, group, message):
+        assert isinstance(message, dict), "Message is not a dict"
+        self.require_valid_group_name(group)
+        members = self._members(group)
+        if not members:
+            return
+        payload = _pack(message)
+        written = []
+        for process, channels in members.items():
+            if process == self.process:
+                for channel in channels:
+                    self._put_local(channel, payload)
+                continue
+            writer = self._connected(process)
+            if writer is None:
+                await self._send_remote(process, channels, payload)
+            else:
+                # write to every worker first, then wait for the buffers together
+                writer.write(self._frame(channels, payload))
+                written.append((process, writer))
+        for process, writer in written:
+            try:
+                await writer.drain()
+            except ConnectionError:
+                self._peers.get(asyncio.get_running_loop(), {}).pop(process, None)
+                logger.warning("lost connection to worker %s", process)
+
+    # Flush extension
+
+    async def flush(self):
+        for group in os.listdir(self._groups_dir):
+            directory = os.path.join(self._groups_dir, group)
+            for channel in os.listdir(directory):
+                if self._process_of(channel) == self.process:
+                    os.unlink(os.path.join(directory, channel))
+        self.channels = {}
+        self._listings = {}
+
+    async def close(self):
+        for writers in self._peers.values():
+            for writer in writers.values():
+                writer.close()
+        self._peers = {}
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+            try:
+                os.unlink(self._socket_path)
+            except FileNotFoundError:
+                pass
+
+    # Leader locks, so a stream's producer runs in one worker only
+
+    def acquire_lock(self, name):
+        """Takes (or confirms) the host-wide lock ``name`` without blocking."""
+        if name in self._locks:
+            return True
+        fd = os.open(os.path.join(self._locks_dir, f"{name}.lock"), os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        self._locks[name] = fd
+        return True
+
+    def release_lock(self, name):
+        fd = self._locks.pop(name, None)
+        if fd is not None:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+    def lock_value(self, name):
+        """The number the holders of lock ``name`` keep in its file (0 if none); only while holding it."""
+        fd = self._locks.get(name)
+        if fd is None:
+            return 0
+        try:
+            return int(os.pread(fd, _LOCK_VALUE_WIDTH, 0) or 0)
+        except ValueError:
+            return 0
+
+    def set_lock_value(self, name, value):
+        """Records ``value`` in the held lock's file for its next holder; a no-op without the lock."""
+        fd = self._locks.get(name)
+        if fd is not None:
+            os.pwrite(fd, b'%0*d' % (_LOCK_VALUE_WIDTH, value), 0)
+
+    # Internals
+
+    @staticmethod
+    def _process_of(channel):
+        if '!' not in channel:
+            return None
+        return channel.split('!', 1)[0].rsplit('.', 1)[-1]
+
+    def _queue(self, channel):
+        queue = self.channels.get(channel)
+        if queue is None:
+            queue = self.channels[channel] = asyncio.Queue(maxsize=self.get_capacity(channel))
+        return queue
+
+    def _put_local(self, channel, payload, strict=False):
+        loop = self._server_loop
+        if loop is not None and not loop.is_closed():
+            try:
+                running = asyncio.get_running_loop()
+            except RuntimeError:
+                running = None
+            if running is not loop:
+                # queues belong to the receiving loop (e.g. sent from async_to_sync)
+                loop.call_soon_threadsafe(self._put_local, channel, payload)
+                return
+        try:
+            self._queue(channel).put_nowait(_unpack(payload))
+        except asyncio.QueueFull:
+            if strict:
+                raise ChannelFull(channel)
+
+    async def _ensure_server(self):
+        loop = asyncio.get_running_loop()
+        if self._server is not None and self._server_loop is loop:
+            return
+        if self._server is not None and not self._server_loop.is_closed():
+            return  # another loop in this process is already receiving
+        try:
+            os.unlink(self._socket_path)
+        except FileNotFoundError:
+            pass
+        self._server = await asyncio.start_unix_server(self._serve, path=self._socket_path)
+        os.chmod(self._socket_path, 0o600)
+        self._server_loop = loop
+
+    async def _serve(self, reader, writer):
+        try:
+            while True:
+                size, = _HEADER.unpack(await reader.readexactly(_HEADER.size))
+                channels, payload = _unpack(await reader.readexactly(size))
+                for channel in channels:
+                    try:
+                        self._queue(channel).put_nowait(_unpack(payload))
+                    except asyncio.QueueFull:
+                        logger.warning("channel %s is full, dropping message", channel)
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            pass  # peer went away, or this worker is shutting down
+        finally:
+            writer.close()
+
+    @staticmethod
+    def _frame(channels, payload):
+        body = _pack([channels, payload])
+        return _HEADER.pack(len(body)) + body
+
+    def _connected(self, process):
+        """The open connection to a worker from the running loop, if any."""
+        writers = self._peers.get(asyncio.get_running_loop())
+        writer = writers.get(process) if writers else None
+        return writer if writer is not None and not writer.is_closing() else None
+
+    async def _writer_for(self, process):
+        writer = self._connected(process)
+        if writer is None:
+            if len(self._peers) > 1:
+                self._peers = {l: w for l, w in self._peers.items() if not l.is_closed()}
+            path = os.path.join(self._procs_dir, f"{process}.sock")
+            _, writer = await asyncio.open_unix_connection(path)
+            self._peers.setdefault(asyncio.get_running_loop(), {})[process] = writer
+        return writer
+
+    async def _send_remote(self, process, channels, payload):
+        frame = self._frame(channels, payload)
+        for attempt in (0, 1):
+            try:
+                writer = await self._writer_for(process)
+                writer.write(frame)
+                await writer.drain()
+                return
+            except (FileNotFoundError, ConnectionRefusedError):
+                self._forget_process(process)
+                return
+            except ConnectionError:
+                # stale connection to a restarted listener: reconnect once
+                self._peers.get(asyncio.get_running_loop(), {}).pop(process, None)
+        logger.warning("could not deliver to worker %s", process)
+
+    def _forget_process(self, process):
+        """Removes the socket and group entries of a worker that is gone."""
+        logger.info("channel layer worker %s is gone, removing its memberships", process)
+        try:
+            os.unlink(os.path.join(self._procs_dir, f"{process}.sock"))
+        except FileNotFoundError:
+            pass
+        for group in os.listdir(self._groups_dir):
+            directory = os.path.join(self._groups_dir, group)
+            for channel in os.listdir(directory):
+                if self._process_of(channel) == process:
+                    try:
+                        os.unlink(os.path.join(directory, channel))
+                    except FileNotFoundError:
+                        pass
+        self._listings = {}
+
+    def _members(self, group):
+        """Group members by process, re-listed only when the group directory changes."""
+        directory = os.path.join(self._groups_dir, group)
+        try:
+            mtime = os.stat(directory).st_mtime_ns
+        except FileNotFoundError:
+            return {}
+        cached = self._listings.get(group)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        members = {}
+        for channel in os.listdir(directory):
+            members.setdefault(self._process_of(channel) or self.process, []).append(channel)
+        if time.time_ns() - mtime > _LISTING_SETTLE_NS:
+            self._listings[group] = (mtime, members)
+        return members
@@ -0,0 +1,142 @@
+import asyncio
+import json
+import time
+
+from channels.generic.websocket import AsyncWebsocketConsumer
+from channels.layers import get_channel_layer
+from django.core.management.base import BaseCommand
+
+from websockets.broadcast import encode_frame, publish_frame
+from websockets.consumers import fire_tracking
+from websockets.consumers.fire_tracking import FIRE_UPDATES_GROUP, FireTrackingConsumer
+
+BASELINE_GROUP = "bench-per-socket"
+
+
+class _PerSocketConsumer(AsyncWebsocketConsumer):
+    """Baseline: every socket joins the layer group and serializes the message itself."""
+
+    async def connect(self):
+        await self.accept()
+        await self.channel_layer.group_add(BASELINE_GROUP, self.channel_name)
+
+    async def disconnect(self, close_code):
+        await self.channel_layer.group_discard(BASELINE_GROUP, self.channel_name)
+
+    async def fire_legacy(self, event):
+        await self.send(text_data=json.dumps(event["message"]))
+
+
+def _payload(items):
+    fire = {"id": "F-TEST", "lat": 34.12, "lng": -118.40, "intensity": 85,
+            "status": "Critical", "size": 92, "timestamp": int(time.time() * 1000)}
+    if items <= 1:
+        return {"type": "fire", "payload": fire}
+    return {"type": "batch", "items": [{"type": "fire", "payload": dict(fire, id=f"F-{i}")} for i in range(items)]}
+
+
+class _Clients:
+    """N in-process websocket connections driven straight through the consumer's ASGI app."""
+
+    def __init__(self, consumer_class):
+        self.app = consumer_class.as_asgi()
+        self.inboxes = []
+        self.tasks = []
+        self.accepted = 0
+        self.delivered = 0
+        self.target = 0
+        self.done = asyncio.Event()
+
+    async def _send(self, message):
+        if message["type"] == "websocket.accept":
+            self.accepted += 1
+        elif message["type"] == "websocket.send":
+            self.delivered += 1
+            if self.delivered >= self.target:
+                self.done.set()
+
+    async def open(self, n):
+        for _ in range(n):
+            inbox = asyncio.Queue()
+            scope = {"type": "websocket", "path": "/ws/fire-updates/", "headers": [],
+                     "query_string": b"", "subprotocols": []}
+            self.tasks.append(asyncio.create_task(self.app(scope, inbox.get, self._send)))
+            inbox.put_nowait({"type": "websocket.connect"})
+            self.inboxes.append(inbox)
+        while self.accepted < n:
+            await asyncio.sleep(0.01)
+        # let every consumer finish joining the group
+        await asyncio.sleep(0.05)
+
+    async def close(self):
+        for inbox in self.inboxes:
+            inbox.put_nowait({"type": "websocket.disconnect", "code": 1000})
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+
+    def expect(self, count):
+        """Arms the completion event for ``count`` more deliveries; call before publishing."""
+        self.done.clear()
+        self.target = self.delivered + count
+
+
+class Command(BaseCommand):
+    help = ("Measures CPU per broadcast on ws/fire-updates/ as the subscriber count grows. "
+            "With --baseline, also measures the per-socket group membership and encoding path "
+            "(quadratic in subscribers with the in-memory layer, so keep counts small).")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--subscribers', default='10,100,1000,10000',
+                            help='Comma-separated subscriber counts (default: 10,100,1000,10000)')
+        parser.add_argument('--broadcasts', type=int, default=20, help='Broadcasts per measurement')
+        parser.add_argument('--items', type=int, default=1,
+                            help='Fire records per message, to weigh encoding cost (default: 1)')
+        parser.add_argument('--baseline', action='store_true',
+                            help='Also measure per-socket group membership and encoding')
+        parser.add_argument('--json', dest='json_path', help='Also write results to this JSON file')
+
+    def handle(self, *args, **options):
+        counts = [int(c) for c in options['subscribers'].split(',') if c.strip()]
+        results = asyncio.run(self._run(counts, options['broadcasts'], options['items'], options['baseline']))
+        self.stdout.write(f"{'subscribers':>11} {'mode':>10} {'cpu ms/broadcast':>17} {'us/subscriber':>14}")
+        for r in results:
+            self.stdout.write(f"{r['subscribers']:>11} {r['mode']:>10} {r['cpuMsPerBroadcast']:>17.3f} "
+                              f"{r['cpuUsPerSubscriber']:>14.2f}")
+        if options['json_path']:
+            with open(options['json_path'], 'w') as fh:
+                json.dump(results, fh, indent=2)
+
+    async def _run(self, counts, broadcasts, items, baseline):
+        # keep the real producer quiet; the benchmark publishes by hand
+        broadcaster = fire_tracking.fire_broadcaster
+        broadcaster.sources = [(produce, interval, 3600) for produce, interval, _ in broadcaster.sources]
+        layer = get_channel_layer()
+        message = _payload(items)
+        modes = [('shared', FireTrackingConsumer)]
+        if baseline:
+            modes.append(('per-socket', _PerSocketConsumer))
+        results = []
+        for n in counts:
+            # group fan-out in the in-memory layer silently drops on full queues
+            layer.capacity = max(layer.capacity, broadcasts + 10)
+            for mode, consumer_class in modes:
+                clients = _Clients(consumer_class)
+                await clients.open(n)
+                cpu = 0.0
+                for _ in range(broadcasts):
+                    clients.expect(n)
+                    start = time.process_time()
+                    if mode == 'shared':
+                        await publish_frame(FIRE_UPDATES_GROUP, encode_frame(message))
+                    else:
+                        await layer.group_send(BASELINE_GROUP, {"type": "fire.legacy", "message": message})
+                    await clients.done.wait()
+                    cpu += time.process_time() - start
+                await clients.close()
+                results.append({
+                    "subscribers": n,
+                    "mode": mode,
+                    "items": items,
+                    "cpuMsPerBroadcast": cpu / broadcasts * 1000,
+                    "cpuUsPerSubscriber": cpu / broadcasts / n * 1e6,
+                })
+        return results
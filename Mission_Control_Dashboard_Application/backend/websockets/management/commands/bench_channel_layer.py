@@ -0,0 +1,118 @@
+import asyncio
+import json
+import multiprocessing
+import statistics
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+
+from websockets.layers import UnixSocketChannelLayer
+
+GROUP = "bench"
+
+
+def _worker(path, capacity, ready, results):
+    """One worker process: joins the group and counts what arrives until told to stop."""
+
+    async def run():
+        layer = UnixSocketChannelLayer(path=path, capacity=capacity)
+        channel = await layer.new_channel()
+        await layer.group_add(GROUP, channel)
+        ready.put(channel)
+        received = 0
+        flood_done = 0.0
+        latencies = []
+        while True:
+            message = await layer.receive(channel)
+            if message["type"] == "bench.stop":
+                break
+            received += 1
+            if message.get("paced"):
+                latencies.append(time.time() - message["sent"])
+            else:
+                flood_done = time.time()
+        await layer.group_discard(GROUP, channel)
+        await layer.close()
+        results.put({"received": received, "floodDone": flood_done, "latencies": latencies})
+
+    asyncio.run(run())
+
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * pct / 100), len(ordered) - 1)]
+
+
+class Command(BaseCommand):
+    help = ("Measures group_send throughput and latency of the Unix socket channel layer "
+            "across several worker processes on this host.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', default='4,8', help='Comma-separated worker counts (default: 4,8)')
+        parser.add_argument('--messages', type=int, default=20000, help='Messages in the throughput run')
+        parser.add_argument('--paced', type=int, default=500, help='Messages in the latency run, 1 ms apart')
+        parser.add_argument('--json', dest='json_path', help='Also write results to this JSON file')
+
+    def handle(self, *args, **options):
+        counts = [int(c) for c in options['workers'].split(',') if c.strip()]
+        results = [self._measure(n, options['messages'], options['paced']) for n in counts]
+        self.stdout.write(f"{'workers':>7} {'sent msg/s':>11} {'delivered msg/s':>16} "
+                          f"{'p50 ms':>7} {'p99 ms':>7} {'lost':>5}")
+        for r in results:
+            self.stdout.write(f"{r['workers']:>7} {r['sentPerSecond']:>11.0f} {r['deliveredPerSecond']:>16.0f} "
+                              f"{r['latencyP50Ms']:>7.3f} {r['latencyP99Ms']:>7.3f} {r['lost']:>5}")
+        if options['json_path']:
+            with open(options['json_path'], 'w') as fh:
+                json.dump(results, fh, indent=2)
+
+    def _measure(self, workers, messages, paced):
+        ctx = multiprocessing.get_context('fork')
+        with tempfile.TemporaryDirectory(prefix='layer-bench-') as path:
+            capacity = messages + paced + 10
+            ready, results = ctx.Queue(), ctx.Queue()
+            procs = [ctx.Process(target=_worker, args=(path, capacity, ready, results)) for _ in range(workers)]
+            for proc in procs:
+                proc.start()
+            for _ in procs:
+                ready.get(timeout=30)
+
+            started, send_elapsed = asyncio.run(self._publish(path, messages, paced))
+            reports = [results.get(timeout=60) for _ in procs]
+            for proc in procs:
+                proc.join()
+
+        latencies = [lat for r in reports for lat in r["latencies"]]
+        delivered = sum(r["received"] for r in reports)
+        # delivery throughput runs until the last worker has drained the flood
+        drained = max(r["floodDone"] for r in reports) - started
+        return {
+            "workers": workers,
+            "messages": messages,
+            "sentPerSecond": messages / send_elapsed,
+            "deliveredPerSecond": messages * workers / drained,
+            "latencyP50Ms": statistics.median(latencies) * 1000 if latencies else 0.0,
+            "latencyP99Ms": _percentile(latencies, 99) * 1000,
+            "lost": (messages + paced) * workers - delivered,
+        }
+
+    async def _publish(self, path, messages, paced):
+        layer = UnixSocketChannelLayer(path=path)
+        payload = {"type": "fire", "payload": {"id": "F-TEST", "lat": 34.12, "lng": -118.40, "intensity": 85}}
+        frame = json.dumps(payload, separators=(',', ':'))
+
+        started = time.time()
+        start = time.perf_counter()
+        for seq in range(messages):
+            await layer.group_send(GROUP, {"type": "stream.frame", "frame": frame, "meta": {"seq": seq}})
+        send_elapsed = time.perf_counter() - start
+
+        for _ in range(paced):
+            await layer.group_send(GROUP, {"type": "stream.frame", "frame": frame, "paced": True,
+                                           "sent": time.time()})
+            await asyncio.sleep(0.001)
+        await layer.group_send(GROUP, {"type": "bench.stop"})
+        await layer.close()
+        return started, send_elapsed
@@ -0,0 +1,115 @@
+import asyncio
+import json
+import time
+
+from django.core.management.base import BaseCommand
+
+from api import llm
+
+from .run_llm_stub import StubServer
+
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * pct / 100), len(ordered) - 1)]
+
+
+class Command(BaseCommand):
+    help = ("Sends bursts of Fire Warden chat requests through api.llm.LLMClient, against an in-process "
+            "stub service or a running one (--url). Reports queue wait, time to first token, total time "
+            "and how many requests were rejected or expired, per user.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20, help='Distinct users (default: 20)')
+        parser.add_argument('--requests', default='1,5',
+                            help='Comma-separated requests per user sent at once, one run each (default: 1,5)')
+        parser.add_argument('--heavy', type=int, default=0,
+                            help='Extra requests from one user on top of the burst, to check fairness')
+        parser.add_argument('--max-concurrency', type=int, default=llm.MAX_CONCURRENCY,
+                            help=f'Client concurrency limit (default: {llm.MAX_CONCURRENCY})')
+        parser.add_argument('--max-queued-per-user', type=int, default=llm.MAX_QUEUED_PER_USER)
+        parser.add_argument('--timeout', type=float, default=llm.TIMEOUT_SECONDS,
+                            help=f'Deadline per request in seconds (default: {llm.TIMEOUT_SECONDS})')
+        parser.add_argument('--words', type=int, default=40, help='Words per reply (default: 40)')
+        parser.add_argument('--first-token-ms', type=int, default=llm.FIRST_TOKEN_MS)
+        parser.add_argument('--tokens-per-second', type=float, default=llm.TOKENS_PER_SECOND)
+        parser.add_argument('--url', help='A running service, e.g. http://localhost:8081/v1/chat')
+        parser.add_argument('--json', dest='json_path', help='Also write results to this JSON file')
+
+    def handle(self, *args, **options):
+        results = [asyncio.run(self._run(int(n), options)) for n in options['requests'].split(',') if n.strip()]
+        self._report(results)
+        if options['json_path']:
+            with open(options['json_path'], 'w') as fh:
+                json.dump(results, fh, indent=2)
+
+    def _report(self, results):
+        self.stdout.write(f"{'users':>5} {'req/user':>8} {'sent':>5} {'ok':>5} {'busy':>5} {'expired':>7} "
+                          f"{'wait p50/p99 ms':>16} {'ttft p50/p99 ms':>16} {'total p99 ms':>12} "
+                          f"{'heavy ttft p50':>14} {'conns':>5}")
+        for r in results:
+            self.stdout.write(
+                f"{r['users']:>5} {r['perUser']:>8} {r['sent']:>5} {r['completed']:>5} {r['rejected']:>5} "
+                f"{r['expired']:>7} {r['waitP50Ms']:>7.0f}/{r['waitP99Ms']:<8.0f} "
+                f"{r['ttftP50Ms']:>7.0f}/{r['ttftP99Ms']:<8.0f} {r['totalP99Ms']:>12.0f} "
+                f"{r['heavyTtftP50Ms'] if r['heavyTtftP50Ms'] is not None else '-':>14} {r['connections']:>5}")
+
+    async def _run(self, per_user, options):
+        server = None
+        url = options['url']
+        if not url:
+            server = StubServer(options['first_token_ms'], options['tokens_per_second'], max_concurrency=1000)
+            url = f"http://127.0.0.1:{await server.start()}/v1/chat"
+        client = llm.LLMClient(url, max_concurrency=options['max_concurrency'], max_queued=100_000,
+                               max_queued_per_user=max(options['max_queued_per_user'], per_user),
+                               timeout=options['timeout'])
+        draft = " ".join(f"word{i}" for i in range(options['words']))
+        outcomes = []
+
+        async def one(user):
+            start = time.monotonic()
+            ttft = None
+            try:
+                async for _ in client.stream(user, {"message": "status", "draft": draft}):
+                    if ttft is None:
+                        ttft = time.monotonic() - start
+            except llm.QueueFull:
+                outcomes.append((user, "rejected", None, None))
+                return
+            except llm.DeadlineExceeded:
+                outcomes.append((user, "expired", None, None))
+                return
+            outcomes.append((user, "completed", ttft, time.monotonic() - start))
+
+        users = [f"user-{u}" for u in range(options['users'])]
+        jobs = [user for _ in range(per_user) for user in users]
+        # the heavy user's extra requests arrive first, ahead of everyone else's
+        jobs = ["heavy"] * options['heavy'] + jobs
+        if options['heavy']:
+            client.max_queued_per_user = max(client.max_queued_per_user, options['heavy'])
+        await asyncio.gather(*(one(user) for user in jobs))
+        client.close()
+        if server is not None:
+            await server.close()
+
+        done = [o for o in outcomes if o[1] == "completed" and o[0] != "heavy"]
+        heavy = [o[2] for o in outcomes if o[1] == "completed" and o[0] == "heavy"]
+        waits = client.queue_wait.summary()
+        return {
+            "users": options['users'],
+            "perUser": per_user,
+            "sent": len(jobs),
+            "completed": sum(1 for o in outcomes if o[1] == "completed"),
+            "rejected": sum(1 for o in outcomes if o[1] == "rejected"),
+            "expired": sum(1 for o in outcomes if o[1] == "expired"),
+            "waitP50Ms": waits.get("p50Ms", 0.0),
+            "waitP99Ms": waits.get("p99Ms", 0.0),
+            "ttftP50Ms": _percentile([o[2] for o in done], 50) * 1000,
+            "ttftP99Ms": _percentile([o[2] for o in done], 99) * 1000,
+            "totalP99Ms": _percentile([o[3] for o in done], 99) * 1000,
+            "heavyTtftP50Ms": round(_percentile(heavy, 50) * 1000) if heavy else None,
+            "connections": client.counts["connections"],
+            "serverPeak": server.peak if server is not None else None,
+        }
@@ -0,0 +1,366 @@
+import asyncio
+import base64
+import contextlib
+import io
+import json
+import os
+import struct
+import time
+from urllib.parse import urlparse
+
+import msgpack
+from django.core.management.base import BaseCommand
+
+from websockets.broadcast import publish_frame
+from websockets.consumers import fire_tracking, notifications
+
+STREAMS = {
+    "fire": "/ws/fire-updates/",
+    "notifications": "/ws/notifications/",
+}
+
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * pct / 100), len(ordered) - 1)]
+
+
+def _process_usage(pid):
+    """(CPU seconds, resident bytes) of a process, read from /proc."""
+    if pid == os.getpid():
+        cpu = time.process_time()  # finer than the clock ticks in /proc
+    else:
+        with open(f"/proc/{pid}/stat") as fh:
+            fields = fh.read().rsplit(')', 1)[1].split()
+        cpu = (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+    with open(f"/proc/{pid}/statm") as fh:
+        rss = int(fh.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    return cpu, rss
+
+
+def _decode(data):
+    if isinstance(data, bytes):
+        return msgpack.unpackb(data, raw=False)
+    return json.loads(data)
+
+
+def _items(message):
+    """Stream frames in a received message: a batch's items, a snapshot's none."""
+    kind = message.get("type")
+    if kind == "batch":
+        return message["items"]
+    if kind in ("snapshot", "resync", "subscribed", "error"):
+        return []
+    return [message]
+
+
+def _seqs(data):
+    """Sequence numbers of the frames in a received message, without decoding plain frames."""
+    if isinstance(data, str) and not data.startswith('{"type":"batch"'):
+        at = data.rfind('"seq":')
+        try:
+            return [int(data[at + 6:-1])] if at >= 0 else []
+        except ValueError:
+            return []  # a control message
+    return [item.get("seq") for item in _items(_decode(data))]
+
+
+def _timestamps(data):
+    """Millisecond timestamps (as seconds) of the frames in a received message."""
+    stamps = []
+    for item in _items(_decode(data)):
+        record = item.get("payload", item)
+        timestamp = record.get("timestamp") if isinstance(record, dict) else None
+        if isinstance(timestamp, (int, float)):
+            stamps.append(timestamp / 1000.0)
+    return stamps
+
+
+class _Stats:
+    """Connect and delivery timings collected from every simulated client."""
+
+    def __init__(self):
+        self.connect = []
+        self.latencies = []
+        self.delivered = 0
+        self.closed = 0
+
+    def frames(self, sent, received):
+        """Records one delivery per frame, dated by when each was sent."""
+        self.delivered += len(sent)
+        self.latencies.extend(received - at for at in sent)
+
+
+class _InProcessClients:
+    """Simulated sockets driven straight through ``mission_control.asgi.application``."""
+
+    def __init__(self, application, stats, query, sent_at):
+        self.application = application
+        self.stats = stats
+        self.query = query.encode()
+        self.sent_at = sent_at
+        self.inboxes = []
+        self.tasks = []
+
+    async def open(self, paths, concurrency):
+        gate = asyncio.Semaphore(concurrency)
+        await asyncio.gather(*(self._open(path, gate) for path in paths))
+
+    async def _open(self, path, gate):
+        async with gate:
+            accepted = asyncio.get_running_loop().create_future()
+            started = time.perf_counter()
+            stats, sent_at = self.stats, self.sent_at
+
+            async def send(message):
+                if message["type"] == "websocket.send":
+                    data = message.get("text")
+                    stats.frames(sent_at(path, data if data is not None else message["bytes"]),
+                                 time.perf_counter())
+                elif message["type"] == "websocket.accept":
+                    stats.connect.append(time.perf_counter() - started)
+                    accepted.set_result(None)
+                elif message["type"] == "websocket.close":
+                    stats.closed += 1
+                    if not accepted.done():
+                        accepted.set_result(None)
+
+            inbox = asyncio.Queue()
+            scope = {"type": "websocket", "path": path, "raw_path": path.encode(), "headers": [],
+                     "query_string": self.query, "subprotocols": [], "client": ("127.0.0.1", 0),
+                     "server": ("127.0.0.1", 8000)}
+            inbox.put_nowait({"type": "websocket.connect"})
+            self.inboxes.append(inbox)
+            self.tasks.append(asyncio.create_task(self.application(scope, inbox.get, send)))
+            await accepted
+
+    async def close(self):
+        for inbox in self.inboxes:
+            inbox.put_nowait({"type": "websocket.disconnect", "code": 1000})
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+
+
+class _RemoteClients:
+    """Simulated sockets connected to a running daphne over TCP.
+
+    A minimal RFC 6455 client (no extensions), so thousands of sockets cost
+    little on the load generator's side.
+    """
+
+    def __init__(self, url, stats, query):
+        parsed = urlparse(url)
+        self.host = parsed.hostname
+        self.port = parsed.port or 80
+        self.prefix = parsed.path.rstrip('/')
+        self.query = query
+        self.stats = stats
+        self.writers = []
+        self.readers = []
+
+    async def open(self, paths, concurrency):
+        gate = asyncio.Semaphore(concurrency)
+        await asyncio.gather(*(self._open(path, gate) for path in paths))
+
+    async def _open(self, path, gate):
+        async with gate:
+            started = time.perf_counter()
+            target = f"{self.prefix}{path}" + (f"?{self.query}" if self.query else "")
+            try:
+                reader, writer = await asyncio.open_connection(self.host, self.port)
+                key = base64.b64encode(os.urandom(16)).decode()
+                writer.write((f"GET {target} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\n"
+                              f"Upgrade: websocket\r\nConnection: Upgrade\r\nSec-WebSocket-Key: {key}\r\n"
+                              f"Sec-WebSocket-Version: 13\r\nOrigin: http://{self.host}\r\n\r\n").encode())
+                response = await reader.readuntil(b"\r\n\r\n")
+            except (OSError, asyncio.IncompleteReadError):
+                self.stats.closed += 1
+                return
+            if not response.startswith(b"HTTP/1.1 101"):
+                self.stats.closed += 1
+                writer.close()
+                return
+            self.stats.connect.append(time.perf_counter() - started)
+            self.writers.append(writer)
+            self.readers.append(asyncio.create_task(self._read(reader)))
+
+    async def _read(self, reader):
+        try:
+            while True:
+                head = await reader.readexactly(2)
+                opcode, length = head[0] & 0x0F, head[1] & 0x7F
+                if length == 126:
+                    length, = struct.unpack('>H', await reader.readexactly(2))
+                elif length == 127:
+                    length, = struct.unpack('>Q', await reader.readexactly(8))
+                payload = await reader.readexactly(length)
+                if opcode == 0x8:
+                    break
+                if opcode in (0x1, 0x2):
+                    data = payload.decode() if opcode == 0x1 else payload
+                    self.stats.frames(_timestamps(data), time.time())
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        self.stats.closed += 1
+
+    async def close(self):
+        mask = os.urandom(4)
+        code = bytes(b ^ mask[i % 4] for i, b in enumerate(struct.pack('>H', 1000)))
+        for writer in self.writers:
+            writer.write(b"\x88\x82" + mask + code)
+        await asyncio.sleep(0.5)
+        for writer in self.writers:
+            writer.close()
+        for task in self.readers:
+            task.cancel()
+        await asyncio.gather(*self.readers, return_exceptions=True)
+
+
+class Command(BaseCommand):
+    help = ("Load-tests the websocket streams with thousands of simulated clients, either in-process "
+            "against mission_control.asgi.application or against a running daphne (--url). Reports "
+            "connect latency, delivery latency percentiles, and server CPU and memory per connection.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', default='1000,5000',
+                            help='Comma-separated client counts, one run each (default: 1000,5000)')
+        parser.add_argument('--streams', default='fire,notifications',
+                            help='Streams to spread clients over (default: fire,notifications)')
+        parser.add_argument('--query', default='', help='Query string for every socket, e.g. "batch=200"')
+        parser.add_argument('--frames', type=int, default=50,
+                            help='In-process: frames published per stream (default: 50)')
+        parser.add_argument('--rate', type=float, default=10.0,
+                            help='In-process: frames per second per stream (default: 10)')
+        parser.add_argument('--concurrency', type=int, default=200, help='Connections opened at once')
+        parser.add_argument('--url', help='Base URL of a running server, e.g. ws://localhost:8000')
+        parser.add_argument('--pid', type=int, help='With --url: server process to read CPU and memory from')
+        parser.add_argument('--duration', type=float, default=30.0,
+                            help='With --url: seconds to listen to the live streams (default: 30)')
+        parser.add_argument('--json', dest='json_path', help='Also write results to this JSON file')
+
+    def handle(self, *args, **options):
+        counts = [int(c) for c in options['clients'].split(',') if c.strip()]
+        streams = [s.strip() for s in options['streams'].split(',') if s.strip()]
+        unknown = set(streams) - set(STREAMS)
+        if unknown:
+            self.stderr.write(f"Unknown stream(s): {', '.join(sorted(unknown))}")
+            return
+        if options['url']:
+            runner = self._remote
+        else:
+            runner = self._in_process
+        results = []
+        for n in counts:
+            # consumers print a line per connect; keep the report readable
+            with contextlib.redirect_stdout(io.StringIO()):
+                results.append(asyncio.run(runner(n, streams, options)))
+        self._report(results)
+        if options['json_path']:
+            with open(options['json_path'], 'w') as fh:
+                json.dump(results, fh, indent=2)
+
+    def _report(self, results):
+        self.stdout.write(f"{'mode':>10} {'clients':>7} {'connect p50/p99 ms':>19} "
+                          f"{'delivery p50/p90/p99/max ms':>28} {'delivered':>12} "
+                          f"{'CPU ms/conn':>11} {'CPU us/frame':>12} {'KiB/conn':>9}")
+        for r in results:
+            connect = f"{r['connectP50Ms']:.2f}/{r['connectP99Ms']:.2f}"
+            delivery = (f"{r['deliveryP50Ms']:.2f}/{r['deliveryP90Ms']:.2f}/"
+                        f"{r['deliveryP99Ms']:.2f}/{r['deliveryMaxMs']:.2f}")
+            delivered = f"{r['delivered']}/{r['expected']}" if r['expected'] else str(r['delivered'])
+            self.stdout.write(f"{r['mode']:>10} {r['clients']:>7} {connect:>19} {delivery:>28} {delivered:>12} "
+                              f"{r['cpuMsPerConnection']:>11.3f} {r['cpuUsPerDelivery']:>12.2f} "
+                              f"{r['rssKiBPerConnection']:>9.1f}")
+
+    @staticmethod
+    def _paths(n, streams):
+        return [STREAMS[streams[i % len(streams)]] for i in range(n)]
+
+    async def _in_process(self, n, streams, options):
+        from mission_control.asgi import application
+
+        broadcasters = {"fire": fire_tracking.fire_broadcaster,
+                        "notifications": notifications.notifications_broadcaster}
+        # keep the real producers quiet; the load test publishes by hand
+        for broadcaster in broadcasters.values():
+            broadcaster.sources = [(produce, interval, 3600) for produce, interval, _ in broadcaster.sources]
+
+        sent = {}  # (path, seq) -> perf_counter at publish
+
+        def sent_at(path, data):
+            return [sent[(path, seq)] for seq in _seqs(data) if (path, seq) in sent]
+
+        stats = _Stats()
+        clients = _InProcessClients(application, stats, options['query'], sent_at)
+        pid = os.getpid()
+        cpu0, rss0 = _process_usage(pid)
+        await clients.open(self._paths(n, streams), options['concurrency'])
+        # accept comes before the subscription completes
+        for _ in range(100):
+            if sum(broadcasters[s].subscribers for s in streams) >= n - stats.closed:
+                break
+            await asyncio.sleep(0.01)
+        cpu1, rss1 = _process_usage(pid)
+
+        expected = (n - stats.closed) * options['frames']
+        interval = 1.0 / options['rate']
+        for i in range(options['frames']):
+            for stream in streams:
+                await self._publish(broadcasters[stream], stream, i, sent)
+            await asyncio.sleep(interval)
+        deadline = time.monotonic() + 30
+        while stats.delivered < expected and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        cpu2, _ = _process_usage(pid)
+        await clients.close()
+        return self._result("in-process", n, stats, expected, cpu1 - cpu0, cpu2 - cpu1, rss1 - rss0)
+
+    @staticmethod
+    async def _publish(broadcaster, stream, i, sent):
+        now_ms = int(time.time() * 1000)
+        if stream == "fire":
+            message = {"type": "fire", "payload": {
+                "id": f"F-LOAD-{i % 100}", "lat": 34.12, "lng": -118.40, "intensity": 50,
+                "status": "Active", "size": 60, "timestamp": now_ms}}
+        else:
+            message = {"id": f"LOAD-{i}", "severity": "info", "title": "Load test notification",
+                       "message": "Synthetic notification from loadtest_websockets.", "timestamp": now_ms,
+                       "source": "Load Test", "acknowledged": False, "labels": ["Maintenance"]}
+        frame, meta = broadcaster.stamp(message)
+        sent[(STREAMS[stream], meta["seq"])] = time.perf_counter()
+        await publish_frame(broadcaster.group, frame, meta)
+
+    async def _remote(self, n, streams, options):
+        # live frames are dated by their own millisecond timestamps
+        stats = _Stats()
+        clients = _RemoteClients(options['url'], stats, options['query'])
+        pid = options['pid']
+        cpu0, rss0 = _process_usage(pid) if pid else (0.0, 0)
+        await clients.open(self._paths(n, streams), options['concurrency'])
+        cpu1, rss1 = _process_usage(pid) if pid else (0.0, 0)
+        await asyncio.sleep(options['duration'])
+        cpu2, _ = _process_usage(pid) if pid else (0.0, 0)
+        await clients.close()
+        return self._result("remote", n, stats, 0, cpu1 - cpu0, cpu2 - cpu1, rss1 - rss0)
+
+    @staticmethod
+    def _result(mode, n, stats, expected, connect_cpu, delivery_cpu, rss):
+        connected = len(stats.connect)
+        return {
+            "mode": mode,
+            "clients": n,
+            "connected": connected,
+            "closedEarly": stats.closed,
+            "connectP50Ms": _percentile(stats.connect, 50) * 1000,
+            "connectP99Ms": _percentile(stats.connect, 99) * 1000,
+            "deliveryP50Ms": _percentile(stats.latencies, 50) * 1000,
+            "deliveryP90Ms": _percentile(stats.latencies, 90) * 1000,
+            "deliveryP99Ms": _percentile(stats.latencies, 99) * 1000,
+            "deliveryMaxMs": max(stats.latencies, default=0.0) * 1000,
+            "delivered": stats.delivered,
+            "expected": expected,
+            "cpuMsPerConnection": connect_cpu / connected * 1000 if connected else 0.0,
+            "cpuUsPerDelivery": delivery_cpu / stats.delivered * 1e6 if stats.delivered else 0.0,
+            "rssKiBPerConnection": rss / connected / 1024 if connected else 0.0,
+        }
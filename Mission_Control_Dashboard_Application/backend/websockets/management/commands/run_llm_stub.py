@@ -0,0 +1,148 @@
+import asyncio
+import json
+import time
+
+from django.core.management.base import BaseCommand
+
+from api import llm
+
+DEFAULT_REPLY = ("Fire Warden stub reply: conditions are being monitored and crews are positioned "
+                 "according to the current priority list. Check the dashboard for live updates.")
+
+
+class StubServer:
+    """Local stand-in for the Fire Warden LLM service (the protocol ``api.llm.LLMClient`` speaks).
+
+    Streams the request's ``draft`` (or a canned reply) as chunked JSON
+    lines at model-like pacing over keep-alive HTTP/1.1 connections. It
+    generates at most ``max_concurrency`` replies at once and answers 503
+    beyond that, stops at the ``X-Deadline-Ms`` the client sent, and counts
+    the replies whose client went away mid-stream.
+    """
+
+    def __init__(self, first_token_ms=llm.FIRST_TOKEN_MS, tokens_per_second=llm.TOKENS_PER_SECOND,
+                 max_concurrency=64):
+        self.first_token_ms = first_token_ms
+        self.tokens_per_second = tokens_per_second
+        self.max_concurrency = max_concurrency
+        self.active = 0
+        self.peak = 0
+        self.counts = {"connections": 0, "requests": 0, "completed": 0, "rejected": 0, "abandoned": 0,
+                       "expired": 0}
+        self._server = None
+
+    async def start(self, host='127.0.0.1', port=0):
+        self._server = await asyncio.start_server(self._serve, host, port)
+        return self._server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def _serve(self, reader, writer):
+        self.counts["connections"] += 1
+        try:
+            while True:
+                request = await self._request(reader)
+                if request is None:
+                    break
+                if not await self._respond(writer, *request):
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except asyncio.CancelledError:
+            pass  # shutting down; end quietly rather than as a failed connection callback
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _request(reader):
+        line = await reader.readline()
+        if not line:
+            return None
+        headers = {}
+        while True:
+            header = await reader.readline()
+            if header in (b'\r\n', b''):
+                break
+            name, _, value = header.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        body = await reader.readexactly(int(headers.get('content-length', 0)))
+        return headers, body
+
+    async def _respond(self, writer, headers, body):
+        self.counts["requests"] += 1
+        try:
+            payload = json.loads(body or b'{}')
+        except ValueError:
+            return self._status(writer, 400, "invalid JSON")
+        if self.active >= self.max_concurrency:
+            self.counts["rejected"] += 1
+            return self._status(writer, 503, "overloaded")
+        deadline = time.monotonic() + int(headers.get('x-deadline-ms', 60_000)) / 1000.0
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson\r\n"
+                         b"Transfer-Encoding: chunked\r\n\r\n")
+            text = payload.get('draft') or DEFAULT_REPLY
+            async for token in llm.stub_tokens(text, self.first_token_ms, self.tokens_per_second):
+                if time.monotonic() >= deadline:
+                    self.counts["expired"] += 1
+                    self._chunk(writer, {"error": "deadline exceeded"})
+                    break
+                self._chunk(writer, {"token": token})
+                await writer.drain()
+            else:
+                self._chunk(writer, {"done": True})
+                self.counts["completed"] += 1
+            writer.write(b"0\r\n\r\n")
+            await writer.drain()
+            return True
+        except ConnectionError:
+            self.counts["abandoned"] += 1
+            return False
+        finally:
+            self.active -= 1
+
+    @staticmethod
+    def _chunk(writer, message):
+        if writer.is_closing():
+            raise ConnectionResetError("client went away")
+        data = json.dumps(message).encode() + b'\n'
+        writer.write(b'%x\r\n%s\r\n' % (len(data), data))
+
+    @staticmethod
+    def _status(writer, code, reason):
+        body = json.dumps({"error": reason}).encode()
+        writer.write(f"HTTP/1.1 {code} {reason}\r\nContent-Type: application/json\r\n"
+                     f"Content-Length: {len(body)}\r\n\r\n".encode() + body)
+        return True
+
+
+class Command(BaseCommand):
+    help = ("Serves a local stand-in for the Fire Warden LLM service, for offline development and "
+            "load testing. Point FIRE_WARDEN_LLM['URL'] at http://<host>:<port>/v1/chat.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8081)
+        parser.add_argument('--first-token-ms', type=int, default=llm.FIRST_TOKEN_MS,
+                            help=f'Delay before the first token (default: {llm.FIRST_TOKEN_MS})')
+        parser.add_argument('--tokens-per-second', type=float, default=llm.TOKENS_PER_SECOND,
+                            help=f'Generation speed per reply (default: {llm.TOKENS_PER_SECOND})')
+        parser.add_argument('--max-concurrency', type=int, default=64,
+                            help='Replies generated at once before answering 503 (default: 64)')
+
+    def handle(self, *args, **options):
+        server = StubServer(options['first_token_ms'], options['tokens_per_second'], options['max_concurrency'])
+
+        async def run():
+            port = await server.start(options['host'], options['port'])
+            self.stdout.write(f"LLM stub listening on http://{options['host']}:{port}/v1/chat")
+            await asyncio.Event().wait()
+
+        try:
+            asyncio.run(run())
+        except KeyboardInterrupt:
+            self.stdout.write(f"Stopped: {server.counts}")
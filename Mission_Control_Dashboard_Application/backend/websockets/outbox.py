@@ -0,0 +1,188 @@
+"""Bounded per-connection outbound queues.
+
+The fan-out never awaits a client: it drops each frame into the
+connection's ``Outbox`` and a writer task per connection drains it, so a
+stalled socket only delays itself.
+
+- Telemetry frames are keyed by entity id: a newer frame for an entity
+  replaces the one still queued (and moves to the back, keeping ``seq``
+  ascending), so a slow client catches up on the latest state.
+- Delta frames (``meta["delta"]``, see ``websockets.deltas``) only make
+  sense in sequence, so they are never coalesced; they can still be dropped,
+  and the entity's next keyframe repairs the client's state.
+- Beyond ``MAX_FRAMES`` the oldest telemetry frame is dropped.
+- Notifications are never coalesced or dropped; a client that falls more
+  than ``MAX_LAG_SECONDS`` behind, or whose queue is full of frames that
+  cannot be dropped, is disconnected instead and can resume from its last
+  ``seq``.
+
+With a ``batch_window`` the writer instead waits that long after the first
+queued frame and sends everything queued as one ``batch`` frame; a
+critical-severity frame flushes the batch immediately.
+"""
+import asyncio
+import itertools
+import logging
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .broadcast import encode_batch, encode_binary_batch
+
+logger = logging.getLogger(__name__)
+
+_config = getattr(settings, 'WEBSOCKET_OUTBOX', {})
+MAX_FRAMES = _config.get('MAX_FRAMES', 256)
+MAX_LAG_SECONDS = _config.get('MAX_LAG_SECONDS', 15)
+BATCH_WINDOW_MS = _config.get('BATCH_WINDOW_MS', 200)
+
+SLOW_CLIENT_CLOSE_CODE = 4008
+
+_unique = itertools.count()
+
+# process-wide counters, read with metrics()
+_open = set()
+_coalesced = 0
+_dropped = 0
+_slow_disconnects = 0
+_max_depth = 0
+
+
+def metrics():
+    """Queue depth and drop counters across this process's connections."""
+    depths = [outbox.depth for outbox in _open]
+    return {
+        "connections": len(depths),
+        "queuedFrames": sum(depths),
+        "deepestQueue": max(depths, default=0),
+        "maxDepthSeen": _max_depth,
+        "coalescedFrames": _coalesced,
+        "droppedFrames": _dropped,
+        "slowDisconnects": _slow_disconnects,
+    }
+
+
+class Outbox:
+    def __init__(self, send, close, coalesce, max_frames=MAX_FRAMES, max_lag=MAX_LAG_SECONDS, batch_window=None,
+                 clock=time.monotonic):
+        self._send = send
+        self._close = close
+        self.coalesce = coalesce
+        self.max_frames = max_frames
+        self.max_lag = max_lag
+        self.batch_window = batch_window  # seconds, or None to send frames one by one
+        self._clock = clock
+        self._frames = OrderedDict()  # key -> (frame, queued_at, droppable)
+        self._waiter = None
+        self._urgent = False
+        self._writer = None
+        self.closed = False
+        self.dropped = 0
+
+    @property
+    def depth(self):
+        return len(self._frames)
+
+    def start(self):
+        _open.add(self)
+        self._writer = asyncio.create_task(self._drain())
+
+    async def stop(self):
+        _open.discard(self)
+        self.closed = True
+        if self._writer is not None:
+            self._writer.cancel()
+            try:
+                await self._writer
+            except asyncio.CancelledError:
+                pass
+            self._writer = None
+        self._frames.clear()
+
+    def put(self, frame, meta=None):
+        """Queues a frame without waiting; never blocks the caller."""
+        global _coalesced, _dropped, _max_depth
+        if self.closed:
+            return
+        frames = self._frames
+        now = self._clock()
+        entity = meta.get('id') if self.coalesce and meta else None
+        if entity is None:
+            frames[next(_unique)] = (frame, now, False)
+        elif meta.get('delta'):
+            frames[('delta', entity, next(_unique))] = (frame, now, True)
+        else:
+            key = ('entity', entity)
+            if key in frames:
+                # the deltas queued since that keyframe are superseded as well
+                stale = [k for k in frames if isinstance(k, tuple) and k[1] == entity]
+                for k in stale:
+                    del frames[k]
+                self.dropped += len(stale)
+                _coalesced += len(stale)
+            frames[key] = (frame, now, True)
+
+        if self.batch_window is not None and meta and meta.get('severity') == 'critical':
+            self._urgent = True
+            self._wake()
+
+        depth = len(frames)
+        if depth == 1:
+            self._wake()
+            return
+        if depth > self.max_frames:
+            for old_key, (_, _, droppable) in frames.items():
+                if droppable:
+                    del frames[old_key]
+                    self.dropped += 1
+                    _dropped += 1
+                    depth -= 1
+                    break
+        if depth > _max_depth:
+            _max_depth = depth
+        _, oldest, _ = next(iter(frames.values()))
+        if depth > self.max_frames or now - oldest > self.max_lag:
+            # only undroppable frames left, or too far behind: let the client resume instead
+            self._disconnect_slow()
+
+    def _wake(self):
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+
+    def _disconnect_slow(self):
+        global _slow_disconnects
+        _slow_disconnects += 1
+        logger.warning("disconnecting slow websocket client: %d frames queued", len(self._frames))
+        _open.discard(self)
+        self.closed = True
+        self._frames.clear()
+        if self._writer is not None:
+            self._writer.cancel()
+        asyncio.get_running_loop().create_task(self._close(SLOW_CLIENT_CLOSE_CODE))
+
+    async def _drain(self):
+        frames = self._frames
+        loop = asyncio.get_running_loop()
+        while True:
+            if not frames:
+                self._waiter = loop.create_future()
+                await self._waiter
+                continue
+            if self.batch_window is None:
+                _, (frame, _, _) = frames.popitem(last=False)
+                await self._send(frame)
+                continue
+            if not self._urgent:
+                _, first_at, _ = next(iter(frames.values()))
+                delay = first_at + self.batch_window - self._clock()
+                if delay > 0:
+                    self._waiter = loop.create_future()
+                    timer = loop.call_later(delay, self._wake)
+                    await self._waiter
+                    timer.cancel()
+                    continue
+            self._urgent = False
+            batch = [frame for frame, _, _ in frames.values()]
+            frames.clear()
+            await self._send(encode_binary_batch(batch) if isinstance(batch[0], bytes) else encode_batch(batch))
@@ -1,7 +1,8 @@
 from django.urls import path
-from .consumers import FireTrackingConsumer, NotificationsConsumer
+from .consumers import FireTrackingConsumer, FireWardenConsumer, NotificationsConsumer
 
 websocket_urlpatterns = [
     path('ws/fire-updates/', FireTrackingConsumer.as_asgi()),
     path('ws/notifications/', NotificationsConsumer.as_asgi()),
+    path('ws/fire-warden/', FireWardenConsumer.as_asgi()),
 ]
\ No newline at end of file
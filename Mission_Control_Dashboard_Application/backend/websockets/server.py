@@ -0,0 +1,41 @@
+"""Daphne server that negotiates permessage-deflate on websocket connections.
+
+Clients that offer the extension (browsers do by default) get every frame
+deflated, which pays off on satellite links where bandwidth per update is
+the bottleneck. Enabled for ``python manage.py runserver`` when
+``settings.WEBSOCKET_PERMESSAGE_DEFLATE`` is set (see ``WebsocketsConfig``);
+in deployment run daphne through this module with the usual arguments::
+
+    python -m websockets.server -b 0.0.0.0 -p 8000 mission_control.asgi:application
+"""
+from autobahn.websocket.compress import PerMessageDeflateOffer, PerMessageDeflateOfferAccept
+from daphne.cli import CommandLineInterface
+from daphne.server import Server
+
+
+def accept_deflate(offers):
+    """Accepts the client's first permessage-deflate offer, if it made one."""
+    for offer in offers:
+        if isinstance(offer, PerMessageDeflateOffer):
+            return PerMessageDeflateOfferAccept(offer)
+    return None
+
+
+class DeflateServer(Server):
+    # Server.run() builds the websocket factory itself; configure it as it is assigned
+    @property
+    def ws_factory(self):
+        return self._ws_factory
+
+    @ws_factory.setter
+    def ws_factory(self, factory):
+        factory.setProtocolOptions(perMessageCompressionAccept=accept_deflate)
+        self._ws_factory = factory
+
+
+class DeflateCommandLineInterface(CommandLineInterface):
+    server_class = DeflateServer
+
+
+if __name__ == "__main__":
+    DeflateCommandLineInterface.entrypoint()
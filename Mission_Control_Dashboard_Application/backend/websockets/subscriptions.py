@@ -0,0 +1,198 @@
+"""Per-connection subscription filters and the index that routes events to them.
+
+A client narrows its stream by sending::
+
+    {"type": "subscribe", "bbox": [minLat, minLng, maxLat, maxLng],
+     "ids": ["F-1"], "minSeverity": "high", "labels": ["Safety"]}
+
+All given criteria must match; a criterion on an attribute the event does
+not carry (e.g. a bbox against a notification without a position) excludes
+the event. An empty subscribe message clears the filter.
+
+Each filtered connection is indexed under its most selective criterion only
+(ids, then bbox grid cells, then labels, then severity). An event collects
+candidates from the buckets for its own id, grid cell, labels and severity,
+plus the unfiltered connections, and only those candidates are checked
+against their full filter, so routing cost follows the number of matches
+rather than the number of connections. Events routed with ``{"all": True}``
+(stream control messages such as acknowledgements) go to every connection.
+"""
+import math
+
+SEVERITIES = ['info', 'low', 'medium', 'high', 'critical']
+SEVERITY_RANK = {s: i for i, s in enumerate(SEVERITIES)}
+
+CELL_DEG = 0.05  # roughly 5 km grid cells
+MAX_INDEXED_CELLS = 4096  # larger boxes go to the wide list
+
+
+class FilterError(ValueError):
+    pass
+
+
+def _cell(lat, lng):
+    return int(math.floor(lat / CELL_DEG)), int(math.floor(lng / CELL_DEG))
+
+
+class Filter:
+    __slots__ = ('ids', 'bbox', 'min_rank', 'labels')
+
+    def __init__(self, ids=None, bbox=None, min_rank=None, labels=None):
+        self.ids = ids
+        self.bbox = bbox
+        self.min_rank = min_rank
+        self.labels = labels
+
+    @classmethod
+    def parse(cls, data):
+        """Builds a filter from a subscribe message; None when it has no criteria."""
+        ids = data.get('ids')
+        if ids is not None:
+            if not isinstance(ids, list) or not all(isinstance(i, (str, int)) for i in ids):
+                raise FilterError("ids must be a list of entity ids")
+            ids = frozenset(str(i) for i in ids) or None
+
+        bbox = data.get('bbox')
+        if bbox is not None:
+            try:
+                min_lat, min_lng, max_lat, max_lng = (float(v) for v in bbox)
+            except (TypeError, ValueError, OverflowError):
+                raise FilterError("bbox must be [minLat, minLng, maxLat, maxLng]")
+            if not all(math.isfinite(v) for v in (min_lat, min_lng, max_lat, max_lng)):
+                raise FilterError("bbox values must be finite numbers")
+            if min_lat > max_lat or min_lng > max_lng:
+                raise FilterError("bbox minimums must not exceed maximums")
+            bbox = (min_lat, min_lng, max_lat, max_lng)
+
+        min_rank = None
+        severity = data.get('minSeverity')
+        if severity is not None:
+            if severity not in SEVERITY_RANK:
+                raise FilterError(f"minSeverity must be one of {', '.join(SEVERITIES)}")
+            min_rank = SEVERITY_RANK[severity]
+
+        labels = data.get('labels')
+        if labels is not None:
+            if not isinstance(labels, list) or not all(isinstance(l, str) for l in labels):
+                raise FilterError("labels must be a list of strings")
+            labels = frozenset(labels) or None
+
+        if ids is None and bbox is None and min_rank is None and labels is None:
+            return None
+        return cls(ids, bbox, min_rank, labels)
+
+    def to_dict(self):
+        result = {}
+        if self.ids is not None:
+            result['ids'] = sorted(self.ids)
+        if self.bbox is not None:
+            result['bbox'] = list(self.bbox)
+        if self.min_rank is not None:
+            result['minSeverity'] = SEVERITIES[self.min_rank]
+        if self.labels is not None:
+            result['labels'] = sorted(self.labels)
+        return result
+
+    def matches(self, meta):
+        if self.ids is not None and meta.get('id') not in self.ids:
+            return False
+        if self.bbox is not None:
+            lat, lng = meta.get('lat'), meta.get('lng')
+            if lat is None or lng is None:
+                return False
+            min_lat, min_lng, max_lat, max_lng = self.bbox
+            if not (min_lat <= lat <= max_lat and min_lng <= lng <= max_lng):
+                return False
+        if self.min_rank is not None and SEVERITY_RANK.get(meta.get('severity'), -1) < self.min_rank:
+            return False
+        if self.labels is not None and self.labels.isdisjoint(meta.get('labels') or ()):
+            return False
+        return True
+
+    def cells(self):
+        """Grid cells covered by the bbox, or None if there are too many to index."""
+        min_lat, min_lng, max_lat, max_lng = self.bbox
+        r0, c0 = _cell(min_lat, min_lng)
+        r1, c1 = _cell(max_lat, max_lng)
+        if (r1 - r0 + 1) * (c1 - c0 + 1) > MAX_INDEXED_CELLS:
+            return None
+        return [(r, c) for r in range(r0, r1 + 1) for c in range(c0, c1 + 1)]
+
+
+class SubscriptionIndex:
+    """Subscribers and their filters, bucketed by each filter's most selective criterion."""
+
+    def __init__(self):
+        self._filters = {}
+        self._buckets = {}
+
+    def __len__(self):
+        return len(self._filters)
+
+    def __contains__(self, subscriber):
+        return subscriber in self._filters
+
+    def __iter__(self):
+        return iter(list(self._filters))
+
+    def filter_for(self, subscriber):
+        return self._filters.get(subscriber)
+
+    def add(self, subscriber, flt=None):
+        """Adds a subscriber, replacing any filter it had."""
+        keys = self._keys(flt)  # before any change, so a filter that cannot be indexed leaves none
+        self.discard(subscriber)
+        self._filters[subscriber] = flt
+        for key in keys:
+            self._buckets.setdefault(key, set()).add(subscriber)
+
+    def discard(self, subscriber):
+        if subscriber not in self._filters:
+            return
+        for key in self._keys(self._filters.pop(subscriber)):
+            bucket = self._buckets[key]
+            bucket.discard(subscriber)
+            if not bucket:
+                del self._buckets[key]
+
+    @staticmethod
+    def _keys(flt):
+        if flt is None:
+            return [('all',)]
+        if flt.ids is not None:
+            return [('id', i) for i in flt.ids]
+        if flt.bbox is not None:
+            cells = flt.cells()
+            if cells is None:
+                return [('wide',)]
+            return [('cell', c) for c in cells]
+        if flt.labels is not None:
+            return [('label', l) for l in flt.labels]
+        return [('rank', flt.min_rank)]
+
+    def match(self, meta):
+        """Subscribers whose filter accepts an event with the given routing metadata."""
+        if meta.get('all'):
+            return set(self._filters)  # stream control events such as acks reach everyone
+        buckets = self._buckets
+        matched = set(buckets.get(('all',), ()))
+        keys = []
+        if meta.get('id') is not None:
+            keys.append(('id', meta['id']))
+        lat, lng = meta.get('lat'), meta.get('lng')
+        if lat is not None and lng is not None:
+            keys.append(('cell', _cell(lat, lng)))
+            keys.append(('wide',))
+        keys.extend(('label', l) for l in meta.get('labels') or ())
+        rank = SEVERITY_RANK.get(meta.get('severity'))
+        if rank is not None:
+            keys.extend(('rank', r) for r in range(rank + 1))
+
+        candidates = set()
+        for key in keys:
+            bucket = buckets.get(key)
+            if bucket:
+                candidates |= bucket
+        candidates -= matched
+        matched.update(s for s in candidates if self._filters[s].matches(meta))
+        return matched
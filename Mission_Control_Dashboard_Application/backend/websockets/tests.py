@@ -1,3 +1,529 @@
+import asyncio
+import json
+import os
+import random
+import tempfile
+from unittest import mock
+
+import msgpack
+from channels.testing import WebsocketCommunicator
 from django.test import TestCase
 
-# Create your tests here.
+from api import llm
+from api.views import fire_warden
+from websockets.broadcast import REPLAY_BUFFER_SIZE, Broadcaster, ReplayBuffer, encode_frame, publish_frame
+from websockets.consumers.base import StreamConsumer
+from websockets.consumers.fire_warden import FireWardenConsumer
+from websockets.deltas import DeltaEncoder, StreamState
+from websockets.layers import UnixSocketChannelLayer
+from websockets.outbox import SLOW_CLIENT_CLOSE_CODE, Outbox
+from websockets.subscriptions import Filter, FilterError, SubscriptionIndex
+
+
+def _drone(i, **fields):
+    return {"type": "drone", "payload": dict({"id": i, "timestamp": 1_000, "battery": 100}, **fields)}
+
+
+def _battery(i, battery):
+    return {"type": "drone_delta", "payload": {"id": i, "timestamp": 2_000, "battery": battery}}
+
+
+class _Consumer(StreamConsumer):
+    log_prefix = "[Test WS]"
+
+
+class StreamResumeTests(TestCase):
+    def setUp(self):
+        # producers that never tick, so every frame in a test is one it published
+        self.broadcaster = Broadcaster(f"test-stream-{self._testMethodName}", list, 3600, first_delay=3600,
+                                       state=StreamState(["drone"]))
+        self.consumer = type("Consumer", (_Consumer,), {"broadcaster": self.broadcaster})
+
+    async def connect(self, query=""):
+        communicator = WebsocketCommunicator(self.consumer.as_asgi(), f"/ws/test/{query}")
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        return communicator
+
+    async def joined(self, communicator):
+        """Waits until the consumer has subscribed; asserts nothing was sent before that."""
+        # handled once connect has finished, so the fan-out has joined the group by the reply
+        await communicator.send_json_to({"type": "subscribe"})
+        self.assertEqual((await communicator.receive_json_from())["type"], "subscribed")
+
+    async def publish(self, *messages):
+        for message in messages:
+            await self.broadcaster.publish(message)
+
+    async def receive_seqs(self, communicator, count):
+        return [(await communicator.receive_json_from())["seq"] for _ in range(count)]
+
+    async def test_new_client_gets_snapshot_then_live_frames(self):
+        await self.publish(_drone(1), _battery(1, 90), _drone(2))
+        communicator = await self.connect()
+        snapshot = await communicator.receive_json_from()
+        self.assertEqual(snapshot["type"], "snapshot")
+        self.assertEqual(snapshot["seq"], 3)
+        self.assertEqual({item["payload"]["id"]: item["payload"]["battery"] for item in snapshot["items"]},
+                         {1: 90, 2: 100})
+        await self.publish(_battery(2, 80))
+        self.assertEqual(await self.receive_seqs(communicator, 1), [4])
+        await communicator.disconnect()
+
+    async def test_resume_replays_only_missed_frames(self):
+        await self.publish(*(_battery(1, 100 - i) for i in range(5)))
+        communicator = await self.connect("?resume_from=2")
+        self.assertEqual(await self.receive_seqs(communicator, 3), [3, 4, 5])
+        await self.publish(_battery(1, 50))
+        self.assertEqual(await self.receive_seqs(communicator, 1), [6])
+        self.assertTrue(await communicator.receive_nothing())
+        await communicator.disconnect()
+
+    async def test_resume_at_latest_seq_sends_nothing_until_live(self):
+        await self.publish(_drone(1), _battery(1, 90))
+        communicator = await self.connect("?resume_from=2")
+        await self.joined(communicator)
+        await self.publish(_battery(1, 80))
+        self.assertEqual(await self.receive_seqs(communicator, 1), [3])
+        await communicator.disconnect()
+
+    async def test_resume_older_than_buffer_resyncs_with_snapshot(self):
+        await self.publish(_drone(1), _drone(2))
+        await self.publish(*(_battery(1, i % 100) for i in range(REPLAY_BUFFER_SIZE)))
+        latest = REPLAY_BUFFER_SIZE + 2
+        communicator = await self.connect("?resume_from=1")
+        self.assertEqual(await communicator.receive_json_from(), {"type": "resync", "seq": latest})
+        snapshot = await communicator.receive_json_from()
+        self.assertEqual(snapshot["type"], "snapshot")
+        self.assertEqual(snapshot["seq"], latest)
+        self.assertEqual({item["payload"]["id"]: item["payload"]["battery"] for item in snapshot["items"]},
+                         {1: (REPLAY_BUFFER_SIZE - 1) % 100, 2: 100})
+        await self.publish(_battery(2, 70))
+        self.assertEqual(await self.receive_seqs(communicator, 1), [latest + 1])
+        await communicator.disconnect()
+
+    async def test_resume_oldest_buffered_seq_still_replays(self):
+        await self.publish(*(_battery(1, i % 100) for i in range(REPLAY_BUFFER_SIZE + 5)))
+        communicator = await self.connect("?resume_from=5")
+        seqs = await self.receive_seqs(communicator, REPLAY_BUFFER_SIZE)
+        self.assertEqual(seqs, list(range(6, REPLAY_BUFFER_SIZE + 6)))
+        await communicator.disconnect()
+
+    async def test_resume_from_before_a_restart_resyncs(self):
+        await self.publish(_drone(1))
+        communicator = await self.connect("?resume_from=40")
+        self.assertEqual(await communicator.receive_json_from(), {"type": "resync", "seq": 1})
+        self.assertEqual((await communicator.receive_json_from())["type"], "snapshot")
+        await communicator.disconnect()
+
+    async def test_batched_resume_sends_one_batch(self):
+        await self.publish(*(_battery(1, 100 - i) for i in range(4)))
+        communicator = await self.connect("?resume_from=1&batch=100")
+        batch = await communicator.receive_json_from()
+        self.assertEqual(batch["type"], "batch")
+        self.assertEqual([item["seq"] for item in batch["items"]], [2, 3, 4])
+        await communicator.disconnect()
+
+    async def test_gap_in_relayed_frames_resyncs_later_resumes(self):
+        # frames stamped by another worker reach this one through its fan-out listener
+        follower = await self.connect()
+        await self.joined(follower)
+        group = self.broadcaster.group
+        for seq in (1, 2, 5, 6):
+            await publish_frame(group, encode_frame(dict(_battery(1, seq), seq=seq)), {"seq": seq})
+        self.assertEqual(await self.receive_seqs(follower, 4), [1, 2, 5, 6])
+        self.assertEqual(self.broadcaster.replay.seq, 6)
+
+        behind = await self.connect("?resume_from=2")
+        self.assertEqual(await behind.receive_json_from(), {"type": "resync", "seq": 6})
+        after_gap = await self.connect("?resume_from=5")
+        self.assertEqual(await self.receive_seqs(after_gap, 1), [6])
+        for communicator in (follower, behind, after_gap):
+            await communicator.disconnect()
+
+    async def test_non_finite_bbox_is_rejected_and_socket_stays_usable(self):
+        communicator = await self.connect()
+        # json.dumps writes NaN and Infinity, and json.loads reads them back
+        await communicator.send_to(text_data='{"type":"subscribe","bbox":[NaN,0,1,1]}')
+        self.assertEqual(await communicator.receive_json_from(),
+                         {"type": "error", "error": "bbox values must be finite numbers"})
+        await communicator.send_to(text_data='{"type":"subscribe","bbox":[0,0,1,Infinity]}')
+        self.assertEqual((await communicator.receive_json_from())["type"], "error")
+        await self.joined(communicator)
+        await self.publish(_drone(1))
+        self.assertEqual(await self.receive_seqs(communicator, 1), [1])
+        await communicator.disconnect()
+        self.assertEqual(self.broadcaster.subscribers, 0)
+
+
+class MsgpackFramingTests(TestCase):
+    def setUp(self):
+        self.broadcaster = Broadcaster(f"test-msgpack-{self._testMethodName}", list, 3600, first_delay=3600,
+                                       state=StreamState(["drone"]))
+        self.consumer = type("Consumer", (_Consumer,), {"broadcaster": self.broadcaster})
+
+    async def connect(self, query="", subprotocols=None):
+        communicator = WebsocketCommunicator(self.consumer.as_asgi(), f"/ws/test/{query}", subprotocols=subprotocols)
+        connected, subprotocol = await communicator.connect()
+        self.assertTrue(connected)
+        return communicator, subprotocol
+
+    async def receive(self, communicator):
+        data = await communicator.receive_from()
+        self.assertIsInstance(data, bytes)
+        return msgpack.unpackb(data, raw=False)
+
+    async def test_msgpack_frames_carry_the_same_messages_as_json(self):
+        message = _drone(1, lat=34.05, lng=-118.25, status="Active", tags=["north", None], battery=87.5)
+        await self.broadcaster.publish(message)
+        plain, _ = await self.connect()
+        binary, subprotocol = await self.connect("?format=msgpack")
+        self.assertIsNone(subprotocol)  # the query string switches framing without a subprotocol
+        snapshot = await self.receive(binary)
+        self.assertEqual(snapshot, await plain.receive_json_from())
+        self.assertEqual(snapshot["items"], [message])
+
+        await binary.send_to(bytes_data=msgpack.packb({"type": "subscribe"}))
+        self.assertEqual((await self.receive(binary))["type"], "subscribed")
+        await plain.send_json_to({"type": "subscribe"})
+        await plain.receive_json_from()
+        await self.broadcaster.publish(_battery(1, 86))
+        live = await self.receive(binary)
+        self.assertEqual(live, await plain.receive_json_from())
+        self.assertEqual(live, dict(_battery(1, 86), seq=2))
+        for communicator in (plain, binary):
+            await communicator.disconnect()
+
+    async def test_subprotocol_selects_msgpack_and_batches_stay_binary(self):
+        for i in range(3):
+            await self.broadcaster.publish(_battery(1, 90 - i))
+        communicator, subprotocol = await self.connect("?resume_from=1&batch", subprotocols=["msgpack"])
+        self.assertEqual(subprotocol, "msgpack")
+        batch = await self.receive(communicator)
+        self.assertEqual(batch, {"type": "batch", "items": [dict(_battery(1, 89), seq=2),
+                                                            dict(_battery(1, 88), seq=3)]})
+        await communicator.send_to(bytes_data=b"\xc1")  # never valid MessagePack
+        self.assertEqual(await self.receive(communicator), {"type": "error", "error": "Invalid message encoding"})
+        await communicator.disconnect()
+
+
+class SubscriptionFilterTests(TestCase):
+    def test_bbox_must_be_finite(self):
+        for bbox in ([float('nan'), 0, 1, 1], [0, float('-inf'), 1, 1], [0, 0, float('inf'), 1], [0, 0, 1, 10 ** 400]):
+            with self.assertRaises(FilterError, msg=bbox):
+                Filter.parse({"bbox": bbox})
+        self.assertEqual(Filter.parse({"bbox": [1, 2, 3, 4]}).bbox, (1.0, 2.0, 3.0, 4.0))
+
+    def test_filter_that_cannot_be_indexed_leaves_the_index_unchanged(self):
+        index = SubscriptionIndex()
+        index.add('socket', Filter(labels=frozenset(['Safety'])))
+        with self.assertRaises(ValueError):
+            index.add('socket', Filter(bbox=(float('nan'), 0.0, 1.0, 1.0)))
+        self.assertEqual(index.filter_for('socket').labels, frozenset(['Safety']))
+        self.assertEqual(index.match({"labels": ['Safety']}), {'socket'})
+        index.discard('socket')
+        self.assertEqual(len(index), 0)
+
+
+class DeltaEncodingTests(TestCase):
+    def test_keyframe_then_deltas_rebuild_each_record(self):
+        encoder, state = DeltaEncoder("drone", keyframe_every=4), StreamState(["drone"])
+        record = {"id": 'D-1', "timestamp": 0, "battery": 100, "water": 100, "status": 'Active', "lat": 34.0}
+        kinds = []
+        for tick in range(1, 10):
+            record = dict(record, timestamp=tick, battery=100 - tick, lat=34.0 + tick / 1000)
+            if tick % 3 == 0:
+                record["status"] = 'Returning' if record["status"] == 'Active' else 'Active'
+            message = encoder.encode(record)
+            kinds.append(message["type"])
+            if message["type"] == "drone_delta":
+                self.assertEqual(set(message["payload"]) - {"id", "timestamp", "battery", "lat"},
+                                 {"status"} if tick % 3 == 0 else set())
+            state.apply(message)
+            self.assertEqual(state.latest("drone", 'D-1'), record)
+        # the first record, then every 4th after a keyframe, goes out whole
+        self.assertEqual(kinds, ["drone", "drone_delta", "drone_delta", "drone_delta", "drone",
+                                 "drone_delta", "drone_delta", "drone_delta", "drone"])
+
+    def test_unchanged_record_sends_nothing(self):
+        encoder = DeltaEncoder("drone")
+        record = {"id": 'D-1', "timestamp": 1, "battery": 80}
+        self.assertEqual(encoder.encode(record)["type"], "drone")
+        self.assertIsNone(encoder.encode(dict(record, timestamp=2)))
+        self.assertEqual(encoder.encode(dict(record, timestamp=3, battery=79)),
+                         {"type": "drone_delta", "payload": {"id": 'D-1', "timestamp": 3, "battery": 79}})
+
+    def test_entities_are_encoded_independently(self):
+        encoder, state = DeltaEncoder("drone"), StreamState(["drone"])
+        rng = random.Random(3)
+        latest = {}
+        for tick in range(60):
+            entity_id = f'D-{rng.randrange(4)}'
+            latest[entity_id] = {"id": entity_id, "timestamp": tick, "battery": rng.choice([50, 60]),
+                                 "water": rng.choice([10, 20])}
+            message = encoder.encode(latest[entity_id])
+            if message is not None:
+                state.apply(message)
+        for entity_id, record in latest.items():
+            # an unchanged record sends nothing, so only its timestamp may lag
+            self.assertEqual(state.latest("drone", entity_id)["battery"], record["battery"])
+            self.assertEqual(state.latest("drone", entity_id)["water"], record["water"])
+        self.assertEqual(sorted(k["payload"]["id"] for k in state.keyframes()), sorted(latest))
+
+    def test_delta_without_a_keyframe_is_ignored(self):
+        state = StreamState(["drone"])
+        state.apply(_battery('D-1', 50))
+        self.assertIsNone(state.latest("drone", 'D-1'))
+        state.apply(_drone('D-1'))
+        state.apply(_battery('D-1', 50))
+        self.assertEqual(state.latest("drone", 'D-1'), {"id": 'D-1', "timestamp": 2_000, "battery": 50})
+
+
+class ReplayBufferTests(TestCase):
+    def frames(self, buffer, *seqs):
+        for seq in seqs:
+            buffer.record(seq, encode_frame(dict(_battery(1, seq), seq=seq)))
+
+    def test_since_returns_missed_frames_in_order(self):
+        buffer = ReplayBuffer(size=10)
+        self.frames(buffer, 1, 2, 3, 4)
+        self.assertEqual([json.loads(f)["seq"] for f in buffer.since(1)], [2, 3, 4])
+        self.assertEqual(buffer.since(4), [])
+        self.assertIsNone(buffer.since(5))
+
+    def test_repeated_and_older_frames_are_ignored(self):
+        buffer = ReplayBuffer(size=10)
+        self.frames(buffer, 1, 2, 3, 2, 3, 1)
+        self.assertEqual([json.loads(f)["seq"] for f in buffer.since(0)], [1, 2, 3])
+
+    def test_gap_restarts_the_ring(self):
+        buffer = ReplayBuffer(size=10)
+        self.frames(buffer, 1, 2, 3, 7, 8)
+        self.assertEqual(buffer.seq, 8)
+        self.assertIsNone(buffer.since(3))
+        self.assertIsNone(buffer.since(5))
+        self.assertEqual([json.loads(f)["seq"] for f in buffer.since(7)], [8])
+
+    def test_evicted_frames_cannot_be_replayed(self):
+        buffer = ReplayBuffer(size=3)
+        self.frames(buffer, *range(1, 7))
+        self.assertIsNone(buffer.since(2))
+        self.assertEqual([json.loads(f)["seq"] for f in buffer.since(3)], [4, 5, 6])
+
+    def test_relayed_frames_update_state_and_listener(self):
+        relayed = []
+        buffer = ReplayBuffer(size=10, state=StreamState(["drone"]), on_relay=relayed.append)
+        buffer.record(1, encode_frame(dict(_drone(1), seq=1)))
+        buffer.record(2, encode_frame(dict(_battery(1, 40), seq=2)))
+        self.assertEqual(buffer.snapshot(), (2, [{"type": "drone", "payload": {
+            "id": 1, "timestamp": 2_000, "battery": 40}}]))
+        self.assertEqual([m["seq"] for m in relayed], [1, 2])
+
+    def test_continue_from_a_later_seq_clears_the_ring(self):
+        buffer = ReplayBuffer(size=10)
+        buffer.stamp(_drone(1))
+        buffer.continue_from(1)
+        self.assertIsNotNone(buffer.since(0))
+        buffer.continue_from(9)
+        self.assertIsNone(buffer.since(0))
+        self.assertEqual(buffer.stamp(_drone(1))[0], 10)
+
+
+@mock.patch.object(llm, 'client', None)
+class FireWardenConsumerTests(TestCase):
+    async def connect(self):
+        communicator = WebsocketCommunicator(FireWardenConsumer.as_asgi(), "/ws/fire-warden/")
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        return communicator
+
+    async def test_unexpected_failure_ends_the_reply_with_an_error(self):
+        communicator = await self.connect()
+        with mock.patch.object(fire_warden, 'draft', side_effect=RuntimeError("boom")), \
+                self.assertLogs('websockets.consumers.fire_warden', 'ERROR'):
+            await communicator.send_json_to({"type": "message", "id": 7, "message": "status?"})
+            self.assertEqual(await communicator.receive_json_from(),
+                             {"type": "error", "id": 7, "error": "Fire Warden reply failed", "busy": False})
+        await communicator.disconnect()
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+async def _settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+class OutboxTests(TestCase):
+    def setUp(self):
+        self.clock = _Clock()
+        self.sent = []
+        self.closed = []
+
+    def outbox(self, coalesce=True, **options):
+        async def send(frame):
+            self.sent.append(frame)
+
+        async def close(code):
+            self.closed.append(code)
+
+        return Outbox(send, close, coalesce, clock=self.clock, **options)
+
+    async def drain(self, outbox):
+        outbox.start()
+        await _settle()
+        await outbox.stop()
+
+    async def test_newer_frame_for_an_entity_replaces_the_queued_one(self):
+        outbox = self.outbox()
+        outbox.put('A1', {"id": 'A'})
+        outbox.put('B1', {"id": 'B'})
+        outbox.put('A2', {"id": 'A'})
+        self.assertEqual((outbox.depth, outbox.dropped), (2, 1))
+        await self.drain(outbox)
+        # moved to the back, so seq order is kept
+        self.assertEqual(self.sent, ['B1', 'A2'])
+
+    async def test_keyframe_supersedes_queued_deltas_but_deltas_do_not_merge(self):
+        outbox = self.outbox()
+        outbox.put('A-key', {"id": 'A'})
+        outbox.put('A-d1', {"id": 'A', "delta": True})
+        outbox.put('A-d2', {"id": 'A', "delta": True})
+        outbox.put('B-key', {"id": 'B'})
+        self.assertEqual(outbox.depth, 4)
+        outbox.put('A-key2', {"id": 'A'})
+        await self.drain(outbox)
+        self.assertEqual(self.sent, ['B-key', 'A-key2'])
+
+    async def test_oldest_droppable_frame_goes_when_full(self):
+        outbox = self.outbox(max_frames=3)
+        outbox.put('note', None)  # not keyed: never dropped
+        for entity in 'ABC':
+            outbox.put(f'{entity}1', {"id": entity})
+        self.assertEqual(outbox.dropped, 1)
+        await self.drain(outbox)
+        self.assertEqual(self.sent, ['note', 'B1', 'C1'])
+        self.assertEqual(self.closed, [])
+
+    async def test_full_of_undroppable_frames_disconnects(self):
+        outbox = self.outbox(coalesce=False, max_frames=2)
+        for i in range(3):
+            outbox.put(f'n{i}', {"id": i, "severity": 'high'})
+        await _settle()
+        self.assertTrue(outbox.closed)
+        self.assertEqual(self.closed, [SLOW_CLIENT_CLOSE_CODE])
+        outbox.put('late', None)  # ignored once closed
+        self.assertEqual(outbox.depth, 0)
+
+    async def test_client_lagging_past_max_lag_disconnects(self):
+        outbox = self.outbox(max_lag=15)
+        outbox.put('A1', {"id": 'A'})
+        self.clock.now = 15
+        outbox.put('B1', {"id": 'B'})
+        self.assertFalse(outbox.closed)
+        self.clock.now = 15.1
+        outbox.put('C1', {"id": 'C'})
+        await _settle()
+        self.assertEqual(self.closed, [SLOW_CLIENT_CLOSE_CODE])
+
+    async def test_batch_waits_for_its_window_on_the_clock(self):
+        outbox = self.outbox(batch_window=0.02)
+        outbox.start()
+        outbox.put('{"n":1}', {"id": 1})
+        outbox.put('{"n":2}', {"id": 2})
+        # the window's timer fires, but the clock says the window is not over: it waits again
+        await asyncio.sleep(0.05)
+        self.assertEqual(self.sent, [])
+        self.clock.now = 0.02
+        outbox.put('{"n":3}', {"id": 3})
+        await asyncio.sleep(0.05)
+        await outbox.stop()
+        self.assertEqual([json.loads(f) for f in self.sent],
+                         [{"type": "batch", "items": [{"n": 1}, {"n": 2}, {"n": 3}]}])
+
+    async def test_critical_frame_flushes_the_batch_at_once(self):
+        outbox = self.outbox(coalesce=False, batch_window=60)
+        outbox.start()
+        outbox.put('{"n":1}', {"id": 1, "severity": 'low'})
+        await _settle()
+        self.assertEqual(self.sent, [])
+        outbox.put('{"n":2}', {"id": 2, "severity": 'critical'})
+        await _settle()
+        await outbox.stop()
+        self.assertEqual([json.loads(f) for f in self.sent],
+                         [{"type": "batch", "items": [{"n": 1}, {"n": 2}]}])
+
+
+class UnixSocketLayerTests(TestCase):
+    """Two layers on one directory stand in for two workers on one host."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = directory.name
+        self.first, self.second = UnixSocketChannelLayer(self.path), UnixSocketChannelLayer(self.path)
+        self.current = self.first  # the layer get_channel_layer returns in the broadcast module
+        patch = mock.patch('websockets.broadcast.get_channel_layer', lambda: self.current)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    async def close(self):
+        for layer in (self.first, self.second):
+            for name in list(layer._locks):
+                layer.release_lock(name)
+            await layer.close()
+
+    def test_one_worker_holds_a_lock_and_the_next_carries_on_its_value(self):
+        self.assertTrue(self.first.acquire_lock('producer-drones'))
+        self.assertTrue(self.first.acquire_lock('producer-drones'))  # already held: confirmed
+        self.assertFalse(self.second.acquire_lock('producer-drones'))
+        self.assertEqual(self.second.lock_value('producer-drones'), 0)  # only readable while held
+        self.first.set_lock_value('producer-drones', 41)
+        self.first.release_lock('producer-drones')
+        self.assertTrue(self.second.acquire_lock('producer-drones'))
+        self.assertEqual(self.second.lock_value('producer-drones'), 41)
+        self.assertFalse(self.first.acquire_lock('producer-drones'))
+        self.second.release_lock('producer-drones')
+
+    async def test_broadcaster_fails_over_without_reusing_seqs(self):
+        leader, follower = Broadcaster("drones", list, 3600), Broadcaster("drones", list, 3600)
+        self.assertTrue(leader._lead())
+        seqs = [leader.stamp(_drone(i))[1]["seq"] for i in range(3)]
+        self.current = self.second
+        self.assertFalse(follower._lead())
+        self.current = self.first
+        leader._step_down()  # the leading worker's last subscriber left
+        self.current = self.second
+        self.assertTrue(follower._lead())
+        seqs.append(follower.stamp(_drone(4))[1]["seq"])
+        self.assertEqual(seqs, [1, 2, 3, 4])
+        follower._step_down()
+        await _settle()
+        await self.close()
+
+    async def test_group_send_reaches_the_other_worker(self):
+        channel = await self.second.new_channel()
+        await self.second.group_add("drones", channel)
+        for n in range(3):  # the first send connects, later ones reuse the connection
+            await self.first.group_send("drones", {"type": "stream.frame", "frame": bytes([n])})
+            self.assertEqual(await asyncio.wait_for(self.second.receive(channel), 1),
+                             {"type": "stream.frame", "frame": bytes([n])})
+        await self.close()
+
+    async def test_group_send_forgets_a_worker_that_is_gone(self):
+        kept, gone = await self.first.new_channel(), await self.second.new_channel()
+        for channel in (kept, gone):
+            await self.first.group_add("drones", channel)
+        await self.second.close()  # the worker exits; its group entry is left behind
+        with self.assertLogs('websockets.layers', 'INFO'):
+            await self.first.group_send("drones", {"type": "stream.frame", "frame": b"\x01"})
+        self.assertEqual(os.listdir(os.path.join(self.path, "groups", "drones")), [kept])
+        self.assertEqual(await asyncio.wait_for(self.first.receive(kept), 1),
+                         {"type": "stream.frame", "frame": b"\x01"})
+        await self.close()
@@ -48,16 +48,61 @@ export async function fetchFireDroneRange(startMs, endMs, entity) {
   return normalizeHistory(resp.data || {});
 }
 
+const NOTIFICATION_PAGE_SIZE = 100;
+
 /**
- * Get notifications from last 24h (all pre-acknowledged)
+ * Get the newest page of notifications; nextCursor loads the page before it
  */
 export async function fetchRecentNotifications() {
-  const resp = await apiClient.get("notifications/recent/");
+  return fetchNotificationPage();
+}
+
+/**
+ * Get one page of notifications, newest first. Pass the nextCursor of the
+ * previous page to scroll back; it is null after the oldest page.
+ */
+export async function fetchNotificationPage(cursor = null, limit = NOTIFICATION_PAGE_SIZE) {
+  const params = { order: 'newest', limit };
+  if (cursor) params.cursor = cursor;
+  const resp = await apiClient.get('notifications/', { params });
+  return {
+    notifications: normalizeNotifications(resp.data.notifications || []),
+    nextCursor: resp.data.nextCursor ?? null,
+  };
+}
+
+/**
+ * Get unacknowledged counts: { total, unacknowledged, bySeverity, byLabel }
+ */
+export async function fetchNotificationCounts() {
+  const resp = await apiClient.get('notifications/counts/');
+  return resp.data;
+}
+
+/**
+ * Query notifications on the server. filters: { start, end, severity, label, source, acknowledged };
+ * severity/label/source may be arrays (any of the values matches)
+ */
+export async function fetchNotifications(filters = {}) {
+  const params = {};
+  Object.entries(filters).forEach(([key, value]) => {
+    if (value == null || (Array.isArray(value) && !value.length)) return;
+    params[key] = Array.isArray(value) ? value.join(',') : value;
+  });
+  const resp = await apiClient.get('notifications/', { params });
   return {
     notifications: normalizeNotifications(resp.data.notifications || [])
   };
 }
 
+/**
+ * Acknowledge (or un-acknowledge) notifications by id
+ */
+export async function acknowledgeNotifications(ids, acknowledged = true) {
+  const resp = await apiClient.post('notifications/ack/', { ids, acknowledged });
+  return resp.data;
+}
+
 /**
  * Send a message to Fire Warden AI chat
  */
@@ -6,7 +6,7 @@ import LiveMapComponent from './LiveMapComponent';
 import NotificationsComponent from './NotificationsComponent';
 import FireWardenChatComponent from './FireWardenChatComponent';
 import WebSocketProvider from '../providers/WebSocketProvider';
-import { fetchRecentNotifications } from '../api/apiClient';
+import { fetchNotificationCounts, fetchRecentNotifications } from '../api/apiClient';
 import { fetchRecentFireDroneData } from '../api/apiClient';
 import MapView from './MapView';
 import FireDroneGrid from './FireDroneGrid';
@@ -155,7 +155,15 @@ const FireMissionControlDashboard = () => {
     enabled: false,
   });
 
-  const unreadNotifications = data.notifications.filter(n => !n.acknowledged).length;
+  const { data: counts } = useQuery({
+    queryKey: ['notification-counts'],
+    queryFn: fetchNotificationCounts,
+    staleTime: 30 * 1000,
+  });
+
+  const unreadNotifications = counts
+    ? counts.unacknowledged
+    : data.notifications.filter(n => !n.acknowledged).length;
 
   const tabs = [
     { id: 'dashboard', label: '📊 Dashboard', icon: '📊' },
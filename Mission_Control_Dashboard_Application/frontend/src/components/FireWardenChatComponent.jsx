@@ -15,7 +15,58 @@ const FireWardenChatComponent = () => {
   const [inputValue, setInputValue] = useState('');
   const [isLoading, setIsLoading] = useState(false);
   const [pendingPlan, setPendingPlan] = useState(null);
+  const [streamingId, setStreamingId] = useState(null);
   const messagesEndRef = React.useRef(null);
+  const wsRef = React.useRef(null);
+
+  // Streaming replies over ws/fire-warden/; the POST endpoint is the fallback
+  React.useEffect(() => {
+    let reconnect = null;
+    let closed = false;
+
+    const updateReply = (id, update) => {
+      setMessages(prev => prev.map(m => (m.id === id ? { ...m, ...update(m) } : m)));
+    };
+
+    const connect = () => {
+      const ws = new WebSocket(`${window.location.protocol === 'https:' ? 'wss:' : 'ws:'}//localhost:8000/ws/fire-warden/`);
+      wsRef.current = ws;
+      ws.addEventListener('message', (ev) => {
+        let msg;
+        try { msg = JSON.parse(ev.data); } catch { return; }
+        if (msg.type === 'token') {
+          setIsLoading(false);
+          updateReply(msg.id, m => ({ content: m.content + msg.text }));
+        } else if (msg.type === 'start') {
+          updateReply(msg.id, () => ({ type: msg.replyType }));
+        } else if (msg.type === 'done') {
+          updateReply(msg.id, () => ({ plan: msg.plan, ttftMs: msg.ttftMs }));
+          if (msg.plan) setPendingPlan({ messageId: msg.id, ...msg.plan });
+          setStreamingId(current => (current === msg.id ? null : current));
+          setIsLoading(false);
+        } else if (msg.type === 'error') {
+          const notice = msg.busy ? 'Fire Warden is busy, please try again shortly.' : 'Fire Warden could not reply.';
+          updateReply(msg.id, m => ({ content: m.content ? `${m.content} … (${notice})` : notice }));
+          setStreamingId(current => (current === msg.id ? null : current));
+          setIsLoading(false);
+        } else if (msg.type === 'cancelled') {
+          updateReply(msg.id, m => ({ content: m.content ? `${m.content} …` : '(stopped)' }));
+          setStreamingId(current => (current === msg.id ? null : current));
+          setIsLoading(false);
+        }
+      });
+      ws.addEventListener('close', () => {
+        if (!closed) reconnect = setTimeout(connect, 3000);
+      });
+    };
+
+    connect();
+    return () => {
+      closed = true;
+      clearTimeout(reconnect);
+      try { wsRef.current?.close(); } catch {}
+    };
+  }, []);
 
   const scrollToBottom = () => {
     messagesEndRef.current?.scrollIntoView({ behavior: 'smooth' });
@@ -34,8 +85,13 @@ const FireWardenChatComponent = () => {
     return `${displayHours}:${minutes} ${ampm}`;
   };
 
+  const handleStop = () => {
+    wsRef.current?.send(JSON.stringify({ type: 'cancel' }));
+  };
+
   const handleSend = async () => {
-    if (!inputValue.trim() || isLoading) return;
+    if (!inputValue.trim()) return;
+    if (isLoading && !streamingId) return;
 
     const userMessage = {
       id: Date.now(),
@@ -49,6 +105,16 @@ const FireWardenChatComponent = () => {
     setInputValue('');
     setIsLoading(true);
 
+    const ws = wsRef.current;
+    if (ws && ws.readyState === WebSocket.OPEN) {
+      // a new message cancels the reply still streaming
+      const replyId = Date.now() + 1;
+      setMessages(prev => [...prev, { id: replyId, sender: 'warden', content: '', timestamp: Date.now(), type: 'text' }]);
+      setStreamingId(replyId);
+      ws.send(JSON.stringify({ type: 'message', id: replyId, message: userMessage.content }));
+      return;
+    }
+
     try {
       const response = await sendFireWardenMessage(inputValue);
       
@@ -110,7 +176,7 @@ const FireWardenChatComponent = () => {
 
       {/* Chat Messages */}
       <div className="flex-1 overflow-y-auto p-6 space-y-4" style={{ backgroundColor: '#0d1119' }}>
-        {messages.map((message) => (
+        {messages.filter(m => m.sender !== 'warden' || m.content).map((message) => (
           <div
             key={message.id}
             className={`flex ${message.sender === 'user' ? 'justify-end' : 'justify-start'}`}
@@ -241,11 +307,20 @@ const FireWardenChatComponent = () => {
             placeholder="Type your message to Fire Warden..."
             className="flex-1 px-4 py-3 rounded-lg border border-gray-600 text-white text-sm focus:outline-none focus:border-cyan-400"
             style={{ backgroundColor: '#374151' }}
-            disabled={isLoading}
+            disabled={isLoading && !streamingId}
           />
+          {streamingId && (
+            <button
+              onClick={handleStop}
+              className="px-4 py-3 rounded-lg font-bold text-white text-sm border border-gray-600 transition-colors hover:opacity-80"
+              style={{ backgroundColor: '#374151' }}
+            >
+              Stop ■
+            </button>
+          )}
           <button
             onClick={handleSend}
-            disabled={!inputValue.trim() || isLoading}
+            disabled={!inputValue.trim() || (isLoading && !streamingId)}
             className="px-6 py-3 rounded-lg font-bold text-white text-sm transition-colors disabled:opacity-50 disabled:cursor-not-allowed"
             style={{ backgroundColor: '#00d4ff' }}
           >
@@ -253,7 +328,7 @@ const FireWardenChatComponent = () => {
           </button>
         </div>
 
-        <p className="text-xs text-gray-500 mt-2 text-right">Response time: ~2-3s</p>
+        <p className="text-xs text-gray-500 mt-2 text-right">Replies stream as they are written</p>
       </div>
     </div>
   );
@@ -1,7 +1,9 @@
 import React, { useState, useMemo } from 'react';
 import Select from 'react-select';
 import { useQuery, useQueryClient } from '@tanstack/react-query';
-import { fetchRecentNotifications } from '../api/apiClient';
+import {
+  acknowledgeNotifications, fetchNotificationCounts, fetchNotificationPage, fetchRecentNotifications, normalizeNotifications
+} from '../api/apiClient';
 
 // Helper function to get severity color
 const getSeverityColor = (severity) => {
@@ -33,6 +35,28 @@ const NotificationsComponent = () => {
     enabled: false, // WebSocketProvider manages this
   });
 
+  // Server-side unread counts cover pages that are not loaded yet
+  const { data: counts } = useQuery({
+    queryKey: ['notification-counts'],
+    queryFn: fetchNotificationCounts,
+    staleTime: 30 * 1000,
+  });
+  const [loadingOlder, setLoadingOlder] = useState(false);
+
+  const handleLoadOlder = async () => {
+    if (!data.nextCursor || loadingOlder) return;
+    setLoadingOlder(true);
+    try {
+      const page = await fetchNotificationPage(data.nextCursor);
+      queryClient.setQueryData(['recent-notifications'], (old = { notifications: [] }) => ({
+        notifications: normalizeNotifications([...page.notifications, ...(old.notifications || [])]),
+        nextCursor: page.nextCursor,
+      }));
+    } finally {
+      setLoadingOlder(false);
+    }
+  };
+
   const formatTimeAgo = (timestamp) => {
     const diff = Date.now() - timestamp;
     const minutes = Math.floor(diff / 60000);
@@ -48,24 +72,30 @@ const NotificationsComponent = () => {
   const handleAcknowledge = (id) => {
     queryClient.setQueryData(['recent-notifications'], (old = { notifications: [] }) => {
       return {
+        ...old,
         notifications: old.notifications.map(notif =>
           notif.id === id ? { ...notif, acknowledged: true } : notif
         )
       };
     });
+    acknowledgeNotifications([id]).catch(() => {});
   };
 
   const handleClearRead = () => {
     queryClient.setQueryData(['recent-notifications'], (old = { notifications: [] }) => {
       return {
+        ...old,
         notifications: old.notifications.filter(notif => !notif.acknowledged)
       };
     });
   };
 
   const handleMarkAllRead = () => {
+    const ids = data.notifications.filter(notif => !notif.acknowledged).map(notif => notif.id);
+    if (ids.length) acknowledgeNotifications(ids).catch(() => {});
     queryClient.setQueryData(['recent-notifications'], (old = { notifications: [] }) => {
       return {
+        ...old,
         notifications: old.notifications.map(notif => ({ ...notif, acknowledged: true }))
       };
     });
@@ -92,8 +122,9 @@ const NotificationsComponent = () => {
   }, [data.notifications, filter, labelFilter]);
 
   const unreadCount = useMemo(() => {
+    if (counts) return counts.unacknowledged;
     return data.notifications.filter(n => !n.acknowledged).length;
-  }, [data.notifications]);
+  }, [counts, data.notifications]);
 
   const availableLabels = useMemo(() => {
     const s = new Set();
@@ -254,6 +285,9 @@ const NotificationsComponent = () => {
                       }`}
                     >
                       {notif.title}
+                      {notif.count > 1 && (
+                        <span className="ml-2 text-sm font-normal text-gray-400">×{notif.count}</span>
+                      )}
                     </h3>
 
                     {/* Message */}
@@ -307,6 +341,16 @@ const NotificationsComponent = () => {
             </div>
           ))
         )}
+        {data.nextCursor && (
+          <button
+            onClick={handleLoadOlder}
+            disabled={loadingOlder}
+            className="w-full py-2 rounded-lg border border-gray-600 text-sm text-gray-300 hover:opacity-80"
+            style={{ backgroundColor: '#1f2937' }}
+          >
+            {loadingOlder ? 'Loading…' : 'Load older notifications'}
+          </button>
+        )}
       </div>
 
       {/* Footer Stats */}
@@ -317,7 +361,7 @@ const NotificationsComponent = () => {
           <span>All notifications acknowledged</span>
         )}
         <span className="mx-2">•</span>
-        <span>Showing {filteredNotifications.length} of {data.notifications.length} notifications</span>
+        <span>Showing {filteredNotifications.length} of {counts ? counts.total : data.notifications.length} notifications</span>
       </div>
     </div>
   );
@@ -3,6 +3,8 @@ import { useQuery, useQueryClient } from '@tanstack/react-query';
 import { toast } from 'react-toastify';
 import { fetchRecentFireDroneData, fetchRecentNotifications, normalizeList, normalizeNotifications } from '../api/apiClient';
 
+const SEVERITY_RANK = { info: 0, low: 1, medium: 2, high: 3, critical: 4 };
+
 // Severity-specific toast configurations
 const getToastConfig = (severity) => {
   const baseConfig = {
@@ -28,6 +30,8 @@ const getToastConfig = (severity) => {
   }
 };
 
+const FIRE_BATCH_WINDOW_MS = 200;
+
 export default function WebSocketProvider() {
   const queryClient = useQueryClient();
   
@@ -57,20 +61,72 @@ export default function WebSocketProvider() {
   const notifReconnectRef = useRef(null);
   const fireConnectingRef = useRef(false); // Prevent duplicate connections
   const notifConnectingRef = useRef(false);
+  // Last stream sequence applied per socket, sent back as ?resume_from= on reconnect
+  const fireSeqRef = useRef(null);
+  const notifSeqRef = useRef(null);
+  // Latest full record per drone id, the base that drone_delta frames apply to
+  const dronesRef = useRef(new Map());
+
+  // Returns false for frames already applied (a resume may repeat a few)
+  const acceptSeq = (seqRef, seq) => {
+    if (seq == null) return true;
+    if (seqRef.current != null && seq <= seqRef.current) return false;
+    seqRef.current = seq;
+    return true;
+  };
+
+  const streamUrl = (path, seqRef, params = {}) => {
+    const query = new URLSearchParams(params);
+    if (seqRef.current != null) query.set('resume_from', seqRef.current);
+    const qs = query.toString();
+    return `${window.location.protocol === 'https:' ? 'wss:' : 'ws:'}//localhost:8000${path}${qs ? `?${qs}` : ''}`;
+  };
+
+  // Rebuilds full drone records from keyframes and deltas; deltas without a base are skipped
+  const expandDroneDeltas = (items) => items.flatMap((item) => {
+    if (item.type === 'drone' && item.payload) {
+      dronesRef.current.set(item.payload.id, item.payload);
+      return [item];
+    }
+    if (item.type !== 'drone_delta' || !item.payload) return [item];
+    const base = dronesRef.current.get(item.payload.id);
+    if (!base) return [];
+    const drone = { ...base, ...item.payload };
+    dronesRef.current.set(drone.id, drone);
+    return [{ type: 'drone', payload: drone }];
+  });
 
-  const mergeIncomingFireDrone = (incoming) => {
-    const key = incoming.type === 'fire' ? 'fires' : 'drones';
-    queryClient.setQueryData(['recent-history'], (old = { fires: [], drones: [] }) => {
-      const merged = normalizeList([...(old[key] || []), incoming.payload]);
-      return { ...old, [key]: merged };
+  // Merges any number of fire/drone updates with a single cache write
+  const mergeIncomingFireDrone = (items) => {
+    const fires = [];
+    const drones = [];
+    items.forEach((item) => {
+      if (item.type === 'fire' && item.payload) fires.push(item.payload);
+      else if (item.type === 'drone' && item.payload) drones.push(item.payload);
     });
+    if (!fires.length && !drones.length) return;
+    queryClient.setQueryData(['recent-history'], (old = { fires: [], drones: [] }) => ({
+      ...old,
+      fires: fires.length ? normalizeList([...(old.fires || []), ...fires]) : old.fires,
+      drones: drones.length ? normalizeList([...(old.drones || []), ...drones]) : old.drones,
+    }));
   };
 
   const mergeIncomingNotification = (notification) => {
+    // A coalesced repeat comes back under the id it was first sent with
+    const previous = (queryClient.getQueryData(['recent-notifications'])?.notifications || [])
+      .find((n) => n.id === notification.id);
     queryClient.setQueryData(['recent-notifications'], (old = { notifications: [] }) => {
       const merged = normalizeNotifications([...(old.notifications || []), notification]);
-      return { notifications: merged };
+      return { ...old, notifications: merged };
     });
+    queryClient.invalidateQueries({ queryKey: ['notification-counts'] });
+
+    // Only toast a repeat when it turned critical or escalated
+    if (previous && notification.severity !== 'critical'
+        && SEVERITY_RANK[notification.severity] <= SEVERITY_RANK[previous.severity]) {
+      return;
+    }
 
     // Show toast notification
     const toastConfig = getToastConfig(notification.severity);
@@ -110,7 +166,8 @@ export default function WebSocketProvider() {
       }
       fireConnectingRef.current = true;
 
-      const wsUrl = `${window.location.protocol === 'https:' ? 'wss:' : 'ws:'}//localhost:8000/ws/fire-updates/`;
+      // Batched mode: one frame (and one merge) per server window instead of per update
+      const wsUrl = streamUrl('/ws/fire-updates/', fireSeqRef, { batch: FIRE_BATCH_WINDOW_MS });
       const ws = new WebSocket(wsUrl);
       fireWsRef.current = ws;
 
@@ -122,9 +179,20 @@ export default function WebSocketProvider() {
       ws.addEventListener('message', (ev) => {
         try {
           const data = JSON.parse(ev.data);
-          if ((data.type === 'fire' || data.type === 'drone') && data.payload) {
-            mergeIncomingFireDrone(data);
+          if (data.type === 'resync') {
+            // Missed more than the server buffers: refetch history, then follow live
+            fireSeqRef.current = data.seq;
+            queryClient.invalidateQueries({ queryKey: ['recent-history'] });
+            return;
           }
+          if (data.type === 'snapshot') {
+            // Current state of every fire and drone; frames up to data.seq are already in it
+            if (fireSeqRef.current == null || data.seq > fireSeqRef.current) fireSeqRef.current = data.seq;
+            mergeIncomingFireDrone(expandDroneDeltas(data.items));
+            return;
+          }
+          const items = data.type === 'batch' ? data.items : [data];
+          mergeIncomingFireDrone(expandDroneDeltas(items.filter((item) => acceptSeq(fireSeqRef, item.seq))));
         } catch {
           // ignore malformed messages
         }
@@ -165,7 +233,7 @@ export default function WebSocketProvider() {
       }
       notifConnectingRef.current = true;
 
-      const wsUrl = `${window.location.protocol === 'https:' ? 'wss:' : 'ws:'}//localhost:8000/ws/notifications/`;
+      const wsUrl = streamUrl('/ws/notifications/', notifSeqRef);
       const ws = new WebSocket(wsUrl);
       notifWsRef.current = ws;
 
@@ -177,6 +245,25 @@ export default function WebSocketProvider() {
       ws.addEventListener('message', (ev) => {
         try {
           const notification = JSON.parse(ev.data);
+          if (notification.type === 'resync') {
+            notifSeqRef.current = notification.seq;
+            queryClient.invalidateQueries({ queryKey: ['recent-notifications'] });
+            queryClient.invalidateQueries({ queryKey: ['notification-counts'] });
+            return;
+          }
+          if (!acceptSeq(notifSeqRef, notification.seq)) return;
+          if (notification.type === 'ack') {
+            // another operator (or this one) changed ack state
+            const ids = new Set(notification.ids || []);
+            queryClient.setQueryData(['recent-notifications'], (old = { notifications: [] }) => ({
+              ...old,
+              notifications: (old.notifications || []).map((n) =>
+                ids.has(n.id) ? { ...n, acknowledged: notification.acknowledged } : n
+              ),
+            }));
+            queryClient.invalidateQueries({ queryKey: ['notification-counts'] });
+            return;
+          }
           if (notification.id && notification.timestamp) {
             mergeIncomingNotification(notification);
           }